@@ -0,0 +1,89 @@
+/*
+    World plugin that offers /gazebo/step_world (catbot_gazebo/StepWorld).
+
+    The call pauses the world if needed, runs exactly the requested number of
+    physics iterations and only returns when they are done, so the agent can
+    step the simulation in lockstep instead of unpausing it for a wall clock
+    time. The service has its own callback queue and thread because
+    World::Step blocks until the physics thread has run the iterations.
+*/
+#include <boost/bind.hpp>
+#include <boost/thread.hpp>
+#include <gazebo/common/Plugin.hh>
+#include <gazebo/physics/World.hh>
+#include <ros/ros.h>
+#include <ros/callback_queue.h>
+#include <ros/advertise_service_options.h>
+#include <catbot_gazebo/StepWorld.h>
+
+namespace gazebo
+{
+
+class StepWorldPlugin : public WorldPlugin
+{
+public:
+  ~StepWorldPlugin()
+  {
+    queue_.clear();
+    queue_.disable();
+    if (nh_)
+    {
+      nh_->shutdown();
+    }
+    if (callback_thread_.joinable())
+    {
+      callback_thread_.join();
+    }
+  }
+
+  void Load(physics::WorldPtr world, sdf::ElementPtr sdf)
+  {
+    if (!ros::isInitialized())
+    {
+      ROS_FATAL_STREAM("catbot_step_world: ROS is not initialized, load libgazebo_ros_api_plugin.so first");
+      return;
+    }
+    world_ = world;
+    nh_.reset(new ros::NodeHandle("gazebo"));
+
+    ros::AdvertiseServiceOptions options =
+        ros::AdvertiseServiceOptions::create<catbot_gazebo::StepWorld>(
+            "step_world", boost::bind(&StepWorldPlugin::Step, this, _1, _2),
+            ros::VoidPtr(), &queue_);
+    service_ = nh_->advertiseService(options);
+    callback_thread_ = boost::thread(boost::bind(&StepWorldPlugin::ProcessQueue, this));
+    ROS_INFO_STREAM("catbot_step_world: /gazebo/step_world ready");
+  }
+
+private:
+  bool Step(catbot_gazebo::StepWorld::Request &req, catbot_gazebo::StepWorld::Response &res)
+  {
+    if (!world_->IsPaused())
+    {
+      world_->SetPaused(true);
+    }
+    // Blocks until the physics thread has run all the iterations
+    world_->Step(req.iterations);
+    res.success = true;
+    res.sim_time = world_->SimTime().Double();
+    return true;
+  }
+
+  void ProcessQueue()
+  {
+    while (nh_->ok())
+    {
+      queue_.callAvailable(ros::WallDuration(0.1));
+    }
+  }
+
+  physics::WorldPtr world_;
+  boost::shared_ptr<ros::NodeHandle> nh_;
+  ros::CallbackQueue queue_;
+  ros::ServiceServer service_;
+  boost::thread callback_thread_;
+};
+
+GZ_REGISTER_WORLD_PLUGIN(StepWorldPlugin)
+
+}  // namespace gazebo
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+'''
+    Maps the discrete actions of the agent to joint position targets.
+    The mapping is declared in configs/actions.yaml and turned into a
+    (n_actions, n_joints) matrix of position increments once, so decoding an
+    action is a single vectorized add and clip.
+'''
+import numpy
+
+
+class ActionTable(object):
+
+    def __init__(self, joints, actions, joint_increment_value):
+        """
+        :param joints: [{"name", "lower", "upper"}, ...] in command order
+        :param actions: [{joint_name: multiple of joint_increment_value, ...}, ...]
+        :param joint_increment_value: increment in radians
+        """
+        self.joint_names = [joint["name"] for joint in joints]
+        self.lower = numpy.array([joint["lower"] for joint in joints], dtype=float)
+        self.upper = numpy.array([joint["upper"] for joint in joints], dtype=float)
+
+        joint_index = dict((name, i) for i, name in enumerate(self.joint_names))
+        self.deltas = numpy.zeros((len(actions), len(joints)))
+        for action, moves in enumerate(actions):
+            for joint_name, multiple in moves.items():
+                if joint_name not in joint_index:
+                    raise NameError('Action ' + str(action) + ' moves an unknown joint==' + str(joint_name))
+                self.deltas[action, joint_index[joint_name]] += multiple * joint_increment_value
+
+    @property
+    def n_actions(self):
+        return len(self.deltas)
+
+    def next_positions(self, action, current_positions):
+        """
+        Joint targets after applying action to the current positions
+        :param action: index of the action
+        :param current_positions: joint positions, in joint_names order
+        :return: numpy array of the new targets, clipped to the joint limits
+        """
+        return numpy.clip(current_positions + self.deltas[action], self.lower, self.upper)
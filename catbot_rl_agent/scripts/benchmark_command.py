@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+'''
+    Compares the two command modes of JointPub: one Float64 per joint on 20
+    topics, or a single Float64MultiArray for joint_group_position_controller.
+
+    This node subscribes to the command topics itself, so only a roscore is
+    needed. Do not run it with the simulation up, the commands would move the
+    robot.
+
+    publish     cost of one move_joints call, back to back
+    latency     from move_joints to the last of the targets being received,
+                with moves sent at --rate so none is dropped
+    skew        between the first and the last target of a move being received
+
+    Usage: rosrun catbot_rl_agent benchmark_command.py --moves 2000
+'''
+import argparse
+import threading
+import time
+import numpy
+import rospy
+from std_msgs.msg import Float64, Float64MultiArray
+from joint_publisher import JointPub, JOINT_NAMES
+
+
+class CommandListener(object):
+    '''
+    Records when every target of every move arrives. The targets of move i
+    are all set to i, so the move can be told from the message alone.
+    '''
+    def __init__(self, command_mode, moves):
+        self.expected = 1 if command_mode == "group" else len(JOINT_NAMES)
+        self.first = numpy.full(moves, numpy.nan)
+        self.last = numpy.full(moves, numpy.nan)
+        self.counts = numpy.zeros(moves, dtype=int)
+        self._lock = threading.Lock()
+        if command_mode == "group":
+            self.subscribers = [rospy.Subscriber('/joint_group_position_controller/command', Float64MultiArray,
+                                                 self.group_callback, queue_size=moves, tcp_nodelay=True)]
+        else:
+            self.subscribers = [rospy.Subscriber('/' + name + '_joint_position_controller/command', Float64,
+                                                 self.joint_callback, queue_size=moves, tcp_nodelay=True)
+                                for name in JOINT_NAMES]
+
+    def record(self, move):
+        now = time.perf_counter()
+        with self._lock:
+            if self.counts[move] == 0:
+                self.first[move] = now
+            self.last[move] = now
+            self.counts[move] += 1
+
+    def joint_callback(self, msg):
+        self.record(int(msg.data))
+
+    def group_callback(self, msg):
+        self.record(int(msg.data[0]))
+
+    def complete(self, move):
+        return self.counts[move] >= self.expected
+
+    def close(self):
+        for subscriber in self.subscribers:
+            subscriber.unregister()
+
+
+def wait_for(condition, timeout):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.001)
+    return condition()
+
+
+def run_mode(command_mode, moves, rate):
+    listener = CommandListener(command_mode, moves)
+    joint_pub = JointPub(command_mode=command_mode)
+    if not wait_for(joint_pub.publishers_connected, 10.0):
+        raise rospy.ROSException("The command topics of " + command_mode + " did not connect")
+
+    # Back to back, only the cost of move_joints
+    targets = numpy.zeros(len(JOINT_NAMES))
+    start = time.perf_counter()
+    for _ in range(moves):
+        joint_pub.move_joints(targets)
+    publish_us = 1e6 * (time.perf_counter() - start) / moves
+    # Let the back to back moves drain before timing the latency
+    time.sleep(1.0)
+    listener.counts[:] = 0
+
+    sent = numpy.zeros(moves)
+    period = 1.0 / rate
+    for move in range(moves):
+        targets[:] = move
+        sent[move] = time.perf_counter()
+        joint_pub.move_joints(targets)
+        time.sleep(max(0.0, sent[move] + period - time.perf_counter()))
+    wait_for(lambda: listener.complete(moves - 1), 5.0)
+    listener.close()
+
+    complete = listener.counts >= listener.expected
+    latency_ms = 1e3 * (listener.last[complete] - sent[complete])
+    skew_ms = 1e3 * (listener.last[complete] - listener.first[complete])
+    return {"mode": command_mode,
+            "publish_us": publish_us,
+            "moves_per_s": 1e6 / publish_us,
+            "latency_ms": numpy.median(latency_ms) if len(latency_ms) else numpy.nan,
+            "latency_p95_ms": numpy.percentile(latency_ms, 95) if len(latency_ms) else numpy.nan,
+            "skew_ms": numpy.median(skew_ms) if len(skew_ms) else numpy.nan,
+            "complete": int(complete.sum())}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--moves", type=int, default=2000)
+    parser.add_argument("--rate", type=float, default=200.0,
+                        help="Moves per second while timing the latency")
+    parser.add_argument("--modes", nargs="+", default=["joint", "group"], choices=["joint", "group"])
+    args = parser.parse_args(rospy.myargv()[1:])
+
+    rospy.init_node('benchmark_command', anonymous=True)
+
+    print("%-6s %12s %12s %14s %14s %10s %10s" % ("mode", "publish [us]", "moves/s", "latency [ms]",
+                                                  "p95 [ms]", "skew [ms]", "complete"))
+    for command_mode in args.modes:
+        result = run_mode(command_mode, args.moves, args.rate)
+        print("%-6s %12.1f %12.0f %14.3f %14.3f %10.3f %10d" % (result["mode"], result["publish_us"],
+                                                              result["moves_per_s"], result["latency_ms"],
+                                                              result["latency_p95_ms"], result["skew_ms"],
+                                                              result["complete"]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+'''
+    Compares the physics_profiles of configs/qlearn_params.yaml: how fast the
+    simulation runs with each one, and how much the episodes drift from the
+    ones of the first profile given.
+
+    Every profile plays the same episodes, each one from a full reset with the
+    same random actions, so the differences only come from the physics.
+
+    rtf         real time factor, sim time over wall time while stepping
+    steps/s     env steps per wall clock second
+    length      mean episode length in steps
+    return      mean episode return
+    fell        fraction of the episodes that ended before --max-steps
+    d_length    mean abs difference with the first profile of the length of the same episode
+    d_return    same for the return
+    d_outcome   fraction of the episodes that fell with one profile and not with the other
+
+    Needs the simulation running and the parameters loaded, like:
+        roslaunch catbot_gazebo catbot.launch
+        rosparam load $(rospack find catbot_rl_agent)/configs/qlearn_params.yaml
+        rosparam load $(rospack find catbot_rl_agent)/configs/actions.yaml
+        rosrun catbot_rl_agent benchmark_physics_profiles.py --profiles accurate training fast
+'''
+import argparse
+import time
+import gym
+import numpy
+import rospy
+import catbot_env
+
+
+def run_profile(env, profile, episodes, max_steps, seed):
+    """
+    :return: dict of the speed and of the per episode lengths, returns and falls
+    """
+    env.gazebo.set_physics_profile(profile)
+    lengths = numpy.zeros(episodes, dtype=int)
+    returns = numpy.zeros(episodes)
+    fell = numpy.zeros(episodes, dtype=bool)
+    wall_time = 0.0
+    sim_time = 0.0
+    for episode in range(episodes):
+        # The actions of an episode do not depend on how long the others lasted
+        rng = numpy.random.default_rng([seed, episode])
+        env.reset()
+        sim_start = rospy.get_time()
+        wall_start = time.perf_counter()
+        for step in range(max_steps):
+            state, reward, done, info = env.step(rng.integers(env.action_space.n))
+            returns[episode] += reward
+            if done:
+                break
+        wall_time += time.perf_counter() - wall_start
+        sim_time += rospy.get_time() - sim_start
+        lengths[episode] = step + 1
+        fell[episode] = done
+    return {"profile": profile,
+            "rtf": sim_time / wall_time,
+            "steps_per_s": lengths.sum() / wall_time,
+            "lengths": lengths,
+            "returns": returns,
+            "fell": fell}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--profiles", nargs="+", default=["accurate", "training", "fast"],
+                        help="Entries of the physics_profiles param, the first one is the reference")
+    parser.add_argument("--episodes", type=int, default=20)
+    parser.add_argument("--max-steps", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(rospy.myargv()[1:])
+
+    rospy.init_node('benchmark_physics_profiles', anonymous=True, log_level=rospy.WARN)
+    env = gym.make('bipedal-catbot-v0').unwrapped
+    # Every episode from the same initial state
+    env.reset_mode = "full"
+    initial_profile = env.gazebo.physics_profile
+
+    print("%-10s %8s %10s %8s %10s %6s %10s %10s %10s" % ("profile", "rtf", "steps/s", "length", "return",
+                                                        "fell", "d_length", "d_return", "d_outcome"))
+    reference = None
+    try:
+        for profile in args.profiles:
+            result = run_profile(env, profile, args.episodes, args.max_steps, args.seed)
+            if reference is None:
+                reference = result
+            print("%-10s %8.2f %10.1f %8.1f %10.1f %6.2f %10.1f %10.1f %10.2f" % (
+                result["profile"], result["rtf"], result["steps_per_s"], result["lengths"].mean(),
+                result["returns"].mean(), result["fell"].mean(),
+                numpy.abs(result["lengths"] - reference["lengths"]).mean(),
+                numpy.abs(result["returns"] - reference["returns"]).mean(),
+                (result["fell"] != reference["fell"]).mean()))
+    finally:
+        env.gazebo.set_physics_profile(initial_profile)
+        env.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+'''
+    Compares the dict based QLearn against the NumPy backed ArrayQLearn.
+
+    Both tables are fed the same synthetic stream of chooseAction/learn calls,
+    with states shaped like the ones CatbotState.get_state_key produces, or
+    like the older get_state_as_string ones with --string-states.
+    Each backend runs in its own process so the resident memory numbers are
+    not polluted by the other one.
+
+    Usage: ./benchmark_qtable.py --updates 3000000 --states 200000
+'''
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+import numpy
+import qlearn
+
+N_OBSERVATIONS = 26
+N_ACTIONS = 39
+
+
+def current_rss_mb():
+    """
+    Resident set size of this process right now, in MB
+    :return:
+    """
+    try:
+        with open("/proc/self/statm") as statm:
+            pages = int(statm.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / 1e6
+    except (IOError, OSError):
+        # Not on Linux, fall back to the peak
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1e3
+
+
+def make_states(n_states, seed, string_states):
+    """
+    Builds n_states different states, 4 bit packed integer keys or
+    stringuified ones like "5.03.010.0..."
+    :return: list of states
+    """
+    rng = numpy.random.RandomState(seed)
+    bins = rng.randint(0, 11, size=(n_states, N_OBSERVATIONS))
+    if string_states:
+        return [''.join(map(str, row)) for row in bins.astype(float)]
+    return [sum(int(b) << (4 * i) for i, b in enumerate(row)) for row in bins]
+
+
+def run_backend(backend, updates, n_states, seed, string_states):
+    states = make_states(n_states, seed, string_states)
+    rng = numpy.random.RandomState(seed + 1)
+    # Zipf like visits: a few states are seen a lot, most only a few times
+    visits = numpy.minimum(rng.zipf(1.3, size=updates + 1), n_states) - 1
+    rewards = rng.normal(size=updates)
+    rss_before = current_rss_mb()
+
+    if backend == "array":
+        agent = qlearn.ArrayQLearn(actions=range(N_ACTIONS), epsilon=0.1, alpha=0.1, gamma=0.8)
+    else:
+        agent = qlearn.QLearn(actions=range(N_ACTIONS), epsilon=0.1, alpha=0.1, gamma=0.8)
+
+    start = time.perf_counter()
+    state = states[visits[0]]
+    for i in range(updates):
+        action = agent.chooseAction(state)
+        next_state = states[visits[i + 1]]
+        agent.learn(state, action, rewards[i], next_state)
+        state = next_state
+    elapsed = time.perf_counter() - start
+
+    return {"backend": backend,
+            "updates": updates,
+            "us_per_step": 1e6 * elapsed / updates,
+            "rss_mb": current_rss_mb() - rss_before}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--updates", type=int, default=3000000)
+    parser.add_argument("--states", type=int, default=200000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--string-states", action="store_true",
+                        help="Use the stringuified states instead of the integer keys")
+    parser.add_argument("--backend", choices=["dict", "array"],
+                        help="Run a single backend in this process and print the result as JSON")
+    args = parser.parse_args()
+
+    if args.backend:
+        print(json.dumps(run_backend(args.backend, args.updates, args.states, args.seed,
+                                     args.string_states)))
+        return
+
+    print("%-8s %10s %14s %12s" % ("backend", "updates", "us/step", "rss [MB]"))
+    for backend in ("dict", "array"):
+        output = subprocess.check_output([sys.executable, os.path.abspath(__file__),
+                                          "--backend", backend,
+                                          "--updates", str(args.updates),
+                                          "--states", str(args.states),
+                                          "--seed", str(args.seed)]
+                                         + (["--string-states"] if args.string_states else []))
+        result = json.loads(output.decode().splitlines()[-1])
+        print("%-8s %10d %14.2f %12.1f" % (result["backend"], result["updates"],
+                                           result["us_per_step"], result["rss_mb"]))
+
+
+if __name__ == '__main__':
+    main()
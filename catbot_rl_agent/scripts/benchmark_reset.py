@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+'''
+    Measures how long CatbotEnv.reset takes with the full and the fast
+    reset_mode.
+
+    Needs the simulation running and the parameters loaded, like:
+        roslaunch catbot_gazebo catbot.launch
+        rosparam load $(rospack find catbot_rl_agent)/configs/qlearn_params.yaml
+        rosparam load $(rospack find catbot_rl_agent)/configs/actions.yaml
+        rosrun catbot_rl_agent benchmark_reset.py --resets 50
+
+    Between two resets a few random actions are run so that the robot is not
+    already in its initial pose.
+'''
+import argparse
+import time
+import gym
+import numpy
+import rospy
+import catbot_env
+
+
+def time_resets(env, mode, resets, steps, rng):
+    """
+    :return: reset durations in milliseconds, {service: calls per reset}
+    """
+    env.reset_mode = mode
+    env.full_reset_every = 0
+    # Fast resets need the snapshot of a full one first
+    env.full_reset()
+    if mode == "fast":
+        env.refresh_reset_snapshot()
+
+    durations = []
+    service_calls = {}
+    for _ in range(resets):
+        for _ in range(steps):
+            env.step(rng.integers(env.action_space.n))
+        env.gazebo.reset_service_stats()
+        start = time.perf_counter()
+        env.reset()
+        durations.append(1e3 * (time.perf_counter() - start))
+        for name, stats in env.gazebo.service_stats().items():
+            service_calls[name] = service_calls.get(name, 0) + stats["calls"] / float(resets)
+    return numpy.array(durations), service_calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--resets", type=int, default=50)
+    parser.add_argument("--steps", type=int, default=20,
+                        help="Random actions between two resets")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--modes", nargs="+", default=["full", "fast"], choices=["full", "fast"])
+    args = parser.parse_args(rospy.myargv()[1:])
+
+    rospy.init_node('benchmark_reset', anonymous=True, log_level=rospy.WARN)
+    env = gym.make('bipedal-catbot-v0').unwrapped
+    rng = numpy.random.default_rng(args.seed)
+
+    print("%-6s %8s %10s %10s %10s %10s" % ("mode", "resets", "mean [ms]", "p50 [ms]", "p95 [ms]", "max [ms]"))
+    for mode in args.modes:
+        durations, service_calls = time_resets(env, mode, args.resets, args.steps, rng)
+        print("%-6s %8d %10.1f %10.1f %10.1f %10.1f" % (mode, len(durations), durations.mean(),
+                                                        numpy.percentile(durations, 50),
+                                                        numpy.percentile(durations, 95),
+                                                        durations.max()))
+        for name, calls in sorted(service_calls.items()):
+            if calls:
+                print("    %-36s %6.1f calls per reset" % (name, calls))
+    env.close()
+
+
+if __name__ == '__main__':
+    main()
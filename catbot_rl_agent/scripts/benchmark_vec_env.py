@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+'''
+    Steps per second of CatbotVecEnv with random actions, for several numbers
+    of workers, to see how it scales with the cores.
+
+    Every worker starts its own master and simulation, so nothing needs to be
+    running before. With --sim-backend numpy it measures the agent side and
+    the process overhead only, with gazebo the whole thing.
+
+    Usage: rosrun catbot_rl_agent benchmark_vec_env.py --workers 1 2 4 8 --steps 2000
+'''
+import argparse
+import time
+import numpy
+from vec_env import CatbotVecEnv
+
+
+def run_workers(n_workers, steps, launch_args, base_port):
+    vec_env = CatbotVecEnv(n_workers, base_port=base_port, launch_args=launch_args)
+    try:
+        rng = numpy.random.default_rng(0)
+        vec_env.reset()
+        episodes = 0
+        start = time.perf_counter()
+        for _ in range(steps):
+            states, rewards, dones, infos = vec_env.step(rng.integers(vec_env.n_actions, size=n_workers))
+            episodes += int(dones.sum())
+        elapsed = time.perf_counter() - start
+    finally:
+        vec_env.close()
+    return {"workers": n_workers,
+            "steps_per_s": n_workers * steps / elapsed,
+            "batch_ms": 1e3 * elapsed / steps,
+            "episodes": episodes,
+            "restarts": vec_env.restarts}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--steps", type=int, default=2000, help="Batched steps per run")
+    parser.add_argument("--sim-backend", default="gazebo", choices=["gazebo", "numpy"])
+    parser.add_argument("--base-port", type=int, default=11411)
+    args = parser.parse_args()
+
+    launch_args = ["sim_backend:=" + args.sim_backend]
+    print("%8s %12s %12s %10s %10s %10s" % ("workers", "steps/s", "batch [ms]", "speedup", "episodes", "restarts"))
+    baseline = None
+    for n_workers in args.workers:
+        result = run_workers(n_workers, args.steps, launch_args, args.base_port)
+        if baseline is None:
+            baseline = result["steps_per_s"] / n_workers
+        print("%8d %12.0f %12.3f %10.2f %10d %10d" % (result["workers"], result["steps_per_s"], result["batch_ms"],
+                                                     result["steps_per_s"] / baseline, result["episodes"],
+                                                     result["restarts"]))
+
+
+if __name__ == '__main__':
+    main()
@@ -8,13 +8,17 @@ import rospy
 import numpy as np
 import time
 from gym import utils, spaces
-from geometry_msgs.msg import Pose
+from geometry_msgs.msg import Pose, Twist
+from gazebo_msgs.msg import ModelState
 from gym.utils import seeding
 from gym.envs.registration import register
 from gazebo_connection import GazeboConnection
 from joint_publisher import JointPub
 from catbot_state import CatbotState
 from controllers_connection import ControllersConnection
+from action_table import ActionTable
+from step_timing import PhaseTimer
+from numpy_sim import NumpySim, NumpyGazeboConnection, NumpyJointPub, NumpyControllersConnection
 
 #register the training environment in the gym as an available one
 reg = register(
@@ -24,18 +28,42 @@ reg = register(
 
 class CatbotEnv(gym.Env):
 
-    def __init__(self):
-        
+    def __init__(self, namespace="", gazebo=None, origin=(0.0, 0.0)):
+        """
+        The defaults are for the single robot of catbot_gazebo/launch/catbot.launch
+        :param namespace: of the robot, like /catbot_0 in catbot_gazebo/launch/multi_catbot.launch,
+                          its model is named after it
+        :param gazebo: GazeboConnection to share with the other robots of the same world, a new one if None
+        :param origin: (x, y) where the robot was spawned, the desired pose is relative to it
+        """
+
         # We assume that a ROS node has already been created
         # before initialising the environment
+        self.namespace = namespace.rstrip('/')
 
         # gets training parameters from param server
         self.desired_pose = Pose()
-        self.desired_pose.position.x = rospy.get_param("/desired_pose/x")
-        self.desired_pose.position.y = rospy.get_param("/desired_pose/y")
+        self.desired_pose.position.x = rospy.get_param("/desired_pose/x") + origin[0]
+        self.desired_pose.position.y = rospy.get_param("/desired_pose/y") + origin[1]
         self.desired_pose.position.z = rospy.get_param("/desired_pose/z")
 
         self.running_step = rospy.get_param("/running_step")
+        # Physics iterations per step through /gazebo/step_world, 0 to let it run running_step seconds
+        self.lockstep_iterations = rospy.get_param("/lockstep_iterations", 0)
+        # Wall clock seconds the reset waits for the sensors before giving up, 0 to wait forever
+        self.sensors_timeout = rospy.get_param("/sensors_timeout", 0)
+        self.imu_topic = rospy.get_param("/imu_topic", "/catbot/imu/data")
+        # {sensor: N} to use one out of every N messages of a sensor, see CatbotState
+        self.sensor_decimation = rospy.get_param("/sensor_decimation", {})
+        # "full" resets the whole simulation, "fast" puts the robot back to a snapshot
+        # taken after a full reset, with a full one every full_reset_every resets
+        self.reset_mode = rospy.get_param("/reset_mode", "full")
+        self.full_reset_every = rospy.get_param("/full_reset_every", 100)
+        self.model_name = self.namespace.lstrip('/') or rospy.get_param("/model_name", "catbot")
+        if self.reset_mode not in ("full", "fast"):
+            raise NameError('Unknown reset_mode==' + str(self.reset_mode))
+        self._reset_snapshot = None
+        self._fast_resets = 0
         self.max_incl = rospy.get_param("/max_incl")
         self.max_height = rospy.get_param("/max_height")
         self.min_height = rospy.get_param("/min_height")
@@ -52,10 +80,34 @@ class CatbotEnv(gym.Env):
         self.weight_r4 = rospy.get_param("/weight_r4")
         self.weight_r5 = rospy.get_param("/weight_r5")
 
-        # stablishes connection with simulator
-        self.gazebo = GazeboConnection()
-
-        self.controllers_object = ControllersConnection(namespace=None)
+        # Actions to joint movements, loaded from configs/actions.yaml
+        self.action_table = ActionTable(joints=rospy.get_param("/joints"),
+                                        actions=rospy.get_param("/actions"),
+                                        joint_increment_value=self.joint_increment_value)
+
+        # "gazebo" for the real simulation, "numpy" for the in process stand-in of numpy_sim,
+        # which only needs a roscore for the parameters
+        self.sim_backend = rospy.get_param("/sim_backend", "gazebo")
+        if self.sim_backend == "gazebo":
+            self.sim = None
+            # stablishes connection with simulator
+            self.gazebo = gazebo if gazebo is not None else GazeboConnection()
+
+            self.controllers_object = ControllersConnection(namespace=self.namespace)
+        elif self.sim_backend == "numpy":
+            self.sim = NumpySim(joint_names=self.action_table.joint_names)
+            self.gazebo = NumpyGazeboConnection(self.sim)
+            self.controllers_object = NumpyControllersConnection(self.sim)
+            if self.lockstep_iterations <= 0:
+                # The stand-in only moves when stepped
+                self.lockstep_iterations = max(1, int(round(self.running_step / self.sim.time_step)))
+        else:
+            raise NameError('Unknown sim_backend==' + str(self.sim_backend))
+        # A step waits for the readings of its last physics iteration, which a decimated
+        # sensor may never send
+        decimated = sorted(field for field, every in self.sensor_decimation.items() if every > 1)
+        if self.lockstep_iterations > 0 and decimated:
+            raise NameError('lockstep_iterations needs every message of the sensors, decimated==' + str(decimated))
 
         self.monoped_state_object = CatbotState(   max_height=self.max_height,
                                                     min_height=self.min_height,
@@ -70,26 +122,61 @@ class CatbotEnv(gym.Env):
                                                     weight_r2=self.weight_r2,
                                                     weight_r3=self.weight_r3,
                                                     weight_r4=self.weight_r4,
-                                                    weight_r5=self.weight_r5
+                                                    weight_r5=self.weight_r5,
+                                                    action_table=self.action_table,
+                                                    imu_topic=self.imu_topic,
+                                                    sensor_decimation=self.sensor_decimation,
+                                                    sensor_source=self.sim,
+                                                    namespace=self.namespace
                                                 )
 
         self.monoped_state_object.set_desired_world_point(self.desired_pose.position.x,
                                                           self.desired_pose.position.y,
                                                           self.desired_pose.position.z)
 
-        self.monoped_joint_pubisher_object = JointPub()
+        # Set by catbot_gazebo/launch/catbot.launch, "joint" or "group"
+        self.command_mode = rospy.get_param("/command_mode", "joint")
+        if self.sim is None:
+            self.monoped_joint_pubisher_object = JointPub(command_mode=self.command_mode,
+                                                          joint_names=self.action_table.joint_names,
+                                                          namespace=self.namespace)
+        else:
+            self.monoped_joint_pubisher_object = NumpyJointPub(self.sim, joint_names=self.action_table.joint_names)
         
 
 
         """
-        For this version, we consider 39 actions
-        1-2) Increment/Decrement haa_joint
-        3-4) Increment/Decrement hfe_joint
-        5-6) Increment/Decrement kfe_joint
+        One action per entry of configs/actions.yaml, by default 39 of them:
+        Increment/Decrement of each joint, in the order of the joints list
         """
-        self.action_space = spaces.Discrete(39)
+        self.action_space = spaces.Discrete(self.action_table.n_actions)
         self.reward_range = (-np.inf, np.inf)
 
+        # What reset and step return as the state:
+        # "key"             the discrete state packed in an int, for the Q-tables of qlearn.
+        #                   No observation_space, the keys are too large for a gym space
+        # "box"             the observations as a float32 vector, for neural agents
+        # "multi_discrete"  the bin index of every observation
+        self.observation_mode = rospy.get_param("/observation_mode", "key")
+        # box only, False to return the same preallocated vector every time, overwritten
+        # by the next step. Agents that keep the observations, like a replay buffer, need True
+        self.observation_copy = rospy.get_param("/observation_copy", True)
+        n_bins = self.monoped_state_object.bins_per_observation()
+        if self.observation_mode == "box":
+            self.observation_space = spaces.Box(low=-np.inf, high=np.inf, shape=(len(n_bins),), dtype=np.float32)
+            self._box_observation = np.zeros(len(n_bins), dtype=np.float32)
+        elif self.observation_mode == "multi_discrete":
+            self.observation_space = spaces.MultiDiscrete(n_bins)
+        elif self.observation_mode != "key":
+            raise NameError('Unknown observation_mode==' + str(self.observation_mode))
+
+        # Durations of the phases of step and reset, see step_timing
+        self.timer = PhaseTimer()
+        self._phases = dict((name, self.timer.phase(name)) for name in (
+            "step", "step.action", "step.publish", "step.sensors", "step.snapshot", "step.observations", "step.reward",
+            "step.discretize", "physics.step_world", "physics.unpause", "physics.sleep", "physics.pause",
+            "reset.full", "reset.fast"))
+
         self._seed()
 
     # A function to initialize the random generator
@@ -100,6 +187,30 @@ class CatbotEnv(gym.Env):
     # Resets the state of the environment and returns an initial observation.
     def reset(self):
 
+        start = self.timer.start()
+        if self.reset_mode == "fast" and self.has_reset_snapshot() and \
+                (self.full_reset_every <= 0 or self._fast_resets < self.full_reset_every):
+            observation = self.fast_reset()
+            self._fast_resets += 1
+            self._phases["reset.fast"].lap(start)
+        else:
+            observation = self.full_reset()
+            self._fast_resets = 0
+            if self.reset_mode == "fast":
+                self.refresh_reset_snapshot()
+            self._phases["reset.full"].lap(start)
+
+        # Get the discrete state key of the observations
+        state = self.get_state(observation)
+
+        return state
+
+    def full_reset(self):
+        """
+        Resets the whole simulation, the controllers and the robot pose
+        :return: observation
+        """
+
         # 0st: We pause the Simulator
         # rospy.loginfo("Pausing SIM...")
         self.gazebo.pauseSim()
@@ -125,7 +236,8 @@ class CatbotEnv(gym.Env):
         # Get the state of the Robot defined by its RPY orientation, distance from
         # desired point, contact force and JointState of the three joints
         # rospy.loginfo("check_all_systems_ready...")
-        self.monoped_state_object.check_all_systems_ready()
+        self.monoped_state_object.check_all_systems_ready(timeout=self.sensors_timeout or None)
+        self.monoped_state_object.take_snapshot()
         # rospy.loginfo("get_observations...")
         observation = self.monoped_state_object.get_observations()
 
@@ -137,44 +249,187 @@ class CatbotEnv(gym.Env):
         # rospy.loginfo("Pause SIM...")
         self.gazebo.pauseSim()
 
-        # Get the State Discrete Stringuified version of the observations
-        state = self.get_state(observation)
+        return observation
 
-        return state
+    def refresh_reset_snapshot(self):
+        """
+        Makes the current pose of the robot the one fast_reset goes back to,
+        call it right after a full reset
+        :return: whether the pose could be read, fast resets need it
+        """
+        self._reset_snapshot = self.take_reset_snapshot()
+        return self.has_reset_snapshot()
+
+    def has_reset_snapshot(self):
+        return self._reset_snapshot is not None
+
+    def take_reset_snapshot(self):
+        """
+        Pose of the robot right after a full reset, for fast_reset to go back to
+        :return: gazebo_msgs/ModelState, None if it could not be read
+        """
+        response = self.gazebo.getModelState(self.model_name)
+        if response is None or not response.success:
+            rospy.logwarn("Could not read the state of " + str(self.model_name) + ", using full resets")
+            return None
+        snapshot = ModelState()
+        snapshot.model_name = self.model_name
+        snapshot.pose = response.pose
+        # Standing still
+        snapshot.twist = Twist()
+        snapshot.reference_frame = "world"
+        return snapshot
+
+    def fast_reset(self):
+        """
+        Puts the robot back to the snapshot of the last full reset without resetting
+        the simulation. The joints are set straight to their initial positions, so
+        there is no need to remove the gravity, and the controllers and subscribers,
+        which were checked by the full reset, are left as they are.
+        The sim is paused at the end of every step, it stays paused until the
+        physics updates that let the sensors publish the new state.
+        :return: observation
+        """
+        self.place_at_reset_pose()
+        self.run_physics_after_move()
+        self.monoped_state_object.take_snapshot()
+        return self.monoped_state_object.get_observations()
+
+    def run_physics_after_move(self, state_objects=None):
+        """
+        Runs the physics after place_at_reset_pose until every sensor has a reading
+        of the new pose, the ones of the old pose can still be on their way
+        :param state_objects: CatbotState of every robot to wait for, the one of this env by default
+        :return:
+        :raises rospy.ROSException: naming the topics still stale after sensors_timeout
+        """
+        state_objects = state_objects or [self.monoped_state_object]
+        timeout = self.sensors_timeout or None
+        if self.lockstep_iterations > 0:
+            # Every sensor publishes on the last iteration, see collect_step
+            sim_time = self.run_physics()
+            for state_object in state_objects:
+                state_object.wait_for_sensors(timeout=timeout, since=sim_time)
+            return
+
+        # Strictly after the move, the readings of the paused sim time are of the old pose
+        since = np.nextafter(rospy.get_time(), np.inf)
+        start = time.time()
+        self.run_physics()
+        while any(state_object.stale_topics(since) for state_object in state_objects):
+            if rospy.is_shutdown():
+                raise rospy.ROSInterruptException("Shutdown while waiting for the sensors")
+            if timeout is not None and time.time() - start > timeout:
+                stale = sum((state_object.stale_topics(since) for state_object in state_objects), [])
+                raise rospy.ROSException("No reading of the reset pose after " + str(timeout) + "s from==" +
+                                         str(stale))
+            # Sensors slower than running_step, like joint_states, need more than one
+            self.run_physics()
+
+    def place_at_reset_pose(self):
+        """
+        Moves the robot to the snapshot of the last full reset and holds its
+        joints there, the sensors see it after the next physics update
+        :return:
+        """
+        joint_publisher = self.monoped_joint_pubisher_object
+        self.gazebo.setModelConfiguration(self.model_name, self.action_table.joint_names, joint_publisher.init_pos)
+        # After the joints, it also zeroes the velocity of every link
+        self.gazebo.setModelState(self._reset_snapshot)
+
+        # Hold the joints where they are now
+        joint_publisher.check_publishers_connection()
+        joint_publisher.move_joints(joint_publisher.init_pos)
 
     def step(self, action):
 
+        start = self.timer.start()
+        self.set_action(action)
+        # Then we let the robot go
+        sim_time = self.run_physics()
+        result = self.collect_step(sim_time)
+        self._phases["step"].lap(start)
+        return result
+
+    def set_action(self, action):
+        """
+        Sends the joint targets of the action, without running the simulation
+        :return:
+        """
         # Given the action selected by the learning algorithm,
         # we perform the corresponding movement of the robot
 
         # 1st, decide which action corresponsd to which joint is incremented
+        t = self.timer.start()
         next_action_position = self.monoped_state_object.get_action_to_position(action)
+        t = self._phases["step.action"].lap(t)
 
         # We move it to that pos
-        self.gazebo.unpauseSim()
         self.monoped_joint_pubisher_object.move_joints(next_action_position)
-        # Then we send the command to the robot and let it go
-        # for running_step seconds
-        time.sleep(self.running_step)
-        self.gazebo.pauseSim()
+        self._phases["step.publish"].lap(t)
 
-        # We now process the latest data saved in the class state to calculate
+    def collect_step(self, sim_time=None):
+        """
+        Result of the step once the simulation has run after set_action
+        :param sim_time: what run_physics returned, the readings of that sim time are waited for
+        :return: state, reward, done, info
+        """
+        t = self.timer.start()
+        if sim_time is not None:
+            # The messages of the last iterations can still be on their way
+            self.monoped_state_object.wait_for_sensors(timeout=self.sensors_timeout or None, since=sim_time)
+            t = self._phases["step.sensors"].lap(t)
+        # We now freeze the latest data saved in the class state to calculate
         # the state and the rewards. This way we guarantee that they work
-        # with the same exact data.
+        # with the same exact data, the next action also starts from it.
+        self.monoped_state_object.take_snapshot()
+        t = self._phases["step.snapshot"].lap(t)
         # Generate State based on observations
         observation = self.monoped_state_object.get_observations()
+        t = self._phases["step.observations"].lap(t)
 
         # finally we get an evaluation based on what happened in the sim
-        reward,done = self.monoped_state_object.process_data()
+        reward, done, reward_terms = self.monoped_state_object.process_data()
+        t = self._phases["step.reward"].lap(t)
 
-        # Get the State Discrete Stringuified version of the observations
+        # Get the discrete state key of the observations
         state = self.get_state(observation)
+        self._phases["step.discretize"].lap(t)
         # print(state)
-        return state, reward, done, {}
+        return state, reward, done, {"reward_terms": reward_terms}
+
+    def run_physics(self):
+        """
+        Lets the simulation run for one step and pauses it again
+        :return: sim time after the step in lockstep, None otherwise or if the step failed
+        """
+        t = self.timer.start()
+        if self.lockstep_iterations > 0:
+            # The sim stays paused and runs exactly lockstep_iterations
+            # physics iterations, as fast as they can go
+            sim_time = self.gazebo.stepSim(self.lockstep_iterations)
+            self._phases["physics.step_world"].lap(t)
+            return sim_time
+        else:
+            # Otherwise it runs in wall clock time for running_step seconds
+            self.gazebo.unpauseSim()
+            t = self._phases["physics.unpause"].lap(t)
+            time.sleep(self.running_step)
+            t = self._phases["physics.sleep"].lap(t)
+            self.gazebo.pauseSim()
+            self._phases["physics.pause"].lap(t)
+            return None
 
     def get_state(self, observation):
         """
-        We retrieve the Stringuified-Discrete version of the given observation
+        We retrieve the state of the given observation in the observation_mode:
+        the discrete version with all the bins packed in a single integer key,
+        the float32 vector of the observations, or the bin of each of them
         :return: state
         """
-        return self.monoped_state_object.get_state_as_string(observation)
+        if self.observation_mode == "key":
+            return self.monoped_state_object.get_state_key(observation)
+        if self.observation_mode == "box":
+            self._box_observation[:] = observation
+            return self._box_observation.copy() if self.observation_copy else self._box_observation
+        return self.monoped_state_object.assign_bins(observation)
@@ -4,11 +4,36 @@ import rospy
 from gazebo_msgs.msg import ContactsState
 from sensor_msgs.msg import Imu
 from nav_msgs.msg import Odometry
-from geometry_msgs.msg import Point, Quaternion, Vector3
+from geometry_msgs.msg import Vector3
 from sensor_msgs.msg import JointState
 import tf
 import numpy
+from sensor_subscriber import DecimatedSubscriber
+from raw_decoders import JointStateDecoder, JointStateArrays, decode_contacts_force
 import math
+import time
+import logging
+
+# Terms of the reward, as reported in the info dict of every step
+REWARD_TERMS = ("alive",
+                "joint_position",
+                "joint_effort",
+                "contact_force_left",
+                "contact_force_right",
+                "orientation",
+                "distance")
+
+# rospy.logdebug ends up in this logger, its level is the one given to init_node
+_rosout_logger = logging.getLogger("rosout")
+
+
+def debug_enabled():
+    """
+    Whether rospy.logdebug would print anything, so that building the debug
+    strings can be skipped altogether when it would not
+    :return:
+    """
+    return _rosout_logger.isEnabledFor(logging.DEBUG)
 
 """
  wrenches:
@@ -88,7 +113,7 @@ gazebo_msgs/ContactState[] states
 
 class CatbotState(object):
 
-    def __init__(self, max_height, min_height, abs_max_roll, abs_max_pitch, joint_increment_value = 0.05, done_reward = -1000.0, alive_reward=10.0, desired_force=7.08, desired_yaw=0.0, weight_r1=1.0, weight_r2=1.0, weight_r3=1.0, weight_r4=1.0, weight_r5=1.0, discrete_division=10):
+    def __init__(self, max_height, min_height, abs_max_roll, abs_max_pitch, joint_increment_value = 0.05, done_reward = -1000.0, alive_reward=10.0, desired_force=7.08, desired_yaw=0.0, weight_r1=1.0, weight_r2=1.0, weight_r3=1.0, weight_r4=1.0, weight_r5=1.0, discrete_division=10, action_table=None, imu_topic="/catbot/imu/data", sensor_decimation=None, sensor_source=None, namespace=""):
         rospy.logdebug("Starting Catbot State Class object...")
         self.desired_world_point = Vector3(0.0, 0.0, 0.0)
         self._min_height = min_height
@@ -106,6 +131,15 @@ class CatbotState(object):
         self._weight_r3 = weight_r3
         self._weight_r4 = weight_r4
         self._weight_r5 = weight_r5
+        # Weights and scratch buffers of calculate_reward_terms, in REWARD_TERMS[1:] order
+        self._reward_weights = numpy.array([weight_r1, weight_r2, weight_r3, weight_r3, weight_r4, weight_r5],
+                                           dtype=float)
+        self._reward_displacements = numpy.zeros(len(REWARD_TERMS) - 1)
+        self._desired_rpy = numpy.array([0.0, 0.0, desired_yaw])
+        self._contact_forces = numpy.zeros((2, 3))
+
+        # ActionTable that turns actions into joint targets
+        self._action_table = action_table
 
         self._list_of_observations = ["distance_from_desired_point",
                  "base_roll",
@@ -134,95 +168,211 @@ class CatbotState(object):
                  "joint_states_shoulder_yrj",
                  "joint_states_forearm_yrj",]
 
+        # Order in which we handle the joints, the one of the commands sent by JointPub
+        if action_table is not None:
+            self._joint_names = list(action_table.joint_names)
+        else:
+            self._joint_names = [obs_name[len("joint_states_"):] for obs_name in self._list_of_observations
+                                 if obs_name.startswith("joint_states_")]
+        self._joint_permutation_names = None
+        self._joint_permutation = None
+
         self._discrete_division = discrete_division
         # We init the observation ranges and We create the bins now for all the observations
         self.init_bins()
+        self.init_observations()
+
+        # Sensor topics and the field of the sensor buffers each one fills
+        # All of them under the namespace of the robot, "" for the single robot of catbot.launch
+        namespace = namespace.rstrip('/')
+        self._odom_topic = namespace + "/odom"
+        self._imu_topic = namespace + imu_topic
+        self._left_contact_topic = namespace + "/lower_left_leg_contactsensor_state"
+        self._right_contact_topic = namespace + "/lower_right_leg_contactsensor_state"
+        self._joint_states_topic = namespace + "/joint_states"
+        self._sensor_fields = [(self._odom_topic, "odom"),
+                               (self._imu_topic, "imu"),
+                               (self._left_contact_topic, "left_contact"),
+                               (self._right_contact_topic, "right_contact"),
+                               (self._joint_states_topic, "joints")]
+        self.init_sensor_buffers()
+
+        # One out of every sensor_decimation[field] messages of each topic is used
+        decimation = dict((field, 1) for topic, field in self._sensor_fields)
+        decimation.update(sensor_decimation or {})
+        unknown = set(decimation) - set(field for topic, field in self._sensor_fields)
+        if unknown:
+            raise NameError('sensor_decimation of unknown sensors==' + str(sorted(unknown)))
+
+        # Without a simulator the sensors are written by the source itself, see numpy_sim.NumpySim
+        self._sensor_source = sensor_source
+        if sensor_source is not None:
+            self._subscribers = []
+            sensor_source.connect_state(self)
+        else:
+            self.subscribe_sensors(decimation)
 
-        self.base_position = Point()
-        self.base_orientation = Quaternion()
-        self.base_linear_acceleration = Vector3()
-        self.left_contact_force = Vector3()
-        self.right_contact_force = Vector3()
-        self.joints_state = JointState()
-
+    def subscribe_sensors(self, decimation):
+        """
+        One subscriber per sensor topic, each writing its field of the live buffer
+        :param decimation: {field: N} to use one out of every N messages
+        :return:
+        """
         # Odom we only use it for the height detection and planar position ,
         #  because in real robots this data is not trivial.
-        rospy.Subscriber("/odom", Odometry, self.odom_callback)
+        odom_subscriber = DecimatedSubscriber(self._odom_topic, Odometry, self.odom_callback,
+                                              every=decimation["odom"])
         # We use the IMU for orientation and linearacceleration detection
-        rospy.Subscriber("/monoped/imu/data", Imu, self.imu_callback)
+        imu_subscriber = DecimatedSubscriber(self._imu_topic, Imu, self.imu_callback,
+                                             every=decimation["imu"])
         # We use it to get the contact force, to know if its in the air or stumping too hard.
-        rospy.Subscriber("/lower_left_leg_contactsensor_state", ContactsState, self.left_contact_callback)
-        rospy.Subscriber("/lower_right_leg_contactsensor_state", ContactsState, self.right_contact_callback)
+        # Only the total forces are read from the raw messages.
+        left_contact_subscriber = DecimatedSubscriber(self._left_contact_topic, ContactsState,
+                                                      self.left_contact_callback, every=decimation["left_contact"],
+                                                      decoder=decode_contacts_force)
+        right_contact_subscriber = DecimatedSubscriber(self._right_contact_topic, ContactsState,
+                                                       self.right_contact_callback, every=decimation["right_contact"],
+                                                       decoder=decode_contacts_force)
         # We use it to get the joints positions and calculate the reward associated to it
-        rospy.Subscriber("/joint_states", JointState, self.joints_state_callback)
-
-    def check_all_systems_ready(self):
+        # The arrays are read from the raw messages straight into numpy
+        joint_states_subscriber = DecimatedSubscriber(self._joint_states_topic, JointState,
+                                                      self.joints_state_callback, every=decimation["joints"],
+                                                      decoder=JointStateDecoder())
+        self._subscribers = [odom_subscriber, imu_subscriber, left_contact_subscriber,
+                             right_contact_subscriber, joint_states_subscriber]
+
+    def subscriber_stats(self):
+        """
+        Message rates and callback CPU time of every sensor topic since the last reset_subscriber_stats
+        :return: {topic: DecimatedSubscriber.stats()}
+        """
+        return dict((subscriber.topic, subscriber.stats()) for subscriber in self._subscribers)
+
+    def reset_subscriber_stats(self):
+        for subscriber in self._subscribers:
+            subscriber.reset_stats()
+
+    def init_sensor_buffers(self):
+        """
+        Every sensor has a fixed size record with the sim time of its reading, the
+        header stamp of its message, NaN until one comes. The callbacks publish a new
+        record of their sensor by replacing it in the live dict, a record is never
+        written once published. take_snapshot copies the live dict, only the references
+        to the records, and the observation, reward and action code read nothing but
+        the snapshot. Replacing a dict item and copying a small dict are each a single
+        step under the GIL, so a snapshot never has half a message, with no lock and
+        no copy of the readings.
+        :return:
         """
-        We check that all systems are ready
+        n_joints = len(self._joint_names)
+        self._field_dtypes = {
+            "odom": numpy.dtype([("stamp", float), ("position", float, 3)]),
+            "imu": numpy.dtype([("stamp", float), ("orientation", float, 4), ("linear_acceleration", float, 3)]),
+            "left_contact": numpy.dtype([("stamp", float), ("force", float, 3)]),
+            "right_contact": numpy.dtype([("stamp", float), ("force", float, 3)]),
+            "joints": numpy.dtype([("stamp", float), ("position", float, n_joints), ("effort", float, n_joints)])}
+        # Published when the stamps are cleared, until the first message
+        self._no_readings = {}
+        for topic, field in self._sensor_fields:
+            no_reading = numpy.zeros((), dtype=self._field_dtypes[field])
+            no_reading["stamp"] = numpy.nan
+            no_reading.flags.writeable = False
+            self._no_readings[field] = no_reading
+        self._live = dict(self._no_readings)
+        self._snapshot = dict(self._no_readings)
+        self._no_effort = numpy.zeros(n_joints)
+
+    def take_snapshot(self):
+        """
+        Freezes the latest sensor readings, everything computed until the next
+        snapshot uses exactly the same data
+        :return: the snapshot, {field: 0-d structured array} replaced by the next call
+        """
+        self._snapshot = self._live.copy()
+        return self._snapshot
+
+    def publish_reading(self, field, reading):
+        """
+        Makes a reading the latest one of its sensor
+        :param field: odom, imu, left_contact, right_contact or joints
+        :param reading: tuple with the stamp and the other members of the field, in the order of its dtype
         :return:
         """
-        data_pose = None
-        while data_pose is None and not rospy.is_shutdown():
-            try:
-                data_pose = rospy.wait_for_message("/odom", Odometry, timeout=0.1)
-                self.base_position = data_pose.pose.pose.position
-                rospy.logdebug("Current odom READY")
-            except:
-                rospy.logdebug("Current odom pose not ready yet, retrying for getting robot base_position")
-
-        imu_data = None
-        while imu_data is None and not rospy.is_shutdown():
-            try:
-                imu_data = rospy.wait_for_message("/catbot/imu/data", Imu, timeout=0.1)
-                self.base_orientation = imu_data.orientation
-                self.base_linear_acceleration = imu_data.linear_acceleration
-                rospy.logdebug("Current imu_data READY")
-            except:
-                rospy.logdebug("Current imu_data not ready yet, retrying for getting robot base_orientation, and base_linear_acceleration")
-
-        left_contacts_data = None
-
-        #####################################################################################
-        ########################### Check both legs #########################################
-
-        while left_contacts_data is None and not rospy.is_shutdown():
-            try:
-                left_contacts_data = rospy.wait_for_message("/lower_left_leg_contactsensor_state", ContactsState, timeout=0.1)
-                for state in left_contacts_data.states:
-                    self.left_contact_force = state.total_wrench.force
-                rospy.logdebug("Current LEFT contacts_data READY")
-            except:
-                rospy.logdebug("Current LEFT contacts_data not ready yet, retrying")
-
-        right_contacts_data = None
-        while right_contacts_data is None and not rospy.is_shutdown():
-            try:
-                right_contacts_data = rospy.wait_for_message("/lower_right_leg_contactsensor_state", ContactsState, timeout=0.1)
-                for state in right_contacts_data.states:
-                    self.right_contact_force = state.total_wrench.force
-                rospy.logdebug("Current RIGHT contacts_data READY")
-            except:
-                rospy.logdebug("Current RIGHT contacts_data not ready yet, retrying")
-
-        ##########################################################################################
-        ##########################################################################################
-
-
-
-        joint_states_msg = None
-        while joint_states_msg is None and not rospy.is_shutdown():
-            try:
-                joint_states_msg = rospy.wait_for_message("/joint_states", JointState, timeout=0.1)
-                self.joints_state = joint_states_msg
-                rospy.logdebug("Current joint_states READY")
-            except Exception as e:
-                rospy.logdebug("Current joint_states not ready yet, retrying==>"+str(e))
-
-        rospy.logdebug("ALL SYSTEMS READY")
+        self._live[field] = numpy.array(reading, dtype=self._field_dtypes[field])
 
+    def write_sensor(self, field, stamp, *values):
+        """
+        Writes a reading like the callback of its topic does, for the sensor_source
+        :param field: odom, imu, left_contact, right_contact or joints
+        :param stamp: sim time of the reading
+        :param values: the other members of the field, in the order of the sensor dtype
+        :return:
+        """
+        self.publish_reading(field, (stamp,) + values)
 
+    def check_all_systems_ready(self, timeout=None, fresh=True, since=None):
+        """
+        We check that all systems are ready, waiting at once for every sensor
+        topic to deliver a message through the subscribers of the class
+        :param timeout: seconds of wall clock time to wait, None to wait for as long as it takes
+        :param fresh: only count the messages received from now on, like after a reset
+        :param since: only count the readings of this sim time or later
+        :return:
+        :raises rospy.ROSException: naming the topics still stale at the timeout
+        """
+        if fresh:
+            for topic, field in self._sensor_fields:
+                self._live[field] = self._no_readings[field]
+            if self._sensor_source is not None:
+                self._sensor_source.publish_sensors()
 
+        self.wait_for_sensors(timeout=timeout, since=since)
+        rospy.logdebug("ALL SYSTEMS READY")
 
+    def wait_for_sensors(self, timeout=None, since=None):
+        """
+        Waits for every sensor topic to deliver a reading of sim time since or later,
+        like the ones of the last physics iteration once the simulation is paused
+        :param timeout: seconds of wall clock time to wait, None to wait for as long as it takes
+        :param since: sim time, None for any reading
+        :return:
+        :raises rospy.ROSException: naming the topics still stale at the timeout
+        """
+        stale = self.stale_topics(since)
+        if not stale:
+            return
+        start = time.time()
+        last_report = start
+        while True:
+            stale = self.stale_topics(since)
+            if not stale:
+                break
+            if rospy.is_shutdown():
+                raise rospy.ROSInterruptException("Shutdown while waiting for the sensors")
+            now = time.time()
+            if timeout is not None and now - start > timeout:
+                raise rospy.ROSException("No message after " + str(timeout) + "s from==" + str(stale))
+            if now - last_report > 5.0:
+                rospy.logwarn("Still waiting for messages from==" + str(stale))
+                last_report = now
+            # Short, in lockstep this waits on every step
+            time.sleep(0.0001)
+
+    def stale_topics(self, since=None):
+        """
+        :param since: sim time, the topics whose last reading is older are stale too
+        :return: the sensor topics without a message since check_all_systems_ready cleared them
+        """
+        if since is None:
+            return [topic for topic, field in self._sensor_fields if numpy.isnan(self._live[field]["stamp"])]
+        # NaN >= since is False
+        return [topic for topic, field in self._sensor_fields if not self._live[field]["stamp"] >= since]
+
+    def sensor_stamps(self):
+        """
+        :return: {topic: sim time of the last message in the snapshot, NaN if none}
+        """
+        return dict((topic, float(self._snapshot[field]["stamp"])) for topic, field in self._sensor_fields)
 
     def set_desired_world_point(self, x, y, z):
         """
@@ -235,12 +385,17 @@ class CatbotState(object):
 
 
     def get_base_height(self):
-        return abs(self.base_position.z)
+        return abs(self._snapshot["odom"]["position"][2])
+
+    def get_base_euler(self):
+        """
+        :return: (roll, pitch, yaw) of the base in the snapshot
+        """
+        return tf.transformations.euler_from_quaternion(self._snapshot["imu"]["orientation"])
 
     def get_base_rpy(self):
         euler_rpy = Vector3()
-        euler = tf.transformations.euler_from_quaternion(
-            [self.base_orientation.x, self.base_orientation.y, self.base_orientation.z, self.base_orientation.w])
+        euler = self.get_base_euler()
 
         euler_rpy.x = euler[0]
         euler_rpy.y = euler[1]
@@ -253,7 +408,7 @@ class CatbotState(object):
         :param p_end:
         :return:
         """
-        a = numpy.array((self.base_position.x, self.base_position.y, self.base_position.z))
+        a = self._snapshot["odom"]["position"]
         b = numpy.array((p_end.x, p_end.y, p_end.z))
 
         distance = numpy.linalg.norm(a - b)
@@ -269,11 +424,7 @@ class CatbotState(object):
         Fx = 7.08 N
         :return:
         """
-        contact_force = self.left_contact_force
-        contact_force_np = numpy.array((contact_force.x, contact_force.y, contact_force.z))
-        force_magnitude = numpy.linalg.norm(contact_force_np)
-
-        return force_magnitude
+        return numpy.linalg.norm(self._snapshot["left_contact"]["force"])
 
     
     def get_right_contact_force_magnitude(self):
@@ -285,23 +436,20 @@ class CatbotState(object):
         Fx = 7.08 N
         :return:
         """
-        contact_force = self.right_contact_force
-        contact_force_np = numpy.array((contact_force.x, contact_force.y, contact_force.z))
-        force_magnitude = numpy.linalg.norm(contact_force_np)
-
-        return force_magnitude
-
-    def get_joint_states(self):
-        return self.joints_state
+        return numpy.linalg.norm(self._snapshot["right_contact"]["force"])
 
     def odom_callback(self,msg):
-        self.base_position = msg.pose.pose.position
+        position = msg.pose.pose.position
+        self.publish_reading("odom", (msg.header.stamp.to_sec(), (position.x, position.y, position.z)))
 
     def imu_callback(self,msg):
-        self.base_orientation = msg.orientation
-        self.base_linear_acceleration = msg.linear_acceleration
+        orientation = msg.orientation
+        acceleration = msg.linear_acceleration
+        self.publish_reading("imu", (msg.header.stamp.to_sec(),
+                                     (orientation.x, orientation.y, orientation.z, orientation.w),
+                                     (acceleration.x, acceleration.y, acceleration.z)))
 
-    def left_contact_callback(self,msg):
+    def left_contact_callback(self,contacts):
         """
         /lowerleg_contactsensor_state/states[0]/contact_positions ==> PointContact in World
         /lowerleg_contactsensor_state/states[0]/contact_normals ==> NormalContact in World
@@ -310,14 +458,13 @@ class CatbotState(object):
          and are relative to the contact link referred to in the sensor.
         /lowerleg_contactsensor_state/states[0]/wrenches[]
         /lowerleg_contactsensor_state/states[0]/total_wrench
-        :param msg:
+        :param contacts: raw_decoders.ContactsForce, total_wrench.force summed over all the states
         :return:
         """
-        for state in msg.states:
-            self.left_contact_force = state.total_wrench.force
+        self.publish_reading("left_contact", contacts)
 
 
-    def right_contact_callback(self,msg):
+    def right_contact_callback(self,contacts):
         """
         /lowerleg_contactsensor_state/states[0]/contact_positions ==> PointContact in World
         /lowerleg_contactsensor_state/states[0]/contact_normals ==> NormalContact in World
@@ -326,17 +473,21 @@ class CatbotState(object):
          and are relative to the contact link referred to in the sensor.
         /lowerleg_contactsensor_state/states[0]/wrenches[]
         /lowerleg_contactsensor_state/states[0]/total_wrench
-        :param msg:
+        :param contacts: raw_decoders.ContactsForce, total_wrench.force summed over all the states
         :return:
         """
-        for state in msg.states:
-            self.right_contact_force = state.total_wrench.force
-
-
-    
+        self.publish_reading("right_contact", contacts)
 
     def joints_state_callback(self,msg):
-        self.joints_state = msg
+        """
+        :param msg: raw_decoders.JointStateArrays, or a JointState
+        :return:
+        """
+        permutation = self.get_joint_permutation(msg.name)
+        position = numpy.asarray(msg.position, dtype=float)[permutation]
+        effort = numpy.asarray(msg.effort, dtype=float)[permutation] if len(msg.effort) else self._no_effort
+        stamp = msg.stamp if isinstance(msg, JointStateArrays) else msg.header.stamp.to_sec()
+        self.publish_reading("joints", (stamp, position, effort))
 
     def catbot_height_ok(self):
 
@@ -366,101 +517,39 @@ class CatbotState(object):
 
 
 
-    def calculate_reward_joint_position(self, weight=1.0):
-        """
-        We calculate reward base on the joints configuration. The more near 0 the better.
-        :return:
-        """
-        acumulated_joint_pos = 0.0
-        for joint_pos in self.joints_state.position:
-            # Abs to remove sign influence, it doesnt matter the direction of turn.
-            acumulated_joint_pos += abs(joint_pos)
-            rospy.logdebug("calculate_reward_joint_position>>acumulated_joint_pos=" + str(acumulated_joint_pos))
-        reward = weight * acumulated_joint_pos
-        rospy.logdebug("calculate_reward_joint_position>>reward=" + str(reward))
-        return reward
-
-    def calculate_reward_joint_effort(self, weight=1.0):
-        """
-        We calculate reward base on the joints effort readings. The more near 0 the better.
-        :return:
-        """
-        acumulated_joint_effort = 0.0
-        for joint_effort in self.joints_state.effort:
-            # Abs to remove sign influence, it doesnt matter the direction of the effort.
-            acumulated_joint_effort += abs(joint_effort)
-            rospy.logdebug("calculate_reward_joint_effort>>joint_effort=" + str(joint_effort))
-            rospy.logdebug("calculate_reward_joint_effort>>acumulated_joint_effort=" + str(acumulated_joint_effort))
-        reward = weight * acumulated_joint_effort
-        rospy.logdebug("calculate_reward_joint_effort>>reward=" + str(reward))
-        return reward
-
-    def calculate_left_reward_contact_force(self, weight=1.0):
-        """
-        We calculate reward base on the contact force.
-        The nearest to the desired contact force the better.
-        We use exponential to magnify big departures from the desired force.
-        Default ( 7.08 N ) desired force was taken from reading of the robot touching
-        the ground from a negligible height of 5cm.
-        :return:
-        """
-        force_magnitude = self.get_left_contact_force_magnitude()
-        force_displacement = force_magnitude - self._desired_force
-
-        rospy.logdebug("calculate_left_reward_contact_force>>force_magnitude=" + str(force_magnitude))
-        rospy.logdebug("calculate_left_reward_contact_force>>force_displacement=" + str(force_displacement))
-        # Abs to remove sign
-        reward = weight * abs(force_displacement)
-        rospy.logdebug("calculate_left_reward_contact_force>>reward=" + str(reward))
-        return reward
-
-    def calculate_right_reward_contact_force(self, weight=1.0):
-        """
-        We calculate reward base on the contact force.
-        The nearest to the desired contact force the better.
-        We use exponential to magnify big departures from the desired force.
-        Default ( 7.08 N ) desired force was taken from reading of the robot touching
-        the ground from a negligible height of 5cm.
-        :return:
-        """
-        force_magnitude = self.get_right_contact_force_magnitude()
-        force_displacement = force_magnitude - self._desired_force
-
-        rospy.logdebug("calculate_right_reward_contact_force>>force_magnitude=" + str(force_magnitude))
-        rospy.logdebug("calculate_right_reward_contact_force>>force_displacement=" + str(force_displacement))
-        # Abs to remove sign
-        reward = weight * abs(force_displacement)
-        rospy.logdebug("calculate_right_reward_contact_force>>reward=" + str(reward))
-        return reward
-
-
-    def calculate_reward_orientation(self, weight=1.0):
+    def get_contact_force_magnitudes(self):
         """
-        We calculate the reward based on the orientation.
-        The more its closser to 0 the better because it means its upright
-        desired_yaw is the yaw that we want it to be.
-        to praise it to have a certain orientation, here is where to set it.
-        :return:
+        Magnitude of the total force on the left and right contact sensors,
+        see get_left_contact_force_magnitude
+        :return: numpy array [left, right] in Newtons
         """
-        curren_orientation = self.get_base_rpy()
-        yaw_displacement = curren_orientation.z - self._desired_yaw
-        rospy.logdebug("calculate_reward_orientation>>[R,P,Y]=" + str(curren_orientation))
-        acumulated_orientation_displacement = abs(curren_orientation.x) + abs(curren_orientation.y) + abs(yaw_displacement)
-        reward = weight * acumulated_orientation_displacement
-        rospy.logdebug("calculate_reward_orientation>>reward=" + str(reward))
-        return reward
+        forces = self._contact_forces
+        forces[0] = self._snapshot["left_contact"]["force"]
+        forces[1] = self._snapshot["right_contact"]["force"]
+        return numpy.sqrt(numpy.einsum("ij,ij->i", forces, forces))
 
-    def calculate_reward_distance_from_des_point(self, weight=1.0):
+    def calculate_reward_terms(self):
         """
-        We calculate the distance from the desired point.
-        The closser the better
-        :param weight:
-        :return:reward
+        Every penalty of the reward at once, each one already multiplied by its weight:
+        joint_position      sum of abs joint positions, the more near 0 the better.
+        joint_effort        sum of abs joint efforts, the more near 0 the better.
+        contact_force_*     abs departure from the desired contact force. Default ( 7.08 N )
+                            desired force was taken from reading of the robot touching
+                            the ground from a negligible height of 5cm.
+        orientation         abs roll, pitch and departure from desired_yaw, the closer
+                            to 0 the more upright it is.
+        distance            distance from the desired point, the closser the better
+        :return: numpy array of the penalties, in REWARD_TERMS[1:] order
         """
-        distance = self.get_distance_from_point(self.desired_world_point)
-        reward = weight * distance
-        rospy.logdebug("calculate_reward_orientation>>reward=" + str(reward))
-        return reward
+        joints = self._snapshot["joints"]
+        displacements = self._reward_displacements
+        # Abs to remove sign influence, it doesnt matter the direction of turn or effort.
+        displacements[0] = numpy.abs(joints["position"]).sum()
+        displacements[1] = numpy.abs(joints["effort"]).sum()
+        displacements[2:4] = numpy.abs(self.get_contact_force_magnitudes() - self._desired_force)
+        displacements[4] = numpy.abs(numpy.subtract(self.get_base_euler(), self._desired_rpy)).sum()
+        displacements[5] = self.get_distance_from_point(self.desired_world_point)
+        return self._reward_weights * displacements
 
     def calculate_total_reward(self):
         """
@@ -471,31 +560,21 @@ class CatbotState(object):
         r2 = -8.84
         r3 = -7.08
         r4 = -10.0 ==> We give priority to this, giving it higher value.
-        :return:
+        :return: total_reward, penalties of calculate_reward_terms
         """
-
-        r1 = self.calculate_reward_joint_position(self._weight_r1)
-        r2 = self.calculate_reward_joint_effort(self._weight_r2)
-        # Desired Force in Newtons, taken form idle contact with 9.81 gravity.
-        r3_a = self.calculate_left_reward_contact_force(self._weight_r3)
-        r3_b = self.calculate_right_reward_contact_force(self._weight_r3)
-        r4 = self.calculate_reward_orientation(self._weight_r4)
-        r5 = self.calculate_reward_distance_from_des_point(self._weight_r5)
-
+        penalties = self.calculate_reward_terms()
         # The sign depend on its function.
-        total_reward = self._alive_reward - r1 - r2 - r3_a - r3_b- r4 - r5
+        total_reward = self._alive_reward - float(penalties.sum())
 
-        rospy.logdebug("###############")
-        rospy.logdebug("alive_bonus=" + str(self._alive_reward))
-        rospy.logdebug("r1 joint_position=" + str(r1))
-        rospy.logdebug("r2 joint_effort=" + str(r2))
-        rospy.logdebug("r3a&b contact_force=" + str(r3_a) + " and " + str(r3_b))
-        rospy.logdebug("r4 orientation=" + str(r4))
-        rospy.logdebug("r5 distance=" + str(r5))
-        rospy.logdebug("total_reward=" + str(total_reward))
-        rospy.logdebug("###############")
+        if debug_enabled():
+            rospy.logdebug("###############")
+            rospy.logdebug("alive_bonus=" + str(self._alive_reward))
+            for name, penalty in zip(REWARD_TERMS[1:], penalties):
+                rospy.logdebug(name + "=" + str(penalty))
+            rospy.logdebug("total_reward=" + str(total_reward))
+            rospy.logdebug("###############")
 
-        return total_reward
+        return total_reward, penalties
 
 #######################################################################################################
 #######################################################################################################
@@ -519,166 +598,150 @@ class CatbotState(object):
         Returns the state of the robot needed for OpenAI QLearn Algorithm
         The state will be defined by an array of the:
         1) distance from desired point in meters
-        2) The pitch orientation in radians
-        3) the Roll orientation in radians
+        2) The roll orientation in radians
+        3) the Pitch orientation in radians
         4) the Yaw orientation in radians
-        5) Force in contact sensor in Newtons
-        6-7-8) State of the 3 joints in radians
+        5-6) Force in the left and right contact sensors in Newtons
+        7-26) State of the 20 joints in radians
 
-        observation = [distance_from_desired_point,
-                 base_roll,
-                 base_pitch,
-                 base_yaw,
-                 contact_force,
-                 joint_states_haa,
-                 joint_states_hfe,
-                 joint_states_kfe]
+        in the order of _list_of_observations. The joints are looked up by
+        name, so the order in which /joint_states sends them does not matter.
+        Everything comes from the last take_snapshot.
 
-        :return: observation
+        :return: observation, a preallocated float64 numpy array that is
+                 overwritten on the next call, copy it to keep it
         """
-
-        distance_from_desired_point = self.get_distance_from_point(self.desired_world_point)
-
         base_orientation = self.get_base_rpy()
-        base_roll = base_orientation.x
-        base_pitch = base_orientation.y
-        base_yaw = base_orientation.z
-
-        left_contact_force = self.get_left_contact_force_magnitude()
-        right_contact_force = self.get_right_contact_force_magnitude()
-
-        joint_states = self.get_joint_states()
-        # joint_states_haa = joint_states.position[0]
-        # joint_states_hfe = joint_states.position[1]
-        # joint_states_kfe = joint_states.position[2]
-
-        joint_states_bum_zlj = joint_states.position[0] 
-        joint_states_bum_xlj = joint_states.position[1]
-        joint_states_bum_ylj = joint_states.position[2]
-        joint_states_knee_left = joint_states.position[3]
-        joint_states_ankle_lj = joint_states.position[4]
-        joint_states_foot_lj = joint_states.position[5]
-        joint_states_bum_zrj = joint_states.position[6]
-        joint_states_bum_xrj = joint_states.position[7]
-        joint_states_bum_yrj = joint_states.position[8]
-        joint_states_knee_right = joint_states.position[9]
-        joint_states_ankle_rj = joint_states.position[10]
-        joint_states_foot_rj = joint_states.position[11]
-        joint_states_shoulder_zlj = joint_states.position[12]
-        joint_states_shoulder_xlj = joint_states.position[13]
-        joint_states_shoulder_ylj = joint_states.position[14]
-        joint_states_forearm_ylj = joint_states.position[15]
-        joint_states_shoulder_zrj = joint_states.position[16]
-        joint_states_shoulder_xrj = joint_states.position[17]
-        joint_states_shoulder_yrj = joint_states.position[18]
-        joint_states_forearm_yrj = joint_states.position[19]
-
-        observation = []
-        for obs_name in self._list_of_observations:
-            if obs_name == "distance_from_desired_point":
-                observation.append(distance_from_desired_point)
-            elif obs_name == "base_roll":
-                observation.append(base_roll)
-            elif obs_name == "base_pitch":
-                observation.append(base_pitch)
-            elif obs_name == "base_yaw":
-                observation.append(base_yaw)
-            
-            elif obs_name == "contact_force_left_leg":
-                observation.append(left_contact_force)
+        base_features = self._base_features
+        base_features[0] = self.get_distance_from_point(self.desired_world_point)
+        base_features[1] = base_orientation.x
+        base_features[2] = base_orientation.y
+        base_features[3] = base_orientation.z
+        base_features[4] = self.get_left_contact_force_magnitude()
+        base_features[5] = self.get_right_contact_force_magnitude()
+
+        observation = self._observation
+        observation[self._base_observation_slots] = base_features[self._base_observation_sources]
+        observation[self._joint_observation_slots] = self.get_joint_positions()[self._joint_observation_sources]
+        return observation
 
-            elif obs_name == "contact_force_right_leg":
-                observation.append(right_contact_force)
-            
-            elif obs_name == "joint_states_bum_zlj":
-                observation.append(joint_states_bum_zlj)
+    def init_observations(self):
+        """
+        Works out once where every observation of _list_of_observations comes
+        from, so that get_observations only has to gather them.
+        :return:
+        """
+        base_names = ["distance_from_desired_point",
+                      "base_roll",
+                      "base_pitch",
+                      "base_yaw",
+                      "contact_force_left_leg",
+                      "contact_force_right_leg"]
+        joint_index = dict((name, i) for i, name in enumerate(self._joint_names))
+
+        base_slots, base_sources, joint_slots, joint_sources = [], [], [], []
+        for slot, obs_name in enumerate(self._list_of_observations):
+            if obs_name in base_names:
+                base_slots.append(slot)
+                base_sources.append(base_names.index(obs_name))
+            elif obs_name.startswith("joint_states_") and obs_name[len("joint_states_"):] in joint_index:
+                joint_slots.append(slot)
+                joint_sources.append(joint_index[obs_name[len("joint_states_"):]])
+            else:
+                raise NameError('Observation Asked does not exist=='+str(obs_name))
 
-            elif obs_name == "joint_states_bum_xlj":
-                observation.append(joint_states_bum_xlj)
-            
-            elif obs_name == "joint_states_bum_ylj":
-                observation.append(joint_states_bum_ylj)
-            
-            elif obs_name == "joint_states_knee_left":
-                observation.append(joint_states_knee_left)
+        self._base_observation_slots = numpy.array(base_slots, dtype=int)
+        self._base_observation_sources = numpy.array(base_sources, dtype=int)
+        self._joint_observation_slots = numpy.array(joint_slots, dtype=int)
+        self._joint_observation_sources = numpy.array(joint_sources, dtype=int)
+        self._base_features = numpy.zeros(len(base_names))
+        self._observation = numpy.zeros(len(self._list_of_observations))
 
-            elif obs_name == "joint_states_ankle_lj":
-                observation.append(joint_states_ankle_lj)
-            
-            elif obs_name == "joint_states_foot_lj":
-                observation.append(joint_states_foot_lj)
-            
-            elif obs_name == "joint_states_bum_zrj":
-                observation.append(joint_states_bum_zrj)
-            
-            elif obs_name == "joint_states_bum_xrj":
-                observation.append(joint_states_bum_xrj)
-            
-            elif obs_name == "joint_states_bum_yrj":
-                observation.append(joint_states_bum_yrj)
-            
-            elif obs_name == "joint_states_knee_right":
-                observation.append(joint_states_knee_right)
-            
-            elif obs_name == "joint_states_ankle_rj":
-                observation.append(joint_states_ankle_rj)
-            
-            elif obs_name == "joint_states_foot_rj":
-                observation.append(joint_states_foot_rj)
-            
-            elif obs_name == "joint_states_shoulder_zlj":
-                observation.append(joint_states_shoulder_zlj)
-            
-            elif obs_name == "joint_states_shoulder_xlj":
-                observation.append(joint_states_shoulder_xlj)
-            
-            elif obs_name == "joint_states_shoulder_ylj":
-                observation.append(joint_states_shoulder_ylj)
-            
-            elif obs_name == "joint_states_forearm_ylj":
-                observation.append(joint_states_forearm_ylj)
-            
-            elif obs_name == "joint_states_shoulder_zrj":
-                observation.append(joint_states_shoulder_zrj)
-            
-            elif obs_name == "joint_states_shoulder_xrj":
-                observation.append(joint_states_shoulder_xrj)
-            
-            elif obs_name == "joint_states_shoulder_yrj":
-                observation.append(joint_states_shoulder_yrj)
-            
-            elif obs_name == "joint_states_forearm_yrj":
-                observation.append(joint_states_forearm_yrj)
+    def get_joint_positions(self):
+        """
+        Positions of the joints in _joint_names order, whatever the order of
+        the names in the JointState messages.
+        :return: numpy array of the joint positions in the snapshot, do not modify it
+        """
+        return self._snapshot["joints"]["position"]
 
+    def get_joint_permutation(self, names):
+        """
+        Indices that reorder the arrays of a JointState with the given names into
+        _joint_names order. Only recomputed when the layout of the message changes.
+        :param names: JointState.name
+        :return: numpy array of indices
+        """
+        if names != self._joint_permutation_names:
+            if len(names) == 0:
+                # No names, we assume they already come in our order
+                permutation = numpy.arange(len(self._joint_names))
             else:
-                raise NameError('Observation Asked does not exist=='+str(obs_name))
-
-        return observation
+                message_index = dict((name, i) for i, name in enumerate(names))
+                missing = [name for name in self._joint_names if name not in message_index]
+                if missing:
+                    raise NameError('Joints missing from the JointState message==' + str(missing))
+                permutation = numpy.array([message_index[name] for name in self._joint_names], dtype=int)
+            self._joint_permutation_names = list(names)
+            self._joint_permutation = permutation
+        return self._joint_permutation
 
     def get_state_as_string(self, observation):
         """
         This function will do two things:
         1) It will make discrete the observations
         2) Will convert the discrete observations in to state tags strings
+        Kept for Q-tables learnt with the old string states, get_state_key is
+        the cheap replacement.
         :param observation:
         :return: state
         """
-        # print(obs)
-        observations_discrete = self.assign_bins(observation)
-        # print(observations_discrete)
+        observations_discrete = self.assign_bins(observation).astype(float)
         string_state = ''.join(map(str, observations_discrete))
         return string_state
 
+    def get_state_key(self, observation):
+        """
+        Discrete state of the observation packed into a single integer,
+        _bin_bits bits per observation. See decode_state_key for the way back.
+        :param observation:
+        :return: state key, an int of at most 64 * _pack_words bits
+        """
+        shifted = self.assign_bins(observation).astype(numpy.uint64) << self._pack_shifts
+        words = numpy.bitwise_or.reduceat(shifted, self._pack_word_starts)
+        key = 0
+        for word in reversed(words.tolist()):
+            key = (key << 64) | word
+        return key
+
+    def decode_state_key(self, key):
+        """
+        Bin index of every observation from a key made by get_state_key
+        :param key:
+        :return: numpy array of int64 bins, one per observation
+        """
+        words = numpy.array([(key >> (64 * i)) & 0xFFFFFFFFFFFFFFFF for i in range(self._pack_words)],
+                            dtype=numpy.uint64)
+        bins = (words[self._pack_word_index] >> self._pack_shifts) & numpy.uint64((1 << self._bin_bits) - 1)
+        return bins.astype(numpy.int64)
+
+    def bins_per_observation(self):
+        """
+        :return: numpy array with the number of bin indices assign_bins can give
+                 to every observation, in the order of _list_of_observations
+        """
+        return numpy.full(len(self._list_of_observations), self._discrete_division + 1, dtype=numpy.int64)
+
     def assign_bins(self, observation):
         """
-        Will make observations discrete by placing each value into its corresponding bin
+        Will make observations discrete by placing each value into its corresponding bin.
+        Same result as numpy.digitize on every observation, in one go: the bin
+        index is the number of edges that are lower or equal to the value.
         :param observation:
-        :return:
+        :return: numpy array of int64 bins, one per observation
         """
-        state_discrete = numpy.zeros(len(self._list_of_observations))
-        for i in range(len(self._list_of_observations)):
-            state_discrete[i] = numpy.digitize(observation[i], self._bins[i])
-        return state_discrete
+        observation = numpy.asarray(observation, dtype=float)
+        return numpy.count_nonzero(self._bins <= observation[:, None], axis=1)
 
     def init_bins(self):
         """
@@ -852,942 +915,33 @@ class CatbotState(object):
             max_value = self._obs_range_dict[obs_name][1]
             self._bins[counter] = numpy.linspace(min_value, max_value, parts_we_disrcetize)
 
+        # Layout of the packed state keys: a bin index goes from 0 to
+        # parts_we_disrcetize, and as many of them as fit go in each 64 bit word.
+        self._bin_bits = max(1, int(parts_we_disrcetize).bit_length())
+        per_word = 64 // self._bin_bits
+        self._pack_words = (number_of_observations + per_word - 1) // per_word
+        self._pack_word_index = numpy.arange(number_of_observations) // per_word
+        self._pack_word_starts = numpy.arange(0, number_of_observations, per_word)
+        self._pack_shifts = (numpy.arange(number_of_observations) % per_word * self._bin_bits).astype(numpy.uint64)
+
 
     def get_action_to_position(self, action):
         """
-        Here we have the ACtions number to real joint movement correspondance.
-
-        ################ REF MSG ###########################
-        header: 
-            seq: 19580
-            stamp: 
-                secs: 392
-                nsecs: 602000000
-        frame_id: ''
-            name: 
-            - ankle_lj
-            - ankle_rj
-            - bum_xlj
-            - bum_xrj
-            - bum_ylj
-            - bum_yrj
-            - bum_zlj
-            - bum_zrj
-            - foot_lj
-            - foot_rj
-            - forearm_ylj
-            - forearm_yrj
-            - knee_left
-            - knee_right
-            - shoulder_xlj
-            - shoulder_xrj
-            - shoulder_ylj
-            - shoulder_yrj
-            - shoulder_zlj
-            - shoulder_zrj
-            position: [-0.007284824276652557, -0.1500517780905657, -0.006958334788058629, 0.31161108333870313, 0.276632334511679, 0.10492614623858199, 0.27132706416670516, 0.2548615815704949, 0.27072180306669846, 0.11826704981980196, -0.23063292099829535, -1.1061912337240187e-06, -0.01670606919495743, -0.22528336368172397, 0.28563506406679373, 0.4942558180087344, -0.05062763347783239, -3.7051835102275277e-06, -0.11785893685638715, -0.34500026517548577]
-            velocity: [0.0025289011119841547, -0.0021810351891762424, -0.00010961639879162189, -0.0013619365578214895, -0.00027297120066996177, -8.411690510157633e-05, -0.001099457721045053, -0.001115011216570017, 0.0006381177785299951, -0.00022994601552048976, -3.533738127605698e-05, -0.00036774276653233674, -0.0018609820242098721, 0.00172351229750848, 0.0002994666139951035, -0.0010172334458865948, -4.33444175358728e-05, 0.0009331598359361699, -0.0011948459902201163, 0.00012791353300390372]
-            effort: [-1.2933892070254327, 0.3738143845665398, 0.16413215986016638, -3.027609172504677, -1.334652722652958, 0.43120933139476847, -2.789905121502221, -2.620176480961014, -1.1457683463440649, 0.26553733306816873, 7.707942018875258e-05, -2.2978158343655597, -1.1129495242152387, 0.7988351320911757, -0.4725217874037124, -2.7215938325488853, -8.731347488577512e-05, 0.4919735114407153, 1.0982153357375068, 3.461426101763916]
-
-
-
-        ####################################################
-
-        :param action: Integer that goes from 0 to 5, because we have 6 actions.
-        :return:
+        Here we have the ACtions number to real joint movement correspondance,
+        defined by the ActionTable built from configs/actions.yaml.
+        :param action: Integer that goes from 0 to action_table.n_actions - 1
+        :return: numpy array with the next position of every joint
         """
         # We get current Joints values
-        joint_states = self.get_joint_states()
-        joint_states_position = joint_states.position
-
-        action_position = [0.0,0.0,0.0,0.0,0.0,0.0,0.0,0.0,0.0,0.0,0.0,0.0,0.0,0.0,0.0,0.0,0.0,0.0,0.0,0.0,]
-
-        rospy.logdebug("get_action_to_position>>>"+str(joint_states_position))
-        if action == 0: #Increment ankle_lj
-            action_position[0] = joint_states_position[0] + self._joint_increment_value
-            action_position[1] = joint_states_position[1]
-            action_position[2] = joint_states_position[2]
-            action_position[3] = joint_states_position[3]
-            action_position[4] = joint_states_position[4]
-            action_position[5] = joint_states_position[5]
-            action_position[6] = joint_states_position[6]
-            action_position[7] = joint_states_position[7]
-            action_position[8] = joint_states_position[8]
-            action_position[9] = joint_states_position[9]
-            action_position[10] = joint_states_position[10]
-            action_position[11] = joint_states_position[11]
-            action_position[12] = joint_states_position[12]
-            action_position[13] = joint_states_position[13]
-            action_position[14] = joint_states_position[14]
-            action_position[15] = joint_states_position[15]
-            action_position[16] = joint_states_position[16]
-            action_position[17] = joint_states_position[17]
-            action_position[18] = joint_states_position[18]
-            action_position[19] = joint_states_position[19]
-        elif action == 1: #Decrement ankle_rj
-            action_position[0] = joint_states_position[0] - self._joint_increment_value
-            action_position[1] = joint_states_position[1] 
-            action_position[2] = joint_states_position[2]
-            action_position[3] = joint_states_position[3]
-            action_position[4] = joint_states_position[4]
-            action_position[5] = joint_states_position[5]
-            action_position[6] = joint_states_position[6]
-            action_position[7] = joint_states_position[7]
-            action_position[8] = joint_states_position[8]
-            action_position[9] = joint_states_position[9]
-            action_position[10] = joint_states_position[10]
-            action_position[11] = joint_states_position[11]
-            action_position[12] = joint_states_position[12]
-            action_position[13] = joint_states_position[13]
-            action_position[14] = joint_states_position[14]
-            action_position[15] = joint_states_position[15]
-            action_position[16] = joint_states_position[16]
-            action_position[17] = joint_states_position[17]
-            action_position[18] = joint_states_position[18]
-            action_position[19] = joint_states_position[19]
-        elif action == 2: #Increment bum_xlj
-            action_position[0] = joint_states_position[0] 
-            action_position[1] = joint_states_position[1] + self._joint_increment_value
-            action_position[2] = joint_states_position[2] 
-            action_position[3] = joint_states_position[3]
-            action_position[4] = joint_states_position[4]
-            action_position[5] = joint_states_position[5]
-            action_position[6] = joint_states_position[6]
-            action_position[7] = joint_states_position[7]
-            action_position[8] = joint_states_position[8]
-            action_position[9] = joint_states_position[9]
-            action_position[10] = joint_states_position[10]
-            action_position[11] = joint_states_position[11]
-            action_position[12] = joint_states_position[12]
-            action_position[13] = joint_states_position[13]
-            action_position[14] = joint_states_position[14]
-            action_position[15] = joint_states_position[15]
-            action_position[16] = joint_states_position[16]
-            action_position[17] = joint_states_position[17]
-            action_position[18] = joint_states_position[18]
-            action_position[19] = joint_states_position[19]
-        
-        elif action == 3: #Decrement bum_xlj
-            action_position[0] = joint_states_position[0] 
-            action_position[1] = joint_states_position[1] - self._joint_increment_value
-            action_position[2] = joint_states_position[2]
-            action_position[3] = joint_states_position[3] 
-            action_position[4] = joint_states_position[4]
-            action_position[5] = joint_states_position[5]
-            action_position[6] = joint_states_position[6]
-            action_position[7] = joint_states_position[7]
-            action_position[8] = joint_states_position[8]
-            action_position[9] = joint_states_position[9]
-            action_position[10] = joint_states_position[10]
-            action_position[11] = joint_states_position[11]
-            action_position[12] = joint_states_position[12]
-            action_position[13] = joint_states_position[13]
-            action_position[14] = joint_states_position[14]
-            action_position[15] = joint_states_position[15]
-            action_position[16] = joint_states_position[16]
-            action_position[17] = joint_states_position[17]
-            action_position[18] = joint_states_position[18]
-            action_position[19] = joint_states_position[19]
-        
-        elif action == 4: #Increment bum_xrj
-            action_position[0] = joint_states_position[0] 
-            action_position[1] = joint_states_position[1]
-            action_position[2] = joint_states_position[2] + self._joint_increment_value
-            action_position[3] = joint_states_position[3]
-            action_position[4] = joint_states_position[4]
-            action_position[5] = joint_states_position[5]
-            action_position[6] = joint_states_position[6]
-            action_position[7] = joint_states_position[7]
-            action_position[8] = joint_states_position[8]
-            action_position[9] = joint_states_position[9]
-            action_position[10] = joint_states_position[10]
-            action_position[11] = joint_states_position[11]
-            action_position[12] = joint_states_position[12]
-            action_position[13] = joint_states_position[13]
-            action_position[14] = joint_states_position[14]
-            action_position[15] = joint_states_position[15]
-            action_position[16] = joint_states_position[16]
-            action_position[17] = joint_states_position[17]
-            action_position[18] = joint_states_position[18]
-            action_position[19] = joint_states_position[19]
-        
-        elif action == 5: #Decrement haa_joint
-            action_position[0] = joint_states_position[0] 
-            action_position[1] = joint_states_position[1]
-            action_position[2] = joint_states_position[2] - self._joint_increment_value
-            action_position[3] = joint_states_position[3]
-            action_position[4] = joint_states_position[4]
-            action_position[5] = joint_states_position[5]
-            action_position[6] = joint_states_position[6]
-            action_position[7] = joint_states_position[7]
-            action_position[8] = joint_states_position[8]
-            action_position[9] = joint_states_position[9]
-            action_position[10] = joint_states_position[10]
-            action_position[11] = joint_states_position[11]
-            action_position[12] = joint_states_position[12]
-            action_position[13] = joint_states_position[13]
-            action_position[14] = joint_states_position[14]
-            action_position[15] = joint_states_position[15]
-            action_position[16] = joint_states_position[16]
-            action_position[17] = joint_states_position[17]
-            action_position[18] = joint_states_position[18]
-            action_position[19] = joint_states_position[19]
-        
-        elif action == 6: #Decrement haa_joint
-            action_position[0] = joint_states_position[0] 
-            action_position[1] = joint_states_position[1]
-            action_position[2] = joint_states_position[2]
-            action_position[3] = joint_states_position[3] + self._joint_increment_value
-            action_position[4] = joint_states_position[4]
-            action_position[5] = joint_states_position[5]
-            action_position[6] = joint_states_position[6]
-            action_position[7] = joint_states_position[7]
-            action_position[8] = joint_states_position[8]
-            action_position[9] = joint_states_position[9]
-            action_position[10] = joint_states_position[10]
-            action_position[11] = joint_states_position[11]
-            action_position[12] = joint_states_position[12]
-            action_position[13] = joint_states_position[13]
-            action_position[14] = joint_states_position[14]
-            action_position[15] = joint_states_position[15]
-            action_position[16] = joint_states_position[16]
-            action_position[17] = joint_states_position[17]
-            action_position[18] = joint_states_position[18]
-            action_position[19] = joint_states_position[19]
-        
-        elif action == 7: #Decrement haa_joint
-            action_position[0] = joint_states_position[0] 
-            action_position[1] = joint_states_position[1]
-            action_position[2] = joint_states_position[2]
-            action_position[3] = joint_states_position[3] - self._joint_increment_value
-            action_position[4] = joint_states_position[4]
-            action_position[5] = joint_states_position[5]
-            action_position[6] = joint_states_position[6]
-            action_position[7] = joint_states_position[7]
-            action_position[8] = joint_states_position[8]
-            action_position[9] = joint_states_position[9]
-            action_position[10] = joint_states_position[10]
-            action_position[11] = joint_states_position[11]
-            action_position[12] = joint_states_position[12]
-            action_position[13] = joint_states_position[13]
-            action_position[14] = joint_states_position[14]
-            action_position[15] = joint_states_position[15]
-            action_position[16] = joint_states_position[16]
-            action_position[17] = joint_states_position[17]
-            action_position[18] = joint_states_position[18]
-            action_position[19] = joint_states_position[19]
-        
-        elif action == 8: #Decrement haa_joint
-            action_position[0] = joint_states_position[0] 
-            action_position[1] = joint_states_position[1]
-            action_position[2] = joint_states_position[2]
-            action_position[3] = joint_states_position[3]
-            action_position[4] = joint_states_position[4] + self._joint_increment_value
-            action_position[5] = joint_states_position[5]
-            action_position[6] = joint_states_position[6]
-            action_position[7] = joint_states_position[7]
-            action_position[8] = joint_states_position[8]
-            action_position[9] = joint_states_position[9]
-            action_position[10] = joint_states_position[10]
-            action_position[11] = joint_states_position[11]
-            action_position[12] = joint_states_position[12]
-            action_position[13] = joint_states_position[13]
-            action_position[14] = joint_states_position[14]
-            action_position[15] = joint_states_position[15]
-            action_position[16] = joint_states_position[16]
-            action_position[17] = joint_states_position[17]
-            action_position[18] = joint_states_position[18]
-            action_position[19] = joint_states_position[19]
-        
-        elif action == 9: #Decrement haa_joint
-            action_position[0] = joint_states_position[0] 
-            action_position[1] = joint_states_position[1]
-            action_position[2] = joint_states_position[2]
-            action_position[3] = joint_states_position[3]
-            action_position[4] = joint_states_position[4] - self._joint_increment_value
-            action_position[5] = joint_states_position[5]
-            action_position[6] = joint_states_position[6]
-            action_position[7] = joint_states_position[7]
-            action_position[8] = joint_states_position[8]
-            action_position[9] = joint_states_position[9]
-            action_position[10] = joint_states_position[10]
-            action_position[11] = joint_states_position[11]
-            action_position[12] = joint_states_position[12]
-            action_position[13] = joint_states_position[13]
-            action_position[14] = joint_states_position[14]
-            action_position[15] = joint_states_position[15]
-            action_position[16] = joint_states_position[16]
-            action_position[17] = joint_states_position[17]
-            action_position[18] = joint_states_position[18]
-            action_position[19] = joint_states_position[19]
-        
-        elif action == 10: #Decrement haa_joint
-            action_position[0] = joint_states_position[0] 
-            action_position[1] = joint_states_position[1]
-            action_position[2] = joint_states_position[2]
-            action_position[3] = joint_states_position[3]
-            action_position[4] = joint_states_position[4]
-            action_position[5] = joint_states_position[5] + self._joint_increment_value
-            action_position[6] = joint_states_position[6]
-            action_position[7] = joint_states_position[7]
-            action_position[8] = joint_states_position[8]
-            action_position[9] = joint_states_position[9]
-            action_position[10] = joint_states_position[10]
-            action_position[11] = joint_states_position[11]
-            action_position[12] = joint_states_position[12]
-            action_position[13] = joint_states_position[13]
-            action_position[14] = joint_states_position[14]
-            action_position[15] = joint_states_position[15]
-            action_position[16] = joint_states_position[16]
-            action_position[17] = joint_states_position[17]
-            action_position[18] = joint_states_position[18]
-            action_position[19] = joint_states_position[19]
-        
-        elif action == 11: #Decrement haa_joint
-            action_position[0] = joint_states_position[0] 
-            action_position[1] = joint_states_position[1]
-            action_position[2] = joint_states_position[2]
-            action_position[3] = joint_states_position[3]
-            action_position[4] = joint_states_position[4]
-            action_position[5] = joint_states_position[5] - self._joint_increment_value
-            action_position[6] = joint_states_position[6] 
-            action_position[7] = joint_states_position[7]
-            action_position[8] = joint_states_position[8]
-            action_position[9] = joint_states_position[9]
-            action_position[10] = joint_states_position[10]
-            action_position[11] = joint_states_position[11]
-            action_position[12] = joint_states_position[12]
-            action_position[13] = joint_states_position[13]
-            action_position[14] = joint_states_position[14]
-            action_position[15] = joint_states_position[15]
-            action_position[16] = joint_states_position[16]
-            action_position[17] = joint_states_position[17]
-            action_position[18] = joint_states_position[18]
-            action_position[19] = joint_states_position[19]
-        
-        elif action == 12: #Decrement haa_joint
-            action_position[0] = joint_states_position[0] 
-            action_position[1] = joint_states_position[1]
-            action_position[2] = joint_states_position[2]
-            action_position[3] = joint_states_position[3]
-            action_position[4] = joint_states_position[4]
-            action_position[5] = joint_states_position[5]
-            action_position[6] = joint_states_position[6] + self._joint_increment_value
-            action_position[7] = joint_states_position[7]
-            action_position[8] = joint_states_position[8]
-            action_position[9] = joint_states_position[9]
-            action_position[10] = joint_states_position[10]
-            action_position[11] = joint_states_position[11]
-            action_position[12] = joint_states_position[12]
-            action_position[13] = joint_states_position[13]
-            action_position[14] = joint_states_position[14]
-            action_position[15] = joint_states_position[15]
-            action_position[16] = joint_states_position[16]
-            action_position[17] = joint_states_position[17]
-            action_position[18] = joint_states_position[18]
-            action_position[19] = joint_states_position[19]
-        
-        elif action == 13: #Decrement haa_joint
-            action_position[0] = joint_states_position[0] 
-            action_position[1] = joint_states_position[1]
-            action_position[2] = joint_states_position[2]
-            action_position[3] = joint_states_position[3]
-            action_position[4] = joint_states_position[4]
-            action_position[5] = joint_states_position[5]
-            action_position[6] = joint_states_position[6] - self._joint_increment_value
-            action_position[7] = joint_states_position[7]
-            action_position[8] = joint_states_position[8]
-            action_position[9] = joint_states_position[9]
-            action_position[10] = joint_states_position[10]
-            action_position[11] = joint_states_position[11]
-            action_position[12] = joint_states_position[12]
-            action_position[13] = joint_states_position[13]
-            action_position[14] = joint_states_position[14]
-            action_position[15] = joint_states_position[15]
-            action_position[16] = joint_states_position[16]
-            action_position[17] = joint_states_position[17]
-            action_position[18] = joint_states_position[18]
-            action_position[19] = joint_states_position[19]
-        
-        elif action == 14: #Decrement haa_joint
-            action_position[0] = joint_states_position[0] 
-            action_position[1] = joint_states_position[1]
-            action_position[2] = joint_states_position[2]
-            action_position[3] = joint_states_position[3]
-            action_position[4] = joint_states_position[4]
-            action_position[5] = joint_states_position[5]
-            action_position[6] = joint_states_position[6]
-            action_position[7] = joint_states_position[7] + self._joint_increment_value
-            action_position[8] = joint_states_position[8]
-            action_position[9] = joint_states_position[9]
-            action_position[10] = joint_states_position[10]
-            action_position[11] = joint_states_position[11]
-            action_position[12] = joint_states_position[12]
-            action_position[13] = joint_states_position[13]
-            action_position[14] = joint_states_position[14]
-            action_position[15] = joint_states_position[15]
-            action_position[16] = joint_states_position[16]
-            action_position[17] = joint_states_position[17]
-            action_position[18] = joint_states_position[18]
-            action_position[19] = joint_states_position[19]
-        
-        elif action == 15: #Decrement haa_joint
-            action_position[0] = joint_states_position[0] 
-            action_position[1] = joint_states_position[1]
-            action_position[2] = joint_states_position[2]
-            action_position[3] = joint_states_position[3]
-            action_position[4] = joint_states_position[4]
-            action_position[5] = joint_states_position[5]
-            action_position[6] = joint_states_position[6]
-            action_position[7] = joint_states_position[7] - self._joint_increment_value
-            action_position[8] = joint_states_position[8]
-            action_position[9] = joint_states_position[9]
-            action_position[10] = joint_states_position[10]
-            action_position[11] = joint_states_position[11]
-            action_position[12] = joint_states_position[12]
-            action_position[13] = joint_states_position[13]
-            action_position[14] = joint_states_position[14]
-            action_position[15] = joint_states_position[15]
-            action_position[16] = joint_states_position[16]
-            action_position[17] = joint_states_position[17]
-            action_position[18] = joint_states_position[18]
-            action_position[19] = joint_states_position[19]
-        
-        elif action == 16: #Decrement haa_joint
-            action_position[0] = joint_states_position[0] 
-            action_position[1] = joint_states_position[1]
-            action_position[2] = joint_states_position[2]
-            action_position[3] = joint_states_position[3]
-            action_position[4] = joint_states_position[4]
-            action_position[5] = joint_states_position[5]
-            action_position[6] = joint_states_position[6]
-            action_position[7] = joint_states_position[7]
-            action_position[8] = joint_states_position[8] + self._joint_increment_value
-            action_position[9] = joint_states_position[9]
-            action_position[10] = joint_states_position[10]
-            action_position[11] = joint_states_position[11]
-            action_position[12] = joint_states_position[12]
-            action_position[13] = joint_states_position[13]
-            action_position[14] = joint_states_position[14]
-            action_position[15] = joint_states_position[15]
-            action_position[16] = joint_states_position[16]
-            action_position[17] = joint_states_position[17]
-            action_position[18] = joint_states_position[18]
-            action_position[19] = joint_states_position[19]
-        
-        elif action == 17: #Decrement haa_joint
-            action_position[0] = joint_states_position[0] 
-            action_position[1] = joint_states_position[1]
-            action_position[2] = joint_states_position[2]
-            action_position[3] = joint_states_position[3]
-            action_position[4] = joint_states_position[4]
-            action_position[5] = joint_states_position[5]
-            action_position[6] = joint_states_position[6]
-            action_position[7] = joint_states_position[7]
-            action_position[8] = joint_states_position[8] - self._joint_increment_value
-            action_position[9] = joint_states_position[9]
-            action_position[10] = joint_states_position[10]
-            action_position[11] = joint_states_position[11]
-            action_position[12] = joint_states_position[12]
-            action_position[13] = joint_states_position[13]
-            action_position[14] = joint_states_position[14]
-            action_position[15] = joint_states_position[15]
-            action_position[16] = joint_states_position[16]
-            action_position[17] = joint_states_position[17]
-            action_position[18] = joint_states_position[18]
-            action_position[19] = joint_states_position[19]
-        
-        elif action == 18: #Decrement haa_joint
-            action_position[0] = joint_states_position[0] 
-            action_position[1] = joint_states_position[1]
-            action_position[2] = joint_states_position[2]
-            action_position[3] = joint_states_position[3]
-            action_position[4] = joint_states_position[4]
-            action_position[5] = joint_states_position[5]
-            action_position[6] = joint_states_position[6]
-            action_position[7] = joint_states_position[7]
-            action_position[8] = joint_states_position[8]
-            action_position[9] = joint_states_position[9] + self._joint_increment_value
-            action_position[10] = joint_states_position[10]
-            action_position[11] = joint_states_position[11]
-            action_position[12] = joint_states_position[12]
-            action_position[13] = joint_states_position[13]
-            action_position[14] = joint_states_position[14]
-            action_position[15] = joint_states_position[15]
-            action_position[16] = joint_states_position[16]
-            action_position[17] = joint_states_position[17]
-            action_position[18] = joint_states_position[18]
-            action_position[19] = joint_states_position[19]
-        
-        elif action == 19: #Decrement haa_joint
-            action_position[0] = joint_states_position[0] 
-            action_position[1] = joint_states_position[1]
-            action_position[2] = joint_states_position[2]
-            action_position[3] = joint_states_position[3]
-            action_position[4] = joint_states_position[4]
-            action_position[5] = joint_states_position[5]
-            action_position[6] = joint_states_position[6]
-            action_position[7] = joint_states_position[7]
-            action_position[8] = joint_states_position[8]
-            action_position[9] = joint_states_position[9] - self._joint_increment_value
-            action_position[10] = joint_states_position[10]
-            action_position[11] = joint_states_position[11]
-            action_position[12] = joint_states_position[12]
-            action_position[13] = joint_states_position[13]
-            action_position[14] = joint_states_position[14]
-            action_position[15] = joint_states_position[15]
-            action_position[16] = joint_states_position[16]
-            action_position[17] = joint_states_position[17]
-            action_position[18] = joint_states_position[18]
-            action_position[19] = joint_states_position[19]
-        
-        elif action == 20: #Decrement haa_joint
-            action_position[0] = joint_states_position[0] 
-            action_position[1] = joint_states_position[1]
-            action_position[2] = joint_states_position[2]
-            action_position[3] = joint_states_position[3]
-            action_position[4] = joint_states_position[4]
-            action_position[5] = joint_states_position[5]
-            action_position[6] = joint_states_position[6]
-            action_position[7] = joint_states_position[7]
-            action_position[8] = joint_states_position[8]
-            action_position[9] = joint_states_position[9] 
-            action_position[10] = joint_states_position[10] + self._joint_increment_value
-            action_position[11] = joint_states_position[11]
-            action_position[12] = joint_states_position[12]
-            action_position[13] = joint_states_position[13]
-            action_position[14] = joint_states_position[14]
-            action_position[15] = joint_states_position[15]
-            action_position[16] = joint_states_position[16]
-            action_position[17] = joint_states_position[17]
-            action_position[18] = joint_states_position[18]
-            action_position[19] = joint_states_position[19]
-        
-        elif action == 21: #Decrement haa_joint
-            action_position[0] = joint_states_position[0] 
-            action_position[1] = joint_states_position[1]
-            action_position[2] = joint_states_position[2]
-            action_position[3] = joint_states_position[3]
-            action_position[4] = joint_states_position[4]
-            action_position[5] = joint_states_position[5]
-            action_position[6] = joint_states_position[6]
-            action_position[7] = joint_states_position[7]
-            action_position[8] = joint_states_position[8]
-            action_position[9] = joint_states_position[9] 
-            action_position[10] = joint_states_position[10] - self._joint_increment_value
-            action_position[11] = joint_states_position[11]
-            action_position[12] = joint_states_position[12]
-            action_position[13] = joint_states_position[13]
-            action_position[14] = joint_states_position[14]
-            action_position[15] = joint_states_position[15]
-            action_position[16] = joint_states_position[16]
-            action_position[17] = joint_states_position[17]
-            action_position[18] = joint_states_position[18]
-            action_position[19] = joint_states_position[19]
-        
-        elif action == 22: #Decrement haa_joint
-            action_position[0] = joint_states_position[0] 
-            action_position[1] = joint_states_position[1]
-            action_position[2] = joint_states_position[2]
-            action_position[3] = joint_states_position[3]
-            action_position[4] = joint_states_position[4]
-            action_position[5] = joint_states_position[5]
-            action_position[6] = joint_states_position[6]
-            action_position[7] = joint_states_position[7]
-            action_position[8] = joint_states_position[8]
-            action_position[9] = joint_states_position[9] 
-            action_position[10] = joint_states_position[10]
-            action_position[11] = joint_states_position[11] + self._joint_increment_value
-            action_position[12] = joint_states_position[12]
-            action_position[13] = joint_states_position[13]
-            action_position[14] = joint_states_position[14]
-            action_position[15] = joint_states_position[15]
-            action_position[16] = joint_states_position[16]
-            action_position[17] = joint_states_position[17]
-            action_position[18] = joint_states_position[18]
-            action_position[19] = joint_states_position[19]
-        
-        elif action == 23: #Decrement haa_joint
-            action_position[0] = joint_states_position[0] 
-            action_position[1] = joint_states_position[1]
-            action_position[2] = joint_states_position[2]
-            action_position[3] = joint_states_position[3]
-            action_position[4] = joint_states_position[4]
-            action_position[5] = joint_states_position[5]
-            action_position[6] = joint_states_position[6]
-            action_position[7] = joint_states_position[7]
-            action_position[8] = joint_states_position[8]
-            action_position[9] = joint_states_position[9] 
-            action_position[10] = joint_states_position[10]
-            action_position[11] = joint_states_position[11] - self._joint_increment_value
-            action_position[12] = joint_states_position[12]
-            action_position[13] = joint_states_position[13]
-            action_position[14] = joint_states_position[14]
-            action_position[15] = joint_states_position[15]
-            action_position[16] = joint_states_position[16]
-            action_position[17] = joint_states_position[17]
-            action_position[18] = joint_states_position[18]
-            action_position[19] = joint_states_position[19]
-        
-        elif action == 24: #Decrement haa_joint
-            action_position[0] = joint_states_position[0] 
-            action_position[1] = joint_states_position[1]
-            action_position[2] = joint_states_position[2]
-            action_position[3] = joint_states_position[3]
-            action_position[4] = joint_states_position[4]
-            action_position[5] = joint_states_position[5]
-            action_position[6] = joint_states_position[6]
-            action_position[7] = joint_states_position[7]
-            action_position[8] = joint_states_position[8]
-            action_position[9] = joint_states_position[9] 
-            action_position[10] = joint_states_position[10]
-            action_position[11] = joint_states_position[11]
-            action_position[12] = joint_states_position[12] + self._joint_increment_value
-            action_position[13] = joint_states_position[13]
-            action_position[14] = joint_states_position[14]
-            action_position[15] = joint_states_position[15]
-            action_position[16] = joint_states_position[16]
-            action_position[17] = joint_states_position[17]
-            action_position[18] = joint_states_position[18]
-            action_position[19] = joint_states_position[19]
-        
-        elif action == 25: #Decrement haa_joint
-            action_position[0] = joint_states_position[0] 
-            action_position[1] = joint_states_position[1]
-            action_position[2] = joint_states_position[2]
-            action_position[3] = joint_states_position[3]
-            action_position[4] = joint_states_position[4]
-            action_position[5] = joint_states_position[5]
-            action_position[6] = joint_states_position[6]
-            action_position[7] = joint_states_position[7]
-            action_position[8] = joint_states_position[8]
-            action_position[9] = joint_states_position[9] 
-            action_position[10] = joint_states_position[10]
-            action_position[11] = joint_states_position[11]
-            action_position[12] = joint_states_position[12] - self._joint_increment_value
-            action_position[13] = joint_states_position[13]
-            action_position[14] = joint_states_position[14]
-            action_position[15] = joint_states_position[15]
-            action_position[16] = joint_states_position[16]
-            action_position[17] = joint_states_position[17]
-            action_position[18] = joint_states_position[18]
-            action_position[19] = joint_states_position[19]
-        
-        elif action == 26: #Decrement haa_joint
-            action_position[0] = joint_states_position[0] 
-            action_position[1] = joint_states_position[1]
-            action_position[2] = joint_states_position[2]
-            action_position[3] = joint_states_position[3]
-            action_position[4] = joint_states_position[4]
-            action_position[5] = joint_states_position[5]
-            action_position[6] = joint_states_position[6]
-            action_position[7] = joint_states_position[7]
-            action_position[8] = joint_states_position[8]
-            action_position[9] = joint_states_position[9]
-            action_position[10] = joint_states_position[10]
-            action_position[11] = joint_states_position[11]
-            action_position[12] = joint_states_position[12]
-            action_position[13] = joint_states_position[13] + self._joint_increment_value
-            action_position[14] = joint_states_position[14]
-            action_position[15] = joint_states_position[15]
-            action_position[16] = joint_states_position[16]
-            action_position[17] = joint_states_position[17]
-            action_position[18] = joint_states_position[18]
-            action_position[19] = joint_states_position[19]
-        
-        elif action == 27: #Decrement haa_joint
-            action_position[0] = joint_states_position[0] 
-            action_position[1] = joint_states_position[1]
-            action_position[2] = joint_states_position[2]
-            action_position[3] = joint_states_position[3]
-            action_position[4] = joint_states_position[4]
-            action_position[5] = joint_states_position[5]
-            action_position[6] = joint_states_position[6]
-            action_position[7] = joint_states_position[7]
-            action_position[8] = joint_states_position[8]
-            action_position[9] = joint_states_position[9] 
-            action_position[10] = joint_states_position[10]
-            action_position[11] = joint_states_position[11]
-            action_position[12] = joint_states_position[12]
-            action_position[13] = joint_states_position[13] - self._joint_increment_value
-            action_position[14] = joint_states_position[14]
-            action_position[15] = joint_states_position[15]
-            action_position[16] = joint_states_position[16]
-            action_position[17] = joint_states_position[17]
-            action_position[18] = joint_states_position[18]
-            action_position[19] = joint_states_position[19]
-        
-        elif action == 28: #Decrement haa_joint
-            action_position[0] = joint_states_position[0] 
-            action_position[1] = joint_states_position[1]
-            action_position[2] = joint_states_position[2]
-            action_position[3] = joint_states_position[3]
-            action_position[4] = joint_states_position[4]
-            action_position[5] = joint_states_position[5]
-            action_position[6] = joint_states_position[6]
-            action_position[7] = joint_states_position[7]
-            action_position[8] = joint_states_position[8]
-            action_position[9] = joint_states_position[9] 
-            action_position[10] = joint_states_position[10]
-            action_position[11] = joint_states_position[11]
-            action_position[12] = joint_states_position[12]
-            action_position[13] = joint_states_position[13]
-            action_position[14] = joint_states_position[14] + self._joint_increment_value
-            action_position[15] = joint_states_position[15]
-            action_position[16] = joint_states_position[16]
-            action_position[17] = joint_states_position[17]
-            action_position[18] = joint_states_position[18]
-            action_position[19] = joint_states_position[19]
-        
-        elif action == 29: #Decrement haa_joint
-            action_position[0] = joint_states_position[0] 
-            action_position[1] = joint_states_position[1]
-            action_position[2] = joint_states_position[2]
-            action_position[3] = joint_states_position[3]
-            action_position[4] = joint_states_position[4]
-            action_position[5] = joint_states_position[5]
-            action_position[6] = joint_states_position[6]
-            action_position[7] = joint_states_position[7]
-            action_position[8] = joint_states_position[8]
-            action_position[9] = joint_states_position[9] 
-            action_position[10] = joint_states_position[10]
-            action_position[11] = joint_states_position[11]
-            action_position[12] = joint_states_position[12]
-            action_position[13] = joint_states_position[13]
-            action_position[14] = joint_states_position[14] - self._joint_increment_value
-            action_position[15] = joint_states_position[15]
-            action_position[16] = joint_states_position[16]
-            action_position[17] = joint_states_position[17]
-            action_position[18] = joint_states_position[18]
-            action_position[19] = joint_states_position[19]
-        
-        elif action == 30: #Decrement haa_joint
-            action_position[0] = joint_states_position[0] 
-            action_position[1] = joint_states_position[1]
-            action_position[2] = joint_states_position[2]
-            action_position[3] = joint_states_position[3]
-            action_position[4] = joint_states_position[4]
-            action_position[5] = joint_states_position[5]
-            action_position[6] = joint_states_position[6]
-            action_position[7] = joint_states_position[7]
-            action_position[8] = joint_states_position[8]
-            action_position[9] = joint_states_position[9] 
-            action_position[10] = joint_states_position[10]
-            action_position[11] = joint_states_position[11]
-            action_position[12] = joint_states_position[12]
-            action_position[13] = joint_states_position[13]
-            action_position[14] = joint_states_position[14]
-            action_position[15] = joint_states_position[15] + self._joint_increment_value
-            action_position[16] = joint_states_position[16]
-            action_position[17] = joint_states_position[17]
-            action_position[18] = joint_states_position[18]
-            action_position[19] = joint_states_position[19]
-        
-        elif action == 31: #Decrement haa_joint
-            action_position[0] = joint_states_position[0] 
-            action_position[1] = joint_states_position[1]
-            action_position[2] = joint_states_position[2]
-            action_position[3] = joint_states_position[3]
-            action_position[4] = joint_states_position[4]
-            action_position[5] = joint_states_position[5]
-            action_position[6] = joint_states_position[6]
-            action_position[7] = joint_states_position[7]
-            action_position[8] = joint_states_position[8]
-            action_position[9] = joint_states_position[9] 
-            action_position[10] = joint_states_position[10]
-            action_position[11] = joint_states_position[11]
-            action_position[12] = joint_states_position[12]
-            action_position[13] = joint_states_position[13]
-            action_position[14] = joint_states_position[14]
-            action_position[15] = joint_states_position[15] - self._joint_increment_value
-            action_position[16] = joint_states_position[16]
-            action_position[17] = joint_states_position[17]
-            action_position[18] = joint_states_position[18]
-            action_position[19] = joint_states_position[19]
-        
-        elif action == 32: #Decrement haa_joint
-            action_position[0] = joint_states_position[0] 
-            action_position[1] = joint_states_position[1]
-            action_position[2] = joint_states_position[2]
-            action_position[3] = joint_states_position[3]
-            action_position[4] = joint_states_position[4]
-            action_position[5] = joint_states_position[5]
-            action_position[6] = joint_states_position[6]
-            action_position[7] = joint_states_position[7]
-            action_position[8] = joint_states_position[8]
-            action_position[9] = joint_states_position[9] 
-            action_position[10] = joint_states_position[10]
-            action_position[11] = joint_states_position[11]
-            action_position[12] = joint_states_position[12]
-            action_position[13] = joint_states_position[13]
-            action_position[14] = joint_states_position[14]
-            action_position[15] = joint_states_position[15]
-            action_position[16] = joint_states_position[16] + self._joint_increment_value
-            action_position[17] = joint_states_position[17]
-            action_position[18] = joint_states_position[18]
-            action_position[19] = joint_states_position[19]
-        
-        elif action == 33: #Decrement haa_joint
-            action_position[0] = joint_states_position[0] 
-            action_position[1] = joint_states_position[1]
-            action_position[2] = joint_states_position[2]
-            action_position[3] = joint_states_position[3]
-            action_position[4] = joint_states_position[4]
-            action_position[5] = joint_states_position[5]
-            action_position[6] = joint_states_position[6]
-            action_position[7] = joint_states_position[7]
-            action_position[8] = joint_states_position[8]
-            action_position[9] = joint_states_position[9] 
-            action_position[10] = joint_states_position[10]
-            action_position[11] = joint_states_position[11]
-            action_position[12] = joint_states_position[12]
-            action_position[13] = joint_states_position[13]
-            action_position[14] = joint_states_position[14]
-            action_position[15] = joint_states_position[15]
-            action_position[16] = joint_states_position[16] - self._joint_increment_value
-            action_position[17] = joint_states_position[17]
-            action_position[18] = joint_states_position[18]
-            action_position[19] = joint_states_position[19]
-        
-        elif action == 34: #Decrement haa_joint
-            action_position[0] = joint_states_position[0] 
-            action_position[1] = joint_states_position[1]
-            action_position[2] = joint_states_position[2]
-            action_position[3] = joint_states_position[3]
-            action_position[4] = joint_states_position[4]
-            action_position[5] = joint_states_position[5]
-            action_position[6] = joint_states_position[6]
-            action_position[7] = joint_states_position[7]
-            action_position[8] = joint_states_position[8]
-            action_position[9] = joint_states_position[9] 
-            action_position[10] = joint_states_position[10]
-            action_position[11] = joint_states_position[11]
-            action_position[12] = joint_states_position[12]
-            action_position[13] = joint_states_position[13]
-            action_position[14] = joint_states_position[14]
-            action_position[15] = joint_states_position[15]
-            action_position[16] = joint_states_position[16] 
-            action_position[17] = joint_states_position[17] + self._joint_increment_value
-            action_position[18] = joint_states_position[18]
-            action_position[19] = joint_states_position[19]
-        
-        elif action == 35: #Decrement haa_joint
-            action_position[0] = joint_states_position[0] 
-            action_position[1] = joint_states_position[1]
-            action_position[2] = joint_states_position[2]
-            action_position[3] = joint_states_position[3]
-            action_position[4] = joint_states_position[4]
-            action_position[5] = joint_states_position[5]
-            action_position[6] = joint_states_position[6]
-            action_position[7] = joint_states_position[7]
-            action_position[8] = joint_states_position[8]
-            action_position[9] = joint_states_position[9] 
-            action_position[10] = joint_states_position[10]
-            action_position[11] = joint_states_position[11]
-            action_position[12] = joint_states_position[12]
-            action_position[13] = joint_states_position[13]
-            action_position[14] = joint_states_position[14]
-            action_position[15] = joint_states_position[15]
-            action_position[16] = joint_states_position[16] 
-            action_position[17] = joint_states_position[17] - self._joint_increment_value
-            action_position[18] = joint_states_position[18]
-            action_position[19] = joint_states_position[19]
-        
-        elif action == 36: #Decrement haa_joint
-            action_position[0] = joint_states_position[0] 
-            action_position[1] = joint_states_position[1]
-            action_position[2] = joint_states_position[2]
-            action_position[3] = joint_states_position[3]
-            action_position[4] = joint_states_position[4]
-            action_position[5] = joint_states_position[5]
-            action_position[6] = joint_states_position[6]
-            action_position[7] = joint_states_position[7]
-            action_position[8] = joint_states_position[8]
-            action_position[9] = joint_states_position[9] 
-            action_position[10] = joint_states_position[10]
-            action_position[11] = joint_states_position[11]
-            action_position[12] = joint_states_position[12]
-            action_position[13] = joint_states_position[13]
-            action_position[14] = joint_states_position[14]
-            action_position[15] = joint_states_position[15]
-            action_position[16] = joint_states_position[16] 
-            action_position[17] = joint_states_position[17]
-            action_position[18] = joint_states_position[18] + self._joint_increment_value
-            action_position[19] = joint_states_position[19]
-        
-        elif action == 37: #Decrement haa_joint
-            action_position[0] = joint_states_position[0] 
-            action_position[1] = joint_states_position[1]
-            action_position[2] = joint_states_position[2]
-            action_position[3] = joint_states_position[3]
-            action_position[4] = joint_states_position[4]
-            action_position[5] = joint_states_position[5]
-            action_position[6] = joint_states_position[6]
-            action_position[7] = joint_states_position[7]
-            action_position[8] = joint_states_position[8]
-            action_position[9] = joint_states_position[9] 
-            action_position[10] = joint_states_position[10]
-            action_position[11] = joint_states_position[11]
-            action_position[12] = joint_states_position[12]
-            action_position[13] = joint_states_position[13]
-            action_position[14] = joint_states_position[14]
-            action_position[15] = joint_states_position[15]
-            action_position[16] = joint_states_position[16] 
-            action_position[17] = joint_states_position[17]
-            action_position[18] = joint_states_position[18] - self._joint_increment_value
-            action_position[19] = joint_states_position[19]
-        
-        elif action == 38: #Decrement haa_joint
-            action_position[0] = joint_states_position[0] 
-            action_position[1] = joint_states_position[1]
-            action_position[2] = joint_states_position[2]
-            action_position[3] = joint_states_position[3]
-            action_position[4] = joint_states_position[4]
-            action_position[5] = joint_states_position[5]
-            action_position[6] = joint_states_position[6]
-            action_position[7] = joint_states_position[7]
-            action_position[8] = joint_states_position[8]
-            action_position[9] = joint_states_position[9] 
-            action_position[10] = joint_states_position[10]
-            action_position[11] = joint_states_position[11]
-            action_position[12] = joint_states_position[12]
-            action_position[13] = joint_states_position[13]
-            action_position[14] = joint_states_position[14]
-            action_position[15] = joint_states_position[15]
-            action_position[16] = joint_states_position[16] 
-            action_position[17] = joint_states_position[17]
-            action_position[18] = joint_states_position[18] 
-            action_position[19] = joint_states_position[19] + self._joint_increment_value
-        
-        elif action == 39: #Decrement haa_joint
-            action_position[0] = joint_states_position[0] 
-            action_position[1] = joint_states_position[1]
-            action_position[2] = joint_states_position[2]
-            action_position[3] = joint_states_position[3]
-            action_position[4] = joint_states_position[4]
-            action_position[5] = joint_states_position[5]
-            action_position[6] = joint_states_position[6]
-            action_position[7] = joint_states_position[7]
-            action_position[8] = joint_states_position[8]
-            action_position[9] = joint_states_position[9] 
-            action_position[10] = joint_states_position[10]
-            action_position[11] = joint_states_position[11]
-            action_position[12] = joint_states_position[12]
-            action_position[13] = joint_states_position[13]
-            action_position[14] = joint_states_position[14]
-            action_position[15] = joint_states_position[15]
-            action_position[16] = joint_states_position[16] 
-            action_position[17] = joint_states_position[17]
-            action_position[18] = joint_states_position[18]
-            action_position[19] = joint_states_position[19] - self._joint_increment_value       
-
-        return action_position
+        return self._action_table.next_positions(action, self.get_joint_positions())
 
     def process_data(self):
         """
         We return the total reward based on the state in which we are in and if its done or not
-        ( it fell basically )
-        :return: reward, done
+        ( it fell basically ), with the value of every term of the reward
+        :return: reward, done, reward_terms dict {REWARD_TERMS name: value}, the
+                 penalties are positive and subtracted from alive. If it fell
+                 only {"fell": done_reward} is given.
         """
         catbot_height_ok = self.catbot_height_ok()
         catbot_orientation_ok = self.catbot_orientation_ok()
@@ -1795,18 +949,22 @@ class CatbotState(object):
 
         done = not(catbot_height_ok and catbot_orientation_ok)
         if done:
-            rospy.logdebug("It fell, so the reward has to be very low")
+            if debug_enabled():
+                rospy.logdebug("It fell, so the reward has to be very low")
             total_reward = self._done_reward
+            reward_terms = {"fell": self._done_reward}
         else:
-            rospy.logdebug("Calculate normal reward because it didn't fall.")
-            total_reward = self.calculate_total_reward()
+            total_reward, penalties = self.calculate_total_reward()
+            reward_terms = dict(zip(REWARD_TERMS[1:], penalties.tolist()))
+            reward_terms["alive"] = self._alive_reward
 
-        return total_reward, done
+        return total_reward, done, reward_terms
 
     def testing_loop(self):
 
         rate = rospy.Rate(50)
         while not rospy.is_shutdown():
+            self.take_snapshot()
             self.calculate_total_reward()
             rate.sleep()
 
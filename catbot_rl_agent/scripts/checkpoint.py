@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+'''
+    Crash safe, incremental checkpoints of the tabular training state.
+
+    A checkpoint directory holds:
+        checkpoint.json     episode counter, epsilon, RNG states, extra fields
+                            and which snapshot and delta logs make up the table
+        snapshot-<N>.pkl    a full Q-table, as a pickled {(state, action): value}
+        deltas-<N>.log      append-only log, one pickled list of
+                            ((state, action), value) per checkpoint
+
+    Every save only appends the entries changed since the previous save, and
+    checkpoint.json is replaced atomically once they are on disk, so a crash
+    at any point leaves the last committed checkpoint readable.
+    The writing happens in a background thread. Every compact_every saves the
+    logs are merged into a new snapshot by a separate process (see compact),
+    so not even a multi gigabyte table stalls the training loop.
+'''
+import json
+import os
+import pickle
+import queue
+import random
+import subprocess
+import sys
+import threading
+import rospy
+
+CHECKPOINT_VERSION = 1
+META_NAME = "checkpoint.json"
+
+
+def atomic_write(path, data):
+    """
+    Writes data to path so that path either has the old or the new content
+    :param path:
+    :param data: bytes
+    :return:
+    """
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as tmp_file:
+        tmp_file.write(data)
+        tmp_file.flush()
+        os.fsync(tmp_file.fileno())
+    os.replace(tmp_path, path)
+    dir_fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+
+
+def read_deltas(path, size):
+    """
+    Reads the records of a delta log up to its committed size
+    :param path:
+    :param size: committed size in bytes, anything after it is a torn write
+    :return: generator of lists of ((state, action), value)
+    """
+    if size == 0 or not os.path.exists(path):
+        return
+    with open(path, "rb") as log_file:
+        while log_file.tell() < size:
+            yield pickle.load(log_file)
+
+
+def compact(directory, snapshot, segments, new_snapshot):
+    """
+    Merges a snapshot and the delta logs after it into a new snapshot.
+    Only reads committed data, so it is safe to run while the trainer keeps
+    appending to a newer log.
+    :param directory:
+    :param snapshot: name of the current snapshot, or None
+    :param segments: list of {"name", "size"} of the logs to merge, in order
+    :param new_snapshot: name of the snapshot to write
+    :return:
+    """
+    table = {}
+    if snapshot:
+        with open(os.path.join(directory, snapshot), "rb") as snapshot_file:
+            table = pickle.load(snapshot_file)
+    for segment in segments:
+        for entries in read_deltas(os.path.join(directory, segment["name"]), segment["size"]):
+            table.update(entries)
+    atomic_write(os.path.join(directory, new_snapshot),
+                 pickle.dumps(table, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+class Checkpointer(object):
+
+    def __init__(self, directory, compact_every=20):
+        self.directory = directory
+        self.compact_every = compact_every
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        self._meta = self._read_meta()
+        self._saves = 0
+        self._compactor = None
+        self._compacting = None
+
+        self._jobs = queue.Queue()
+        self._writer = threading.Thread(target=self._writer_loop, name="checkpoint_writer")
+        self._writer.daemon = True
+        self._writer.start()
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _read_meta(self):
+        try:
+            with open(self._path(META_NAME)) as meta_file:
+                return json.load(meta_file)
+        except (IOError, OSError):
+            return {"version": CHECKPOINT_VERSION,
+                    "generation": 0,
+                    "snapshot": None,
+                    "segments": [{"name": "deltas-0.log", "size": 0}]}
+
+    def _write_meta(self):
+        atomic_write(self._path(META_NAME), json.dumps(self._meta).encode())
+
+    def exists(self):
+        return os.path.exists(self._path(META_NAME))
+
+    def save(self, qlearn, episode, extra=None):
+        """
+        Queues a checkpoint of the learner, only the entries changed since the
+        previous save are taken. Returns straight away.
+        :param qlearn: QLearn or ArrayQLearn
+        :param episode: number of the next episode to run when resuming
+        :param extra: JSON serialisable dict with anything else worth keeping
+        :return:
+        """
+        entries = qlearn.pop_dirty_entries()
+        fields = {"episode": episode,
+                  "epsilon": qlearn.epsilon,
+                  "qlearn_rng": qlearn.rng.bit_generator.state,
+                  "python_rng": random.getstate(),
+                  "extra": extra or {}}
+        self._jobs.put((self._append, (entries, fields)))
+        self._saves += 1
+        if self.compact_every and self._saves % self.compact_every == 0:
+            self._jobs.put((self._start_compaction, ()))
+
+    def load(self, qlearn):
+        """
+        Restores the Q-table, epsilon and RNG states of the last checkpoint
+        into qlearn.
+        :param qlearn: freshly created QLearn or ArrayQLearn
+        :return: the checkpoint fields (episode, extra...) or None if there is none
+        """
+        if not self.exists():
+            return None
+        meta = self._meta
+        if meta["snapshot"]:
+            with open(self._path(meta["snapshot"]), "rb") as snapshot_file:
+                qlearn.load_entries(pickle.load(snapshot_file).items())
+        for segment in meta["segments"]:
+            path = self._path(segment["name"])
+            for entries in read_deltas(path, segment["size"]):
+                qlearn.load_entries(entries)
+            # Drop whatever a crash left after the last committed record
+            if os.path.exists(path) and os.path.getsize(path) > segment["size"]:
+                with open(path, "r+b") as log_file:
+                    log_file.truncate(segment["size"])
+        self._remove_unreferenced()
+
+        qlearn.epsilon = meta["epsilon"]
+        qlearn.rng.bit_generator.state = meta["qlearn_rng"]
+        version, internal_state, gauss = meta["python_rng"]
+        random.setstate((version, tuple(internal_state), gauss))
+        rospy.loginfo("Checkpoint loaded, episode==" + str(meta["episode"]))
+        return meta
+
+    def _remove_unreferenced(self):
+        referenced = set([META_NAME, self._meta["snapshot"]])
+        referenced.update(segment["name"] for segment in self._meta["segments"])
+        for name in os.listdir(self.directory):
+            if name not in referenced and (name.startswith("snapshot-") or name.startswith("deltas-")
+                                           or name.endswith(".tmp")):
+                os.remove(self._path(name))
+
+    def _writer_loop(self):
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                break
+            function, args = job
+            try:
+                function(*args)
+            except Exception as e:
+                rospy.logerr("Checkpoint write failed==>" + str(e))
+
+    def _append(self, entries, fields):
+        self._poll_compaction()
+        segment = self._meta["segments"][-1]
+        path = self._path(segment["name"])
+        with open(path, "ab") as log_file:
+            log_file.seek(segment["size"])
+            log_file.truncate()
+            pickle.dump(entries, log_file, protocol=pickle.HIGHEST_PROTOCOL)
+            log_file.flush()
+            os.fsync(log_file.fileno())
+            segment["size"] = log_file.tell()
+        self._meta.update(fields)
+        self._write_meta()
+        rospy.logdebug("Checkpoint saved, entries==" + str(len(entries)))
+
+    def _start_compaction(self):
+        """
+        Closes the current log and merges everything before it in a child process
+        :return:
+        """
+        self._poll_compaction()
+        if self._compactor is not None:
+            # The previous one is still running, try again next time
+            return
+        generation = self._meta["generation"] + 1
+        merged = list(self._meta["segments"])
+        self._meta["generation"] = generation
+        self._meta["segments"].append({"name": "deltas-%d.log" % generation, "size": 0})
+        self._write_meta()
+
+        new_snapshot = "snapshot-%d.pkl" % generation
+        self._compacting = (new_snapshot, merged)
+        self._compactor = subprocess.Popen([sys.executable, os.path.abspath(__file__), "compact",
+                                            self.directory,
+                                            json.dumps(self._meta["snapshot"]),
+                                            json.dumps(merged),
+                                            new_snapshot])
+
+    def _poll_compaction(self, wait=False):
+        if self._compactor is None:
+            return
+        if wait:
+            self._compactor.wait()
+        if self._compactor.poll() is None:
+            return
+        new_snapshot, merged = self._compacting
+        if self._compactor.returncode == 0:
+            merged_names = set(segment["name"] for segment in merged)
+            self._meta["snapshot"] = new_snapshot
+            self._meta["segments"] = [segment for segment in self._meta["segments"]
+                                      if segment["name"] not in merged_names]
+            self._write_meta()
+            self._remove_unreferenced()
+            rospy.loginfo("Checkpoint compacted into " + new_snapshot)
+        else:
+            rospy.logerr("Checkpoint compaction failed, keeping the delta logs")
+        self._compactor = None
+        self._compacting = None
+
+    def close(self):
+        """
+        Waits for the queued checkpoints and any running compaction to finish
+        :return:
+        """
+        self._jobs.put((self._poll_compaction, (True,)))
+        self._jobs.put(None)
+        self._writer.join()
+
+
+if __name__ == '__main__':
+    # Child process started by Checkpointer._start_compaction
+    if len(sys.argv) != 6 or sys.argv[1] != "compact":
+        sys.exit("Usage: checkpoint.py compact <directory> <snapshot> <segments> <new_snapshot>")
+    compact(sys.argv[2], json.loads(sys.argv[3]), json.loads(sys.argv[4]), sys.argv[5])
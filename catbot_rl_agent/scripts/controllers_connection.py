@@ -2,13 +2,30 @@
 
 import rospy
 from controller_manager_msgs.srv import SwitchController, SwitchControllerRequest, SwitchControllerResponse
+from controller_manager_msgs.srv import ListControllers
+from persistent_service import PersistentService
+
+# catbot_gazebo/launch/controllers.launch loads either the one position controller per
+# joint or the group one, depending on its command_mode, the yaml declares them all
+GROUP_CONTROLLER = "joint_group_position_controller"
+JOINT_CONTROLLER_SUFFIX = "_joint_position_controller"
 
 class ControllersConnection():
     
     def __init__(self, namespace):
-
-        self.switch_service_name = '/controller_manager/switch_controller'
-        self.switch_service = rospy.ServiceProxy(self.switch_service_name, SwitchController)
+        """
+        :param namespace: of the robot and its controller_manager, like /catbot_0 with
+                          catbot_gazebo/launch/multi_catbot.launch, None or "" for the global one
+        """
+        self.namespace = (namespace or "").rstrip('/')
+        self.switch_service_name = self.namespace + '/controller_manager/switch_controller'
+        self.switch_service = PersistentService(self.switch_service_name, SwitchController)
+        self.list_service_name = self.namespace + '/controller_manager/list_controllers'
+        self.list_service = PersistentService(self.list_service_name, ListControllers)
+        # Controllers of the parameter server, read on the first reset
+        self._monoped_controllers = None
+        # Configured controllers last reported as not loaded, to warn only when it changes
+        self._missing_controllers = []
 
     def switch_controllers(self, controllers_on, controllers_off, strictness=1):
         """
@@ -17,12 +34,10 @@ class ControllersConnection():
         :param controllers_off: ["name_controler_1", "name_controller2",...,"name_controller_n"]
         :return:
         """
-        rospy.wait_for_service(self.switch_service_name)
-
         try:
             switch_request_object = SwitchControllerRequest()
             switch_request_object.start_controllers = controllers_on
-            switch_request_object.start_controllers = controllers_off
+            switch_request_object.stop_controllers = controllers_off
             switch_request_object.strictness = strictness
 
             switch_result = self.switch_service(switch_request_object)
@@ -45,53 +60,85 @@ class ControllersConnection():
 
             return None
 
+    def list_controllers(self):
+        """
+        States of the loaded controllers
+        :return: {"name_controller": "running" or "stopped"...}, None if the call failed
+        """
+        try:
+            list_result = self.list_service()
+            return dict((controller.name, controller.state) for controller in list_result.controller)
+
+        except rospy.ServiceException as e:
+            print (self.list_service_name+" service call failed")
+
+            return None
+
+    def configured_controllers(self):
+        """
+        Names of the controllers declared in the parameter server, the namespaces with
+        a type right under the one of the robot, like the ones of
+        catbot_gazebo/config/effort_controller.yaml
+        :return: ["name_controler_1", "name_controller2",...,"name_controller_n"]
+        """
+        prefix = self.namespace + '/'
+        return sorted(name[len(prefix):].split('/')[0] for name in rospy.get_param_names()
+                      if name.startswith(prefix) and name[len(prefix):].count('/') == 1 and name.endswith('/type'))
+
     def reset_controllers(self, controllers_reset):
         """
-        We turn on and off the given controllers
+        We turn off and on the given controllers, in a single request, so the
+        controller manager restarts them all in the same update
         :param controllers_reset: ["name_controler_1", "name_controller2",...,"name_controller_n"]
         :return:
         """
-        reset_result = False
-
-        result_off_ok = self.switch_controllers(controllers_on = [],
-                                controllers_off = controllers_reset)
-
-        if result_off_ok:
-            result_on_ok = self.switch_controllers(controllers_on=controllers_reset,
-                                                    controllers_off=[])
-            if result_on_ok:
-                rospy.logdebug("Controllers Reseted==>"+str(controllers_reset))
-                reset_result = True
-            else:
-                rospy.logdebug("result_on_ok==>" + str(result_on_ok))
+        reset_result = self.switch_controllers(controllers_on=controllers_reset,
+                                               controllers_off=controllers_reset)
+        if reset_result:
+            rospy.logdebug("Controllers Reseted==>"+str(controllers_reset))
         else:
-            rospy.logdebug("result_off_ok==>" + str(result_off_ok))
+            rospy.logdebug("reset_result==>" + str(reset_result))
 
-        return reset_result
+        return bool(reset_result)
+
+    def alternative_controllers(self, controller_states):
+        """
+        Configured controllers that are not meant to be loaded with the command_mode
+        in use, the per joint ones with the group one and the other way around
+        :param controller_states: as returned by list_controllers
+        :return: set of names
+        """
+        if GROUP_CONTROLLER in controller_states:
+            return set(name for name in self._monoped_controllers if name.endswith(JOINT_CONTROLLER_SUFFIX))
+        return set([GROUP_CONTROLLER])
 
     def reset_monoped_joint_controllers(self):
-        controllers_reset = [
-            'joint_state_controller',
-            'bum_zlj_joint_position_controller',
-            'bum_xlj_joint_position_controller',
-            'bum_ylj_joint_position_controller',
-            'knee_left_joint_position_controller',
-            'ankle_lj_joint_position_controller',
-            'foot_lj_joint_position_controller',
-            'bum_zrj_joint_position_controller',
-            'bum_xrj_joint_position_controller',
-            'bum_yrj_joint_position_controller',
-            'knee_right_joint_position_controller',
-            'ankle_rj_joint_position_controller',
-            'foot_rj_joint_position_controller',
-            'shoulder_zlj_joint_position_controller',
-            'shoulder_xlj_joint_position_controller',
-            'shoulder_ylj_joint_position_controller',
-            'forearm_ylj_joint_position_controller',
-            'shoulder_zrj_joint_position_controller',
-            'shoulder_xrj_joint_position_controller',
-            'shoulder_yrj_joint_position_controller',
-            'forearm_yrj_joint_position_controller',
-
-        ]
-        self.reset_controllers(controllers_reset)
+        """
+        Restarts the controllers of the robot, unless they are all running already
+        :return: True if they are all running afterwards
+        """
+        controller_states = self.list_controllers()
+        if controller_states is None:
+            return False
+
+        if self._monoped_controllers is None:
+            self._monoped_controllers = self.configured_controllers()
+            rospy.logdebug("Monoped controllers==>" + str(self._monoped_controllers))
+        # Only the loaded ones, skipping the alternatives of the other command_mode
+        alternatives = self.alternative_controllers(controller_states)
+        missing = [name for name in self._monoped_controllers
+                   if name not in controller_states and name not in alternatives]
+        if missing != self._missing_controllers:
+            if missing:
+                rospy.logwarn("Controllers of the parameter server not loaded==>" + str(missing))
+            self._missing_controllers = missing
+        controllers_reset = [name for name in self._monoped_controllers if name in controller_states]
+        if not controllers_reset:
+            rospy.logwarn("None of the controllers of " + str(self.namespace or "/") + " is loaded==>" +
+                          str(self._monoped_controllers))
+            return False
+
+        if all(controller_states[name] == "running" for name in controllers_reset):
+            rospy.logdebug("All controllers running, no reset needed")
+            return True
+        return self.reset_controllers(controllers_reset)
@@ -7,6 +7,11 @@ import rospkg
 from gym import wrappers
 import rospy
     
+rospy.init_node('catbot_dqn', anonymous=True, log_level=rospy.INFO)
+# The network takes the float observations, the replay buffer keeps them so they are copied
+rospy.set_param("/observation_mode", "box")
+rospy.set_param("/observation_copy", True)
+
 # Create environment
 # env = gym.make('LunarLander-v2')
 env = gym.make('bipedal-catbot-v0')
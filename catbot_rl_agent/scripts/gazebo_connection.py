@@ -4,67 +4,151 @@ import rospy
 from std_srvs.srv import Empty
 from gazebo_msgs.msg import ODEPhysics
 from gazebo_msgs.srv import SetPhysicsProperties, SetPhysicsPropertiesRequest
+from gazebo_msgs.srv import GetModelState, SetModelState, SetModelConfiguration, SetModelConfigurationRequest
 from std_msgs.msg import Float64
 from geometry_msgs.msg import Vector3
+from persistent_service import PersistentService
+
+# Physics settings used when no physics_profiles are loaded, Gazebo capped at real time
+DEFAULT_PHYSICS_PROFILE = {"time_step": 0.001,
+                           "max_update_rate": 1000.0,
+                           "auto_disable_bodies": False,
+                           "sor_pgs_precon_iters": 0,
+                           "sor_pgs_iters": 50,
+                           "sor_pgs_w": 1.3,
+                           "sor_pgs_rms_error_tol": 0.0,
+                           "contact_surface_layer": 0.001,
+                           "contact_max_correcting_vel": 0.0,
+                           "cfm": 0.0,
+                           "erp": 0.2,
+                           "max_contacts": 20}
 
 class GazeboConnection():
     
-    def __init__(self):
-        
-        self.unpause = rospy.ServiceProxy('/gazebo/unpause_physics', Empty)
-        self.pause = rospy.ServiceProxy('/gazebo/pause_physics', Empty)
-        self.reset_proxy = rospy.ServiceProxy('/gazebo/reset_simulation', Empty)
+    def __init__(self, physics_profile=None, lockstep=None):
+        """
+        :param physics_profile: name of the entry of the physics_profiles param to apply,
+                                the physics_profile param by default
+        :param lockstep: whether stepSim is used, by default when the lockstep_iterations param is set
+        """
+        self.physics_profiles = rospy.get_param("/physics_profiles", {})
+        self.physics_profile = physics_profile or rospy.get_param("/physics_profile", None)
+
+        # Connections stay open between calls and reopen by themselves if Gazebo restarts
+        self.unpause = PersistentService('/gazebo/unpause_physics', Empty)
+        self.pause = PersistentService('/gazebo/pause_physics', Empty)
+        self.reset_proxy = PersistentService('/gazebo/reset_simulation', Empty)
+        self.reset_world_proxy = PersistentService('/gazebo/reset_world', Empty)
+        if lockstep is None:
+            lockstep = rospy.get_param("/lockstep_iterations", 0) > 0
+        if lockstep:
+            # Offered by world/training.world, its service type needs catbot_gazebo built.
+            # Not retried, a retry would step the world twice.
+            from catbot_gazebo.srv import StepWorld
+            self.step_world = PersistentService('/gazebo/step_world', StepWorld, retry=False)
+        else:
+            self.step_world = None
+        # Used by the fast reset of CatbotEnv
+        self.get_model_state = PersistentService('/gazebo/get_model_state', GetModelState)
+        self.set_model_state = PersistentService('/gazebo/set_model_state', SetModelState)
+        self.set_model_configuration = PersistentService('/gazebo/set_model_configuration', SetModelConfiguration)
 
         # Setup the Gravity Controle system
-        service_name = '/gazebo/set_physics_properties'
-        rospy.logdebug("Waiting for service " + str(service_name))
-        rospy.wait_for_service(service_name)
-        rospy.logdebug("Service Found " + str(service_name))
+        self.set_physics = PersistentService('/gazebo/set_physics_properties', SetPhysicsProperties)
+        self.set_physics.connect()
+        rospy.logdebug("Service Found " + str(self.set_physics.name))
 
-        self.set_physics = rospy.ServiceProxy(service_name, SetPhysicsProperties)
         self.init_values()
         # We always pause the simulation, important for legged robots learning
         self.pauseSim()
 
     def pauseSim(self):
-        rospy.wait_for_service('/gazebo/pause_physics')
         try:
             self.pause()
         except rospy.ServiceException as e:
             print ("/gazebo/pause_physics service call failed")
         
     def unpauseSim(self):
-        rospy.wait_for_service('/gazebo/unpause_physics')
         try:
             self.unpause()
         except rospy.ServiceException as e:
             print ("/gazebo/unpause_physics service call failed")
         
     def resetSim(self):
-        rospy.wait_for_service('/gazebo/reset_simulation')
         try:
             self.reset_proxy()
         except rospy.ServiceException as e:
             print ("/gazebo/reset_simulation service call failed")
 
+    def stepSim(self, iterations):
+        """
+        Runs exactly iterations physics iterations and returns once they are done.
+        The simulation is left paused.
+        :param iterations:
+        :return: simulation time after the step, None if the call failed
+        """
+        if self.step_world is None:
+            raise NameError('stepSim needs a GazeboConnection created with lockstep')
+        try:
+            return self.step_world(iterations).sim_time
+        except rospy.ServiceException as e:
+            print ("/gazebo/step_world service call failed")
+            return None
+
+    def getModelState(self, model_name, reference_frame="world"):
+        """
+        :return: gazebo_msgs/GetModelStateResponse, None if the call failed
+        """
+        try:
+            return self.get_model_state(model_name, reference_frame)
+        except rospy.ServiceException as e:
+            print ("/gazebo/get_model_state service call failed")
+            return None
+
+    def setModelState(self, model_state):
+        """
+        Sets the pose and twist of a whole model at once
+        :param model_state: gazebo_msgs/ModelState
+        :return: success
+        """
+        try:
+            return self.set_model_state(model_state).success
+        except rospy.ServiceException as e:
+            print ("/gazebo/set_model_state service call failed")
+            return False
+
+    def setModelConfiguration(self, model_name, joint_names, joint_positions, urdf_param_name="robot_description"):
+        """
+        Moves the given joints of a model straight to the given positions
+        :return: success
+        """
+        request = SetModelConfigurationRequest()
+        request.model_name = model_name
+        request.urdf_param_name = urdf_param_name
+        request.joint_names = list(joint_names)
+        request.joint_positions = [float(position) for position in joint_positions]
+        try:
+            return self.set_model_configuration(request).success
+        except rospy.ServiceException as e:
+            print ("/gazebo/set_model_configuration service call failed")
+            return False
+
     def resetWorld(self):
-        rospy.wait_for_service('/gazebo/reset_world')
         try:
-            self.reset_proxy()
+            self.reset_world_proxy()
         except rospy.ServiceException as e:
             print ("/gazebo/reset_world service call failed")
 
     def init_values(self):
 
-        rospy.wait_for_service('/gazebo/reset_simulation')
         try:
             # reset_proxy.call()
             self.reset_proxy()
         except rospy.ServiceException as e:
             print ("/gazebo/reset_simulation service call failed")
 
-        self._time_step = Float64(0.001)
-        self._max_update_rate = Float64(1000.0)
+        self._time_step = Float64()
+        self._max_update_rate = Float64()
 
         self._gravity = Vector3()
         self._gravity.x = 0.0
@@ -72,23 +156,53 @@ class GazeboConnection():
         self._gravity.z = 0.0
 
         self._ode_config = ODEPhysics()
-        self._ode_config.auto_disable_bodies = False
-        self._ode_config.sor_pgs_precon_iters = 0
-        self._ode_config.sor_pgs_iters = 50
-        self._ode_config.sor_pgs_w = 1.3
-        self._ode_config.sor_pgs_rms_error_tol = 0.0
-        self._ode_config.contact_surface_layer = 0.001
-        self._ode_config.contact_max_correcting_vel = 0.0
-        self._ode_config.cfm = 0.0
-        self._ode_config.erp = 0.2
-        self._ode_config.max_contacts = 20
+
+        self.set_physics_profile(self.physics_profile)
+
+    def physics_profile_values(self, name):
+        """
+        Settings of a profile of the physics_profiles param, the ones it does not
+        give come from DEFAULT_PHYSICS_PROFILE
+        :param name: None for DEFAULT_PHYSICS_PROFILE alone
+        :return: {setting: value}
+        """
+        values = dict(DEFAULT_PHYSICS_PROFILE)
+        if name is None:
+            return values
+        if name not in self.physics_profiles:
+            raise NameError('Unknown physics_profile==' + str(name) + ', the physics_profiles are==' +
+                            str(sorted(self.physics_profiles)))
+        profile = self.physics_profiles[name]
+        unknown = set(profile) - set(DEFAULT_PHYSICS_PROFILE)
+        if unknown:
+            raise NameError('Unknown settings in physics_profile ' + str(name) + '==' + str(sorted(unknown)))
+        for setting, value in profile.items():
+            # Same type as the default, the uint32 fields of ODEPhysics do not take 50.0
+            values[setting] = type(DEFAULT_PHYSICS_PROFILE[setting])(value)
+        return values
+
+    def set_physics_profile(self, name):
+        """
+        Applies a profile of the physics_profiles param, in a single
+        set_physics_properties call that keeps the current gravity
+        :param name: None for DEFAULT_PHYSICS_PROFILE
+        :return:
+        """
+        values = self.physics_profile_values(name)
+        self._time_step.data = float(values["time_step"])
+        # 0 runs the physics as fast as it can go
+        self._max_update_rate.data = float(values["max_update_rate"])
+        for setting, value in values.items():
+            if setting not in ("time_step", "max_update_rate"):
+                setattr(self._ode_config, setting, value)
+        self.physics_profile = name
+        rospy.logdebug("Physics profile==" + str(name) + "==>" + str(values))
 
         self.update_gravity_call()
 
     def update_gravity_call(self):
 
-        self.pauseSim()
-
+        # No need to pause before, Gazebo pauses the world itself while it applies the properties
         set_physics_request = SetPhysicsPropertiesRequest()
         set_physics_request.time_step = self._time_step.data
         set_physics_request.max_update_rate = self._max_update_rate.data
@@ -107,4 +221,20 @@ class GazeboConnection():
         self._gravity.y = y
         self._gravity.z = z
 
-        self.update_gravity_call()
\ No newline at end of file
+        self.update_gravity_call()
+
+    def service_stats(self):
+        """
+        Latency of the calls to every Gazebo service since the last reset_service_stats
+        :return: {service name: PersistentService.stats()}
+        """
+        return dict((service.name, service.stats()) for service in self._services())
+
+    def reset_service_stats(self):
+        for service in self._services():
+            service.reset_stats()
+
+    def _services(self):
+        services = (self.pause, self.unpause, self.reset_proxy, self.reset_world_proxy, self.set_physics,
+                    self.step_world, self.get_model_state, self.set_model_state, self.set_model_configuration)
+        return [service for service in services if service is not None]
@@ -2,33 +2,91 @@
 
 import rospy
 import math
+import time
+import numpy
 from std_msgs.msg import String
 from std_msgs.msg import Float64
+from std_msgs.msg import Float64MultiArray
+
+# Order of the targets given to move_joints, the same as the joints of configs/actions.yaml
+JOINT_NAMES = ["bum_zlj", "bum_xlj", "bum_ylj", "knee_left", "ankle_lj", "foot_lj",
+               "bum_zrj", "bum_xrj", "bum_yrj", "knee_right", "ankle_rj", "foot_rj",
+               "shoulder_zlj", "shoulder_xlj", "shoulder_ylj", "forearm_ylj",
+               "shoulder_zrj", "shoulder_xrj", "shoulder_yrj", "forearm_yrj"]
 
 class JointPub(object):
-    def __init__(self):
-
-        self.publishers_array = []
-        self._bum_zlj_pub = rospy.Publisher('/bum_zlj_joint_position_controller/command', Float64, queue_size=1)
-        self._bum_xlj_pub = rospy.Publisher('/bum_xlj_joint_position_controller/command', Float64, queue_size=1)
-        self._bum_ylj_pub = rospy.Publisher('/bum_ylj_joint_position_controller/command', Float64, queue_size=1)
-        self._knee_left_pub = rospy.Publisher('/knee_left_joint_position_controller/command', Float64, queue_size=1)
-        self._ankle_lj_pub = rospy.Publisher('/ankle_lj_joint_position_controller/command', Float64, queue_size=1)
-        self._foot_lj_pub = rospy.Publisher('/foot_lj_joint_position_controller/command', Float64, queue_size=1)
-        self._bum_zrj_pub = rospy.Publisher('/bum_zrj_joint_position_controller/command', Float64, queue_size=1)
-        self._bum_xrj_pub = rospy.Publisher('/bum_xrj_joint_position_controller/command', Float64, queue_size=1)
-        self._bum_yrj_pub = rospy.Publisher('/bum_yrj_joint_position_controller/command', Float64, queue_size=1)
-        self._knee_right_pub = rospy.Publisher('/knee_right_joint_position_controller/command', Float64, queue_size=1)
-        self._ankle_rj_pub = rospy.Publisher('/ankle_rj_joint_position_controller/command', Float64, queue_size=1)
-        self._foot_rj_pub = rospy.Publisher('/foot_rj_joint_position_controller/command', Float64, queue_size=1)
-        self._shoulder_zlj_pub = rospy.Publisher('/shoulder_zlj_joint_position_controller/command', Float64, queue_size=1)
-        self._shoulder_xlj_pub = rospy.Publisher('/shoulder_xlj_joint_position_controller/command', Float64, queue_size=1)
-        self._shoulder_ylj_pub = rospy.Publisher('/shoulder_ylj_joint_position_controller/command', Float64, queue_size=1)
-        self._forearm_ylj_pub = rospy.Publisher('/forearm_ylj_joint_position_controller/command', Float64, queue_size=1)
-        self._shoulder_zrj_pub = rospy.Publisher('/shoulder_zrj_joint_position_controller/command', Float64, queue_size=1)
-        self._shoulder_xrj_pub = rospy.Publisher('/shoulder_xrj_joint_position_controller/command', Float64, queue_size=1)
-        self._shoulder_yrj_pub = rospy.Publisher('/shoulder_yrj_joint_position_controller/command', Float64, queue_size=1)
-        self._forearm_yrj_pub = rospy.Publisher('/forearm_yrj_joint_position_controller/command', Float64, queue_size=1)
+    def __init__(self, command_mode="joint", joint_names=None, namespace=""):
+        """
+        :param command_mode: "joint" to publish to one position controller per joint,
+                             "group" to send all the targets at once to joint_group_position_controller
+        :param joint_names: order of the targets given to move_joints, JOINT_NAMES by default
+        :param namespace: of the robot, like /catbot_0 with catbot_gazebo/launch/multi_catbot.launch,
+                          "" for the single robot of catbot.launch
+        """
+        self.command_mode = command_mode
+        self.namespace = namespace.rstrip('/')
+        self.joint_names = list(joint_names) if joint_names is not None else list(JOINT_NAMES)
+        if command_mode == "group":
+            self._init_group_command()
+        elif command_mode == "joint":
+            if self.joint_names != JOINT_NAMES:
+                raise NameError('The per joint publishers expect the joints in the order==' + str(JOINT_NAMES))
+            self._init_joint_command()
+        else:
+            raise NameError('Unknown command_mode==' + str(command_mode))
+
+        self.init_pos = [
+            0.0,
+            0.0,
+            0.0,
+            0.0,
+            0.0,
+            0.0,
+            0.0,
+            0.0,
+            0.0,
+            0.0,
+            0.0,
+            0.0,
+            0.0,
+            0.0,
+            0.0,
+            0.0,
+            0.0,
+            0.0,
+            0.0,
+            0.0,
+            ]
+
+        # Set once check_publishers_connection saw every publisher connected
+        self._publishers_ready = False
+
+
+    def _init_joint_command(self):
+        """
+        One publisher per joint_position_controller, in JOINT_NAMES order
+        :return:
+        """
+        self._bum_zlj_pub = rospy.Publisher(self.namespace + '/bum_zlj_joint_position_controller/command', Float64, queue_size=1)
+        self._bum_xlj_pub = rospy.Publisher(self.namespace + '/bum_xlj_joint_position_controller/command', Float64, queue_size=1)
+        self._bum_ylj_pub = rospy.Publisher(self.namespace + '/bum_ylj_joint_position_controller/command', Float64, queue_size=1)
+        self._knee_left_pub = rospy.Publisher(self.namespace + '/knee_left_joint_position_controller/command', Float64, queue_size=1)
+        self._ankle_lj_pub = rospy.Publisher(self.namespace + '/ankle_lj_joint_position_controller/command', Float64, queue_size=1)
+        self._foot_lj_pub = rospy.Publisher(self.namespace + '/foot_lj_joint_position_controller/command', Float64, queue_size=1)
+        self._bum_zrj_pub = rospy.Publisher(self.namespace + '/bum_zrj_joint_position_controller/command', Float64, queue_size=1)
+        self._bum_xrj_pub = rospy.Publisher(self.namespace + '/bum_xrj_joint_position_controller/command', Float64, queue_size=1)
+        self._bum_yrj_pub = rospy.Publisher(self.namespace + '/bum_yrj_joint_position_controller/command', Float64, queue_size=1)
+        self._knee_right_pub = rospy.Publisher(self.namespace + '/knee_right_joint_position_controller/command', Float64, queue_size=1)
+        self._ankle_rj_pub = rospy.Publisher(self.namespace + '/ankle_rj_joint_position_controller/command', Float64, queue_size=1)
+        self._foot_rj_pub = rospy.Publisher(self.namespace + '/foot_rj_joint_position_controller/command', Float64, queue_size=1)
+        self._shoulder_zlj_pub = rospy.Publisher(self.namespace + '/shoulder_zlj_joint_position_controller/command', Float64, queue_size=1)
+        self._shoulder_xlj_pub = rospy.Publisher(self.namespace + '/shoulder_xlj_joint_position_controller/command', Float64, queue_size=1)
+        self._shoulder_ylj_pub = rospy.Publisher(self.namespace + '/shoulder_ylj_joint_position_controller/command', Float64, queue_size=1)
+        self._forearm_ylj_pub = rospy.Publisher(self.namespace + '/forearm_ylj_joint_position_controller/command', Float64, queue_size=1)
+        self._shoulder_zrj_pub = rospy.Publisher(self.namespace + '/shoulder_zrj_joint_position_controller/command', Float64, queue_size=1)
+        self._shoulder_xrj_pub = rospy.Publisher(self.namespace + '/shoulder_xrj_joint_position_controller/command', Float64, queue_size=1)
+        self._shoulder_yrj_pub = rospy.Publisher(self.namespace + '/shoulder_yrj_joint_position_controller/command', Float64, queue_size=1)
+        self._forearm_yrj_pub = rospy.Publisher(self.namespace + '/forearm_yrj_joint_position_controller/command', Float64, queue_size=1)
 
 
         self.publishers_array = [
@@ -54,28 +112,27 @@ class JointPub(object):
             self._forearm_yrj_pub,
         ]
 
-        self.init_pos = [
-            0.0,
-            0.0,
-            0.0,
-            0.0,
-            0.0,
-            0.0,
-            0.0,
-            0.0,
-            0.0,
-            0.0,
-            0.0,
-            0.0,
-            0.0,
-            0.0,
-            0.0,
-            0.0,
-            0.0,
-            0.0,
-            0.0,
-            0.0,
-            ]
+        # Reused by move_joints, one per publisher
+        self._joint_values = [Float64() for _ in self.publishers_array]
+
+    def _init_group_command(self):
+        """
+        Single publisher for joint_group_position_controller, which takes the targets
+        in the order of its joints parameter
+        :return:
+        """
+        controller_joints = rospy.get_param(self.namespace + "/joint_group_position_controller/joints", JOINT_NAMES)
+        missing = [name for name in controller_joints if name not in self.joint_names]
+        if missing:
+            raise NameError('Joints of joint_group_position_controller without target==' + str(missing))
+        joint_index = dict((name, i) for i, name in enumerate(self.joint_names))
+        self._group_order = numpy.array([joint_index[name] for name in controller_joints], dtype=int)
+        if numpy.array_equal(self._group_order, numpy.arange(len(self.joint_names))):
+            # Same order, no need to shuffle
+            self._group_order = None
+        self._group_command = Float64MultiArray()
+        self._group_pub = rospy.Publisher(self.namespace + '/joint_group_position_controller/command', Float64MultiArray,
+                                          queue_size=1)
 
     def set_init_pose(self):
         """
@@ -86,203 +143,54 @@ class JointPub(object):
         self.move_joints(self.init_pos)
 
 
-    def check_publishers_connection(self):
+    def command_publishers(self):
         """
-        Checks that all the publishers are working
+        Publishers move_joints sends the targets through in the current command_mode
         :return:
         """
+        if self.command_mode == "group":
+            return [self._group_pub]
+        return self.publishers_array
 
-        rate = rospy.Rate(10)  # 10hz
-        
-        
-        while (self._bum_zlj_pub.get_num_connections() == 0):
-            rospy.logdebug("No susbribers to _bum_zlj_pub yet so we wait and try again")
-            try:
-                rate.sleep()
-            except rospy.ROSInterruptException:
-                # This is to avoid error when world is rested, time when backwards.
-                pass
-        rospy.logdebug("_bum_zlj_pub Publisher Connected")
-
-        while (self._bum_xlj_pub.get_num_connections() == 0):
-            rospy.logdebug("No susbribers to _bum_xlj_pub yet so we wait and try again")
-            try:
-                rate.sleep()
-            except rospy.ROSInterruptException:
-                # This is to avoid error when world is rested, time when backwards.
-                pass
-        rospy.logdebug("_bum_xlj_pub Publisher Connected")
-
-        while (self._bum_ylj_pub.get_num_connections() == 0):
-            rospy.logdebug("No susbribers to _bum_ylj_pub yet so we wait and try again")
-            try:
-                rate.sleep()
-            except rospy.ROSInterruptException:
-                # This is to avoid error when world is rested, time when backwards.
-                pass
-        rospy.logdebug("_bum_ylj_pub Publisher Connected")
-
-        while (self._knee_left_pub.get_num_connections() == 0):
-            rospy.logdebug("No susbribers to _knee_left_pub yet so we wait and try again")
-            try:
-                rate.sleep()
-            except rospy.ROSInterruptException:
-                # This is to avoid error when world is rested, time when backwards.
-                pass
-        rospy.logdebug("_knee_left_pub Publisher Connected")
-
-        while (self._ankle_lj_pub.get_num_connections() == 0):
-            rospy.logdebug("No susbribers to _ankle_lj_pub yet so we wait and try again")
-            try:
-                rate.sleep()
-            except rospy.ROSInterruptException:
-                # This is to avoid error when world is rested, time when backwards.
-                pass
-        rospy.logdebug("_ankle_lj_pub Publisher Connected")
-
-        while (self._foot_lj_pub.get_num_connections() == 0):
-            rospy.logdebug("No susbribers to _foot_lj_pub yet so we wait and try again")
-            try:
-                rate.sleep()
-            except rospy.ROSInterruptException:
-                # This is to avoid error when world is rested, time when backwards.
-                pass
-        rospy.logdebug("_foot_lj_pub Publisher Connected")
-
-        while (self._bum_zrj_pub.get_num_connections() == 0):
-            rospy.logdebug("No susbribers to _bum_zrj_pub yet so we wait and try again")
-            try:
-                rate.sleep()
-            except rospy.ROSInterruptException:
-                # This is to avoid error when world is rested, time when backwards.
-                pass
-        rospy.logdebug("_bum_zrj_pub Publisher Connected")
-
-        while (self._bum_xrj_pub.get_num_connections() == 0):
-            rospy.logdebug("No susbribers to _bum_xrj_pub yet so we wait and try again")
-            try:
-                rate.sleep()
-            except rospy.ROSInterruptException:
-                # This is to avoid error when world is rested, time when backwards.
-                pass
-        rospy.logdebug("_bum_xrj_pub Publisher Connected")
-
-        while (self._bum_yrj_pub.get_num_connections() == 0):
-            rospy.logdebug("No susbribers to _bum_yrj_pub yet so we wait and try again")
-            try:
-                rate.sleep()
-            except rospy.ROSInterruptException:
-                # This is to avoid error when world is rested, time when backwards.
-                pass
-        rospy.logdebug("_bum_yrj_pub Publisher Connected")
-
-        while (self._knee_right_pub.get_num_connections() == 0):
-            rospy.logdebug("No susbribers to _knee_right_pub yet so we wait and try again")
-            try:
-                rate.sleep()
-            except rospy.ROSInterruptException:
-                # This is to avoid error when world is rested, time when backwards.
-                pass
-        rospy.logdebug("_knee_right_pub Publisher Connected")
-
-        while (self._ankle_rj_pub.get_num_connections() == 0):
-            rospy.logdebug("No susbribers to _ankle_rj_pub yet so we wait and try again")
-            try:
-                rate.sleep()
-            except rospy.ROSInterruptException:
-                # This is to avoid error when world is rested, time when backwards.
-                pass
-        rospy.logdebug("_ankle_rj_pub Publisher Connected")
-
-        while (self._foot_rj_pub.get_num_connections() == 0):
-            rospy.logdebug("No susbribers to _foot_rj_pub yet so we wait and try again")
-            try:
-                rate.sleep()
-            except rospy.ROSInterruptException:
-                # This is to avoid error when world is rested, time when backwards.
-                pass
-        rospy.logdebug("_foot_rj_pub Publisher Connected")
-
-        while (self._shoulder_zlj_pub.get_num_connections() == 0):
-            rospy.logdebug("No susbribers to _shoulder_zlj_pub yet so we wait and try again")
-            try:
-                rate.sleep()
-            except rospy.ROSInterruptException:
-                # This is to avoid error when world is rested, time when backwards.
-                pass
-        rospy.logdebug("_shoulder_zlj_pub Publisher Connected")
-
-        while (self._shoulder_xlj_pub.get_num_connections() == 0):
-            rospy.logdebug("No susbribers to _shoulder_xlj_pub yet so we wait and try again")
-            try:
-                rate.sleep()
-            except rospy.ROSInterruptException:
-                # This is to avoid error when world is rested, time when backwards.
-                pass
-        rospy.logdebug("_shoulder_xlj_pub Publisher Connected")
-
-        while (self._shoulder_ylj_pub.get_num_connections() == 0):
-            rospy.logdebug("No susbribers to _shoulder_ylj_pub yet so we wait and try again")
-            try:
-                rate.sleep()
-            except rospy.ROSInterruptException:
-                # This is to avoid error when world is rested, time when backwards.
-                pass
-        rospy.logdebug("_shoulder_ylj_pub Publisher Connected")
-
-        while (self._forearm_ylj_pub.get_num_connections() == 0):
-            rospy.logdebug("No susbribers to _forearm_ylj_pub yet so we wait and try again")
-            try:
-                rate.sleep()
-            except rospy.ROSInterruptException:
-                # This is to avoid error when world is rested, time when backwards.
-                pass
-        rospy.logdebug("_forearm_ylj_pub Publisher Connected")
-
-        while (self._shoulder_zrj_pub.get_num_connections() == 0):
-            rospy.logdebug("No susbribers to _shoulder_zrj_pub yet so we wait and try again")
-            try:
-                rate.sleep()
-            except rospy.ROSInterruptException:
-                # This is to avoid error when world is rested, time when backwards.
-                pass
-        rospy.logdebug("_shoulder_zrj_pub Publisher Connected")
-
-        while (self._shoulder_xrj_pub.get_num_connections() == 0):
-            rospy.logdebug("No susbribers to _shoulder_xrj_pub yet so we wait and try again")
-            try:
-                rate.sleep()
-            except rospy.ROSInterruptException:
-                # This is to avoid error when world is rested, time when backwards.
-                pass
-        rospy.logdebug("_shoulder_xrj_pub Publisher Connected")
-
-        while (self._shoulder_yrj_pub.get_num_connections() == 0):
-            rospy.logdebug("No susbribers to _shoulder_yrj_pub yet so we wait and try again")
-            try:
-                rate.sleep()
-            except rospy.ROSInterruptException:
-                # This is to avoid error when world is rested, time when backwards.
-                pass
-        rospy.logdebug("_shoulder_yrj_pub Publisher Connected")
-
-
-        while (self._forearm_yrj_pub.get_num_connections() == 0):
-            rospy.logdebug("No susbribers to _forearm_yrj_pub yet so we wait and try again")
-            try:
-                rate.sleep()
-            except rospy.ROSInterruptException:
-                # This is to avoid error when world is rested, time when backwards.
-                pass
-        rospy.logdebug("_forearm_yrj_pub Publisher Connected")
-
+    def publishers_connected(self):
+        """
+        Whether every publisher already has its subscriber, without waiting
+        :return:
+        """
+        return all(publisher.get_num_connections() > 0 for publisher in self.command_publishers())
 
+    def check_publishers_connection(self, timeout=None):
+        """
+        Checks that all the publishers are working, waiting for all of them at once
+        until every one has its controller subscribed. Once they have, the next
+        calls return straight away for as long as they stay connected.
+        :param timeout: seconds to wait, None to wait for as long as it takes
+        :return:
+        """
+        if self._publishers_ready and self.publishers_connected():
+            return
+
+        publishers = self.command_publishers()
+        start = time.time()
+        last_report = start
+        while True:
+            missing = [publisher.resolved_name for publisher in publishers if publisher.get_num_connections() == 0]
+            if not missing:
+                break
+            if rospy.is_shutdown():
+                raise rospy.ROSInterruptException("Shutdown while waiting for the controllers")
+            now = time.time()
+            if timeout is not None and now - start > timeout:
+                raise rospy.ROSException("No controller subscribed to==" + str(missing))
+            if now - last_report > 5.0:
+                rospy.logwarn("Still waiting for the controllers subscribed to==" + str(missing))
+                last_report = now
+            # Wall clock, the sim time might be paused or go backwards after a reset
+            time.sleep(0.01)
+
+        self._publishers_ready = True
         rospy.logdebug("All Publishers READY")
 
-
-
-
-
     def joint_mono_des_callback(self, msg):
         rospy.logdebug(str(msg.joint_state.position))
 
@@ -294,14 +202,22 @@ class JointPub(object):
 
 
     def move_joints(self, joints_array):
-
-        i = 0
-        for publisher_object in self.publishers_array:
-          joint_value = Float64()
-          joint_value.data = joints_array[i]
-          rospy.logdebug("JointsPos>>"+str(joint_value))
-          publisher_object.publish(joint_value)
-          i += 1
+        """
+        Sends the targets of all the joints
+        :param joints_array: one position per joint, in joint_names order
+        :return:
+        """
+        if self.command_mode == "group":
+            joints_array = numpy.asarray(joints_array, dtype=float)
+            if self._group_order is not None:
+                joints_array = joints_array[self._group_order]
+            self._group_command.data = joints_array.tolist()
+            self._group_pub.publish(self._group_command)
+            return
+
+        for publisher_object, joint_value, position in zip(self.publishers_array, self._joint_values, joints_array):
+            joint_value.data = position
+            publisher_object.publish(joint_value)
 
 
 
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+'''
+    Trains several catbots that share a single Gazebo world, the ones of
+    catbot_gazebo/launch/multi_catbot.launch, as one batched environment.
+
+    Every robot has its own CatbotEnv under its namespace, they all share the
+    GazeboConnection. A step sends the targets of every robot and then runs
+    the physics once for all of them, so one pause/unpause pair (or one
+    step_world call) gives a sample per robot.
+
+    reset resets the whole world and every robot. Afterwards the robots are
+    reset one by one when their episode ends, with the fast reset of CatbotEnv
+    back to their pose after the last reset. The world itself is only reset
+    again by reset.
+
+    Usage:
+        multi_env = MultiCatbotEnv()
+        states = multi_env.reset()
+        states, rewards, dones, infos = multi_env.step(actions)
+'''
+import numpy
+import rospy
+from gazebo_connection import GazeboConnection
+from catbot_env import CatbotEnv
+
+
+class MultiCatbotEnv(object):
+
+    def __init__(self, robots=None, spacing=None):
+        """
+        :param robots: number of catbots in the world, the robots param of multi_catbot.launch by default
+        :param spacing: meters between them along x, the spacing param of multi_catbot.launch by default
+        """
+        self.n_robots = robots if robots is not None else rospy.get_param("/multi_catbot/robots")
+        spacing = spacing if spacing is not None else rospy.get_param("/multi_catbot/spacing")
+        if rospy.get_param("/sim_backend", "gazebo") != "gazebo":
+            raise NameError('MultiCatbotEnv needs the gazebo sim_backend, not==' +
+                            str(rospy.get_param("/sim_backend")))
+
+        self.gazebo = GazeboConnection()
+        self.envs = [CatbotEnv(namespace="/catbot_" + str(index), gazebo=self.gazebo,
+                               origin=(index * spacing, 0.0))
+                     for index in range(self.n_robots)]
+        self.n_actions = self.envs[0].action_space.n
+        # Float observations of the last states, one row per robot
+        self.observations = None
+
+    def run_physics(self):
+        """
+        :return: sim time after the step in lockstep, see CatbotEnv.run_physics
+        """
+        # Same lockstep_iterations and running_step for all of them
+        return self.envs[0].run_physics()
+
+    def reset(self):
+        """
+        Resets the simulation and every robot in it, like CatbotEnv.full_reset
+        does for one
+        :return: numpy array of the states in the observation_mode of CatbotEnv, one per robot.
+                 Object dtype, the keys can be longer than 64 bits. The float observations
+                 are in self.observations
+        """
+        self.gazebo.pauseSim()
+        self.gazebo.resetSim()
+        # Without gravity so that they dont fall when reseting joints, it also UNPAUSES the simulation
+        self.gazebo.change_gravity(0.0, 0.0, 0.0)
+        for env in self.envs:
+            env.controllers_object.reset_monoped_joint_controllers()
+            env.monoped_joint_pubisher_object.set_init_pose()
+
+        states = numpy.empty(self.n_robots, dtype=object)
+        observations = []
+        for index, env in enumerate(self.envs):
+            env.monoped_state_object.check_all_systems_ready(timeout=env.sensors_timeout or None)
+            env.monoped_state_object.take_snapshot()
+            observation = env.monoped_state_object.get_observations()
+            states[index] = env.get_state(observation)
+            observations.append(observation.copy())
+
+        self.gazebo.change_gravity(0.0, 0.0, -9.81)
+        self.gazebo.pauseSim()
+        for env in self.envs:
+            env.refresh_reset_snapshot()
+        self.observations = numpy.stack(observations)
+        return states
+
+    def step(self, actions):
+        """
+        Steps every robot with its action, with a single physics run. The robots
+        whose episode is done are put back to their reset pose right away, which
+        costs one more physics run shared by all of them. Their terminal state is
+        in the terminal_state of their info. That run also moves the other robots,
+        the states of all of them are the ones after it.
+        :param actions: one per robot
+        :return: states (object dtype), rewards, dones, infos
+        """
+        if len(actions) != self.n_robots:
+            raise ValueError("Expected " + str(self.n_robots) + " actions, got " + str(len(actions)))
+        for env, action in zip(self.envs, actions):
+            env.set_action(action)
+        sim_time = self.run_physics()
+
+        states = numpy.empty(self.n_robots, dtype=object)
+        rewards = numpy.zeros(self.n_robots)
+        dones = numpy.zeros(self.n_robots, dtype=bool)
+        infos = []
+        observations = []
+        for index, env in enumerate(self.envs):
+            states[index], rewards[index], dones[index], info = env.collect_step(sim_time)
+            infos.append(info)
+            observations.append(env.monoped_state_object.get_observations().copy())
+        self.observations = numpy.stack(observations)
+
+        finished = numpy.flatnonzero(dones)
+        if len(finished) == 0:
+            return states, rewards, dones, infos
+        if not all(self.envs[index].has_reset_snapshot() for index in finished):
+            # No pose to go back to, the whole world has to be reset and every episode ends
+            rospy.logwarn("No reset pose for some robots, resetting the whole world")
+            for index in range(self.n_robots):
+                infos[index]["terminal_state"] = states[index]
+                infos[index]["terminal_observation"] = self.observations[index].copy()
+            dones[:] = True
+            return self.reset(), rewards, dones, infos
+
+        for index in finished:
+            infos[index]["terminal_state"] = states[index]
+            infos[index]["terminal_observation"] = self.observations[index].copy()
+            self.envs[index].place_at_reset_pose()
+        # The robots still in their episode keep their targets and move too, the next
+        # action of every robot has to start from the readings after this run
+        self.envs[0].run_physics_after_move([env.monoped_state_object for env in self.envs])
+        for index, env in enumerate(self.envs):
+            env.monoped_state_object.take_snapshot()
+            observation = env.monoped_state_object.get_observations()
+            states[index] = env.get_state(observation)
+            self.observations[index] = observation
+        return states, rewards, dones, infos
+
+    def close(self):
+        for env in self.envs:
+            env.close()
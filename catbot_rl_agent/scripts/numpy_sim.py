@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+'''
+    In process stand-in for Gazebo and the ros_control controllers, to run
+    CatbotEnv without a simulator: set the /sim_backend param to "numpy".
+
+    It is not a physics simulation of the robot, only a cheap model with the
+    same interfaces, good enough to benchmark and profile the agent side at
+    thousands of steps per second:
+
+    joints          first order response of every joint to its position
+                    target, with time constant joint_time_constant. The
+                    effort is the one of a P controller, joint_gain * error.
+    orientation     roll and pitch behave like an inverted pendulum, they
+                    move away exponentially from the lean set by the hips and
+                    ankles, faster the stronger the gravity. The yaw follows
+                    the hip yaw joints.
+    height          standing_height, lowered by the tilt and the bent knees.
+    contact forces  the weight of the robot, shared between the feet by the
+                    roll.
+
+    NumpySim holds the state. NumpyGazeboConnection, NumpyJointPub and
+    NumpyControllersConnection have the methods of GazeboConnection,
+    JointPub and ControllersConnection that CatbotEnv uses, and CatbotState
+    gets the sensors from NumpySim.publish_sensors instead of its topic
+    subscriptions, see CatbotState(sensor_source=...).
+'''
+import math
+import numpy
+import tf
+from geometry_msgs.msg import Pose
+from gazebo_msgs.srv import GetModelStateResponse
+from joint_publisher import JOINT_NAMES
+
+
+class NumpySim(object):
+
+    def __init__(self, joint_names=None, time_step=0.001, joint_time_constant=0.02, joint_gain=50.0,
+                 mass=22.0, standing_height=0.85, fall_time_constant=0.3, lean_gain=0.5, yaw_gain=0.5):
+        """
+        :param joint_names: order of the joint targets and positions, JOINT_NAMES by default
+        :param time_step: seconds of one physics iteration
+        :param joint_time_constant: seconds for a joint to cover 63% of the way to its target
+        :param joint_gain: effort per radian of position error
+        :param mass: kg, sets the contact forces. 22 kg gives the desired_force of
+                     configs/qlearn_params.yaml on each foot
+        :param standing_height: height of the base standing upright with straight knees
+        :param fall_time_constant: seconds for the tilt to grow by e with 9.81 gravity
+        :param lean_gain: equilibrium tilt per radian of hip and ankle lean
+        :param yaw_gain: yaw rate per radian of hip yaw
+        """
+        self.joint_names = list(joint_names) if joint_names is not None else list(JOINT_NAMES)
+        missing = [name for name in JOINT_NAMES if name not in self.joint_names]
+        if missing:
+            raise NameError('Joints missing from the joint_names of NumpySim==' + str(missing))
+        index = dict((name, i) for i, name in enumerate(self.joint_names))
+        self._left_roll = [index["bum_xlj"], index["ankle_lj"]]
+        self._right_roll = [index["bum_xrj"], index["ankle_rj"]]
+        self._pitch = [index["bum_ylj"], index["bum_yrj"], index["foot_lj"], index["foot_rj"]]
+        self._yaw = [index["bum_zlj"], index["bum_zrj"]]
+        self._knees = [index["knee_left"], index["knee_right"]]
+
+        self.time_step = time_step
+        self.joint_time_constant = joint_time_constant
+        self.joint_gain = joint_gain
+        self.mass = mass
+        self.standing_height = standing_height
+        self.fall_time_constant = fall_time_constant
+        self.lean_gain = lean_gain
+        self.yaw_gain = yaw_gain
+
+        self.gravity = numpy.array([0.0, 0.0, -9.81])
+        self.paused = True
+        self._states = []
+        self._state_joint_order = []
+        self.reset()
+
+    def reset(self):
+        """
+        Back to time 0, standing upright at the origin with every joint at 0
+        :return:
+        """
+        n_joints = len(self.joint_names)
+        self.iterations = 0
+        self.joint_positions = numpy.zeros(n_joints)
+        self.joint_velocities = numpy.zeros(n_joints)
+        self.joint_targets = numpy.zeros(n_joints)
+        self.joint_efforts = numpy.zeros(n_joints)
+        self.position = numpy.array([0.0, 0.0, self.standing_height])
+        # roll, pitch, yaw
+        self.rpy = numpy.zeros(3)
+        self.update_height()
+        self.publish_sensors()
+
+    def sim_time(self):
+        return self.iterations * self.time_step
+
+    def connect_state(self, state):
+        """
+        Makes publish_sensors write the sensors of a CatbotState
+        :param state: CatbotState
+        :return:
+        """
+        self._states.append(state)
+        self._state_joint_order.append(state.get_joint_permutation(self.joint_names).copy())
+
+    def step(self, iterations):
+        """
+        Runs iterations physics iterations at once, the joint targets and the
+        lean stay constant over them so the update is exact for any number
+        :param iterations:
+        :return: simulation time after the step
+        """
+        if iterations <= 0:
+            return self.sim_time()
+        duration = iterations * self.time_step
+
+        previous = self.joint_positions.copy()
+        self.joint_positions += (self.joint_targets - self.joint_positions) * \
+            (1.0 - math.exp(-duration / self.joint_time_constant))
+        self.joint_velocities = (self.joint_positions - previous) / duration
+        self.joint_efforts = self.joint_gain * (self.joint_targets - self.joint_positions)
+
+        g = numpy.linalg.norm(self.gravity)
+        if g > 0.0:
+            joints = self.joint_positions
+            lean = numpy.array([joints[self._left_roll].sum() - joints[self._right_roll].sum(),
+                                joints[self._pitch].mean()])
+            equilibrium = self.lean_gain * lean
+            growth = math.exp(duration * math.sqrt(g / 9.81) / self.fall_time_constant)
+            self.rpy[:2] = numpy.clip(equilibrium + (self.rpy[:2] - equilibrium) * growth, -math.pi / 2, math.pi / 2)
+            # Walks towards where it leans
+            self.position[0] -= duration * math.sin(self.rpy[1])
+            self.position[1] += duration * math.sin(self.rpy[0])
+        self.rpy[2] += duration * self.yaw_gain * self.joint_positions[self._yaw].mean()
+        self.update_height()
+
+        self.iterations += iterations
+        self.publish_sensors()
+        return self.sim_time()
+
+    def update_height(self):
+        knees = numpy.abs(self.joint_positions[self._knees]).mean()
+        self.position[2] = self.standing_height * math.cos(self.rpy[0]) * math.cos(self.rpy[1]) * \
+            (0.5 + 0.5 * math.cos(min(knees, math.pi)))
+
+    def contact_forces(self):
+        """
+        :return: (left, right) forces of the feet on the ground, in the world frame
+        """
+        weight = -self.mass * self.gravity
+        left_share = min(max(0.5 + self.rpy[0] / (math.pi / 2), 0.0), 1.0)
+        return weight * left_share, weight * (1.0 - left_share)
+
+    def orientation(self):
+        """
+        :return: quaternion (x, y, z, w) of the base
+        """
+        return tf.transformations.quaternion_from_euler(self.rpy[0], self.rpy[1], self.rpy[2])
+
+    def publish_sensors(self):
+        """
+        Writes the current state in every connected CatbotState, like the
+        sensor plugins after a physics update
+        :return:
+        """
+        if not self._states:
+            return
+        stamp = self.sim_time()
+        orientation = self.orientation()
+        # What an IMU at rest measures, the gravity reaction in the base frame
+        roll, pitch = self.rpy[0], self.rpy[1]
+        g = numpy.linalg.norm(self.gravity)
+        acceleration = (-g * math.sin(pitch), g * math.sin(roll) * math.cos(pitch),
+                        g * math.cos(roll) * math.cos(pitch))
+        left_force, right_force = self.contact_forces()
+        for state, order in zip(self._states, self._state_joint_order):
+            state.write_sensor("odom", stamp, self.position)
+            state.write_sensor("imu", stamp, orientation, acceleration)
+            state.write_sensor("left_contact", stamp, left_force)
+            state.write_sensor("right_contact", stamp, right_force)
+            state.write_sensor("joints", stamp, self.joint_positions[order], self.joint_efforts[order])
+
+    def set_joint_targets(self, targets):
+        self.joint_targets[:] = targets
+
+    def set_joint_positions(self, joint_names, positions):
+        """
+        Moves joints straight to the given positions, at rest
+        :return:
+        """
+        index = dict((name, i) for i, name in enumerate(self.joint_names))
+        for name, position in zip(joint_names, positions):
+            if name not in index:
+                raise NameError('Unknown joint==' + str(name))
+            self.joint_positions[index[name]] = position
+            self.joint_velocities[index[name]] = 0.0
+        self.update_height()
+
+    def get_pose(self):
+        """
+        :return: geometry_msgs/Pose of the base
+        """
+        pose = Pose()
+        pose.position.x, pose.position.y, pose.position.z = self.position
+        orientation = self.orientation()
+        pose.orientation.x = orientation[0]
+        pose.orientation.y = orientation[1]
+        pose.orientation.z = orientation[2]
+        pose.orientation.w = orientation[3]
+        return pose
+
+    def set_pose(self, pose):
+        """
+        Puts the base at the given geometry_msgs/Pose, the height comes from the
+        tilt and the knees anyway
+        :return:
+        """
+        orientation = pose.orientation
+        self.rpy[:] = tf.transformations.euler_from_quaternion((orientation.x, orientation.y,
+                                                               orientation.z, orientation.w))
+        self.position[0] = pose.position.x
+        self.position[1] = pose.position.y
+        self.update_height()
+
+
+class NumpyGazeboConnection(object):
+    """
+    GazeboConnection on a NumpySim. The sim only moves in stepSim, unpausing
+    it does not run anything in the background.
+    """
+    def __init__(self, sim):
+        self.sim = sim
+        self.pauseSim()
+
+    def pauseSim(self):
+        self.sim.paused = True
+
+    def unpauseSim(self):
+        self.sim.paused = False
+
+    def resetSim(self):
+        self.sim.reset()
+
+    def resetWorld(self):
+        self.sim.reset()
+
+    def stepSim(self, iterations):
+        """
+        Runs exactly iterations physics iterations, the simulation is left paused
+        :return: simulation time after the step
+        """
+        self.sim.paused = True
+        return self.sim.step(iterations)
+
+    def getModelState(self, model_name, reference_frame="world"):
+        """
+        :return: gazebo_msgs/GetModelStateResponse, only the pose is filled
+        """
+        response = GetModelStateResponse()
+        response.pose = self.sim.get_pose()
+        response.success = True
+        return response
+
+    def setModelState(self, model_state):
+        """
+        :param model_state: gazebo_msgs/ModelState, the twist is ignored, the sim has no base velocity
+        :return: success
+        """
+        self.sim.set_pose(model_state.pose)
+        self.sim.publish_sensors()
+        return True
+
+    def setModelConfiguration(self, model_name, joint_names, joint_positions, urdf_param_name="robot_description"):
+        self.sim.set_joint_positions(joint_names, joint_positions)
+        self.sim.publish_sensors()
+        return True
+
+    def change_gravity(self, x, y, z):
+        self.sim.gravity[:] = (x, y, z)
+        # Like the set_physics_properties call of GazeboConnection
+        self.unpauseSim()
+
+    def service_stats(self):
+        return {}
+
+    def reset_service_stats(self):
+        pass
+
+
+class NumpyJointPub(object):
+    """
+    JointPub on a NumpySim, the targets reach the joints at once
+    """
+    def __init__(self, sim, joint_names=None):
+        """
+        :param joint_names: order of the targets given to move_joints, the joint_names of sim by default
+        """
+        self.sim = sim
+        self.joint_names = list(joint_names) if joint_names is not None else list(sim.joint_names)
+        index = dict((name, i) for i, name in enumerate(self.joint_names))
+        self._sim_order = numpy.array([index[name] for name in sim.joint_names], dtype=int)
+        self.init_pos = [0.0] * len(self.joint_names)
+
+    def set_init_pose(self):
+        self.move_joints(self.init_pos)
+
+    def command_publishers(self):
+        return []
+
+    def publishers_connected(self):
+        return True
+
+    def check_publishers_connection(self, timeout=None):
+        pass
+
+    def move_joints(self, joints_array):
+        self.sim.set_joint_targets(numpy.asarray(joints_array, dtype=float)[self._sim_order])
+
+
+class NumpyControllersConnection(object):
+    """
+    ControllersConnection on a NumpySim, there is a single always running
+    controller whose reset holds the joints where they are
+    """
+    def __init__(self, sim):
+        self.sim = sim
+
+    def list_controllers(self):
+        return {"joint_group_position_controller": "running"}
+
+    def switch_controllers(self, controllers_on, controllers_off, strictness=1):
+        return True
+
+    def reset_controllers(self, controllers_reset):
+        self.sim.set_joint_targets(self.sim.joint_positions)
+        return True
+
+    def reset_monoped_joint_controllers(self):
+        return self.reset_controllers(list(self.list_controllers()))
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+'''
+    Service client that keeps its connection open between calls.
+
+    A plain rospy.ServiceProxy asks the master where the service is and opens
+    a new TCP connection on every call, and the rospy.wait_for_service done
+    before each call costs one more round-trip. A PersistentService does the
+    lookup once, reuses the same connection, and when the connection breaks
+    (Gazebo or the controller manager was restarted) it waits for the service
+    to come back and retries the call once.
+    It also times every call, see stats.
+'''
+import time
+import rospy
+
+
+class PersistentService(object):
+
+    def __init__(self, name, service_class, timeout=None, retry=True):
+        """
+        Nothing is looked up until the first call
+        :param name: name of the service, like /gazebo/pause_physics
+        :param service_class: srv type, like std_srvs.srv.Empty
+        :param timeout: seconds to wait for the service when (re)connecting, None waits forever
+        :param retry: retry a call once after reconnecting if it failed. Only for
+                      services that can safely be called twice.
+        """
+        self.name = name
+        self.service_class = service_class
+        self.timeout = timeout
+        self.retry = retry
+        self._proxy = None
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.calls = 0
+        self.failures = 0
+        self.connections = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+
+    def stats(self):
+        """
+        Call latencies since the last reset_stats, connection time included
+        :return: dict
+        """
+        return {"calls": self.calls,
+                "failures": self.failures,
+                "connections": self.connections,
+                "mean_ms": 1e3 * self.total_time / self.calls if self.calls else 0.0,
+                "max_ms": 1e3 * self.max_time}
+
+    def connect(self):
+        """
+        Waits for the service and opens the connection to it
+        :return:
+        """
+        self.close()
+        rospy.logdebug("Waiting for service " + str(self.name))
+        rospy.wait_for_service(self.name, timeout=self.timeout)
+        self._proxy = rospy.ServiceProxy(self.name, self.service_class, persistent=True)
+        self.connections += 1
+
+    def close(self):
+        if self._proxy is not None:
+            self._proxy.close()
+            self._proxy = None
+
+    def __call__(self, *args, **kwargs):
+        """
+        Calls the service, same arguments and return value as rospy.ServiceProxy
+        :return: the response
+        """
+        start = time.perf_counter()
+        try:
+            if self._proxy is None:
+                self.connect()
+            try:
+                return self._proxy(*args, **kwargs)
+            except rospy.ServiceException as e:
+                if not self.retry or rospy.is_shutdown():
+                    raise
+                # A persistent connection does not survive the server going away
+                rospy.logwarn(str(self.name) + " call failed, reconnecting==>" + str(e))
+                self.connect()
+                return self._proxy(*args, **kwargs)
+        except (rospy.ServiceException, rospy.ROSException):
+            self.failures += 1
+            self.close()
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            self.calls += 1
+            self.total_time += elapsed
+            if elapsed > self.max_time:
+                self.max_time = elapsed
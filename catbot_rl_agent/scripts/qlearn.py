@@ -8,15 +8,73 @@ Inspired by https://gym.openai.com/evaluations/eval_kWknKOkPQ7izrixdhriurA
         @author: Victor Mayoral Vilches <victor@erlerobotics.com>
 '''
 
-import random
+import numpy
+
+
+def select_action(q, epsilon, rng):
+    '''
+    Epsilon-greedy selection for a single state.
+    Same behaviour as the original list based chooseAction: when exploring,
+    every action gets uniform noise scaled by the magnitude of the Q-values,
+    and ties between maximum values are broken uniformly at random.
+    :param q: (n_actions,) array of Q-values, left untouched
+    :param epsilon: probability of exploring
+    :param rng: numpy.random.Generator driving all the random draws
+    :return: (index, q) column of the chosen action and the (noisy) Q-values
+    '''
+    maxQ = q.max()
+    if rng.random() < epsilon:
+        mag = max(abs(q.min()), abs(maxQ))
+        # add random values to all the actions, recalculate maxQ
+        q = q + (rng.random(len(q)) - .5) * mag
+        maxQ = q.max()
+
+    best = numpy.flatnonzero(q == maxQ)
+    # In case there're several state-action max values
+    # we select a random one among them
+    if len(best) > 1:
+        return best[rng.integers(len(best))], q
+    return best[0], q
+
+
+def select_actions(q, epsilon, rng):
+    '''
+    select_action over a batch of Q-value rows, one exploration draw per row.
+    :param q: (n_states, n_actions) Q-values, left untouched
+    :param epsilon: probability of exploring, per row
+    :param rng: numpy.random.Generator driving all the random draws
+    :return: (indices, q) column of the chosen action for each row and the
+             (noisy) Q-values the choice was made on
+    '''
+    q = numpy.array(q, dtype=float, ndmin=2)
+
+    explore = rng.random(len(q)) < epsilon
+    if explore.any():
+        rows = q[explore]
+        mag = numpy.maximum(numpy.abs(rows.min(axis=1)), numpy.abs(rows.max(axis=1)))[:, None]
+        q[explore] = rows + (rng.random(rows.shape) - .5) * mag
+
+    is_max = q == q.max(axis=1)[:, None]
+    indices = is_max.argmax(axis=1)
+    tied = numpy.count_nonzero(is_max, axis=1) > 1
+    if tied.any():
+        keys = numpy.where(is_max[tied], rng.random((numpy.count_nonzero(tied), q.shape[1])), -1.0)
+        indices[tied] = keys.argmax(axis=1)
+    return indices, q
+
 
 class QLearn:
-    def __init__(self, actions, epsilon, alpha, gamma):
+    def __init__(self, actions, epsilon, alpha, gamma, seed=None):
         self.q = {}
         self.epsilon = epsilon  # exploration constant
         self.alpha = alpha      # discount constant
         self.gamma = gamma      # discount factor
         self.actions = actions
+        # All the randomness of the action selection comes from here
+        self.rng = numpy.random.default_rng(seed)
+        # (state, action) keys learnt since the last pop_dirty_entries,
+        # None until somebody asks for them
+        self.dirty = None
 
     def getQ(self, state, action):
         return self.q.get((state, action), 0.0)
@@ -31,31 +89,282 @@ class QLearn:
             self.q[(state, action)] = reward
         else:
             self.q[(state, action)] = oldv + self.alpha * (value - oldv)
+        if self.dirty is not None:
+            self.dirty.add((state, action))
 
-    def chooseAction(self, state, return_q=False):
-        q = [self.getQ(state, a) for a in self.actions]
-        maxQ = max(q)
-
-        if random.random() < self.epsilon:
-            minQ = min(q); mag = max(abs(minQ), abs(maxQ))
-            # add random values to all the actions, recalculate maxQ
-            q = [q[i] + random.random() * mag - .5 * mag for i in range(len(self.actions))] 
-            maxQ = max(q)
-
-        count = q.count(maxQ)
-        # In case there're several state-action max values 
-        # we select a random one among them
-        if count > 1:
-            best = [i for i in range(len(self.actions)) if q[i] == maxQ]
-            i = random.choice(best)
+    def pop_dirty_entries(self):
+        '''
+        Entries changed since the previous call, used for incremental checkpoints.
+        The first call returns the whole table and starts tracking the changes.
+        :return: list of ((state, action), value)
+        '''
+        if self.dirty is None:
+            entries = list(self.q.items())
         else:
-            i = q.index(maxQ)
+            entries = [(key, self.q[key]) for key in self.dirty]
+        self.dirty = set()
+        return entries
 
-        action = self.actions[i]        
+    def load_entries(self, entries):
+        '''
+        Writes back entries as returned by pop_dirty_entries
+        :param entries: iterable of ((state, action), value)
+        '''
+        self.q.update(entries)
+        # They come from a checkpoint, the next one only needs what changes from now on
+        self.dirty = set()
+
+    def chooseAction(self, state, return_q=False):
+        q = numpy.fromiter((self.getQ(state, a) for a in self.actions),
+                           dtype=float, count=len(self.actions))
+        i, q = select_action(q, self.epsilon, self.rng)
+        action = self.actions[i]
         if return_q: # if they want it, give it!
             return action, q
         return action
 
+    def chooseActions(self, states):
+        '''
+        chooseAction for a whole batch of states in one go
+        :param states: sequence of states
+        :return: list with one action per state
+        '''
+        q = numpy.array([[self.getQ(state, a) for a in self.actions] for state in states],
+                        dtype=float).reshape(len(states), len(self.actions))
+        indices, _ = select_actions(q, self.epsilon, self.rng)
+        return [self.actions[i] for i in indices]
+
     def learn(self, state1, action1, reward, state2):
         maxqnew = max([self.getQ(state2, a) for a in self.actions])
-        self.learnQ(state1, action1, reward, reward + self.gamma*maxqnew)
\ No newline at end of file
+        self.learnQ(state1, action1, reward, reward + self.gamma*maxqnew)
+
+
+class ArrayQLearn(QLearn):
+    '''
+    Same algorithm as QLearn, but the Q-table is a dense NumPy array of shape
+    (n_states, n_actions) instead of a dict keyed by (state, action) tuples.
+
+    Each discrete state is mapped to a row index the first time it is learnt,
+    so chooseAction and learn do a single dict lookup per state and then work
+    on a whole row at once. The array doubles its capacity when it fills up.
+
+    If max_states or max_bytes is given the table stops growing at that size,
+    and once it is full a small batch of states is evicted to make room for
+    new ones, either the least recently used ("lru") or the least visited
+    ("visits"). Memory then stays flat no matter how long the training runs.
+    '''
+    # Rough size of one stored state: the Q and known rows, the visit and
+    # last use (read or write) counters, the row to state list slot and the state_index entry
+    # with its key.
+    STATE_OVERHEAD_BYTES = 8 + 8 + 8 + 100
+
+    def __init__(self, actions, epsilon, alpha, gamma, seed=None, initial_states=1024,
+                 max_states=None, max_bytes=None, eviction="lru", evict_fraction=0.05):
+        self.epsilon = epsilon  # exploration constant
+        self.alpha = alpha      # discount constant
+        self.gamma = gamma      # discount factor
+        self.actions = actions
+        self.rng = numpy.random.default_rng(seed)
+        self.n_actions = len(actions)
+        # Maps an action to its column in the table
+        self.action_index = dict((a, i) for i, a in enumerate(actions))
+
+        if eviction not in ("lru", "visits"):
+            raise ValueError("Unknown eviction policy==" + str(eviction))
+        self.eviction = eviction
+        self.evict_fraction = evict_fraction
+        self.max_states = max_states
+        if max_bytes:
+            bytes_per_state = 9 * self.n_actions + self.STATE_OVERHEAD_BYTES
+            by_bytes = max(1, int(max_bytes // bytes_per_state))
+            self.max_states = min(self.max_states or by_bytes, by_bytes)
+        if self.max_states:
+            initial_states = min(initial_states, self.max_states)
+
+        # Maps a state to its row in the table, and back
+        self.state_index = {}
+        self.row_states = [None] * initial_states
+        # Rows handed out so far, and rows freed by evictions
+        self.n_rows = 0
+        self.free_rows = []
+        self.q_values = numpy.zeros((initial_states, self.n_actions))
+        # QLearn sets Q(s,a) straight to the reward the first time it is
+        # learnt, so we have to remember which entries were ever written.
+        self.q_known = numpy.zeros((initial_states, self.n_actions), dtype=bool)
+        # Per state bookkeeping used to pick who gets evicted
+        self.visits = numpy.zeros(initial_states, dtype=numpy.int64)
+        self.last_used = numpy.zeros(initial_states, dtype=numpy.int64)
+        self._clock = 0
+        self.dirty = None
+
+        self.evictions = 0
+        self.eviction_rounds = 0
+        self.evicted_visits = 0
+
+    def _grow(self):
+        capacity = 2 * len(self.q_values)
+        if self.max_states:
+            capacity = min(capacity, self.max_states)
+        self.q_values = self._resized(self.q_values, capacity)
+        self.q_known = self._resized(self.q_known, capacity)
+        self.visits = self._resized(self.visits, capacity)
+        self.last_used = self._resized(self.last_used, capacity)
+        self.row_states.extend([None] * (capacity - len(self.row_states)))
+
+    def _resized(self, array, capacity):
+        resized = numpy.zeros((capacity,) + array.shape[1:], dtype=array.dtype)
+        resized[:self.n_rows] = array[:self.n_rows]
+        return resized
+
+    def _evict(self):
+        """
+        Frees evict_fraction of the rows, the ones with the lowest score
+        :return:
+        """
+        n_evict = max(1, int(self.n_rows * self.evict_fraction))
+        if self.eviction == "lru":
+            score = self.last_used[:self.n_rows]
+        else:
+            score = self.visits[:self.n_rows]
+        victims = numpy.argpartition(score, n_evict - 1)[:n_evict]
+
+        self.evicted_visits += int(self.visits[victims].sum())
+        for row in victims.tolist():
+            del self.state_index[self.row_states[row]]
+            self.row_states[row] = None
+        self.q_values[victims] = 0.0
+        self.q_known[victims] = False
+        self.visits[victims] = 0
+        self.free_rows.extend(victims.tolist())
+
+        if self.eviction == "visits":
+            # Age the counters, otherwise the states just added would always
+            # be the next ones to go.
+            self.visits[:self.n_rows] >>= 1
+        self.evictions += n_evict
+        self.eviction_rounds += 1
+
+    def _add_state(self, state):
+        if not self.free_rows:
+            if self.n_rows == len(self.q_values):
+                if self.max_states and self.n_rows >= self.max_states:
+                    self._evict()
+                else:
+                    self._grow()
+            if not self.free_rows:
+                self.free_rows.append(self.n_rows)
+                self.n_rows += 1
+        row = self.free_rows.pop()
+        self.state_index[state] = row
+        self.row_states[row] = state
+        return row
+
+    def eviction_stats(self):
+        """
+        Size of the table and what the capacity limit has thrown away so far
+        :return: dict
+        """
+        return {"states": len(self.state_index),
+                "capacity": self.max_states or len(self.q_values),
+                "evictions": self.evictions,
+                "eviction_rounds": self.eviction_rounds,
+                "evicted_visits": self.evicted_visits}
+
+    def getQ(self, state, action):
+        row = self.state_index.get(state)
+        if row is None:
+            return 0.0
+        self._touch(row)
+        return float(self.q_values[row, self.action_index[action]])
+
+    def getQRow(self, state):
+        '''
+        Q-values of all the actions for the given state, zeros if never seen.
+        The returned array is a copy, so it is safe to modify.
+        '''
+        row = self.state_index.get(state)
+        if row is None:
+            return numpy.zeros(self.n_actions)
+        self._touch(row)
+        return self.q_values[row].copy()
+
+    def _touch(self, rows):
+        """
+        Marks rows as just used, for the "lru" eviction, reads count as much as writes
+        :param rows: row index or array of them
+        :return:
+        """
+        self._clock += 1
+        self.last_used[rows] = self._clock
+
+    def learnQ(self, state, action, reward, value):
+        row = self.state_index.get(state)
+        if row is None:
+            row = self._add_state(state)
+        self.visits[row] += 1
+        self._touch(row)
+        col = self.action_index[action]
+        if self.q_known[row, col]:
+            oldv = self.q_values[row, col]
+            self.q_values[row, col] = oldv + self.alpha * (value - oldv)
+        else:
+            self.q_values[row, col] = reward
+            self.q_known[row, col] = True
+        if self.dirty is not None:
+            self.dirty.add((state, action))
+
+    def pop_dirty_entries(self):
+        if self.dirty is None:
+            entries = []
+            for state, row in self.state_index.items():
+                for col in numpy.flatnonzero(self.q_known[row]):
+                    entries.append(((state, self.actions[col]), float(self.q_values[row, col])))
+            self.dirty = set()
+            return entries
+        entries = []
+        for state, action in self.dirty:
+            row = self.state_index.get(state)
+            # States evicted since they were learnt are simply dropped
+            if row is not None:
+                entries.append(((state, action), float(self.q_values[row, self.action_index[action]])))
+        self.dirty = set()
+        return entries
+
+    def load_entries(self, entries):
+        for (state, action), value in entries:
+            row = self.state_index.get(state)
+            if row is None:
+                row = self._add_state(state)
+                self.visits[row] = 1
+                self._touch(row)
+            col = self.action_index[action]
+            self.q_values[row, col] = value
+            self.q_known[row, col] = True
+        # They come from a checkpoint, the next one only needs what changes from now on
+        self.dirty = set()
+
+    def chooseAction(self, state, return_q=False):
+        i, q = select_action(self.getQRow(state), self.epsilon, self.rng)
+        action = self.actions[i]
+        if return_q: # if they want it, give it!
+            return action, q
+        return action
+
+    def chooseActions(self, states):
+        rows = numpy.array([self.state_index.get(state, -1) for state in states], dtype=int)
+        q = self.q_values[rows]
+        # Rows of states never seen before are all zeros
+        q[rows < 0] = 0.0
+        self._touch(rows[rows >= 0])
+        indices, _ = select_actions(q, self.epsilon, self.rng)
+        return [self.actions[i] for i in indices]
+
+    def learn(self, state1, action1, reward, state2):
+        row = self.state_index.get(state2)
+        if row is None:
+            maxqnew = 0.0
+        else:
+            # The bootstrap read is a use too
+            self._touch(row)
+            maxqnew = self.q_values[row].max()
+        self.learnQ(state1, action1, reward, reward + self.gamma*maxqnew)
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+'''
+    Compact binary file format for Q-tables, meant to be opened with
+    numpy.memmap so that loading is instant and the table is never fully
+    materialized. Several evaluation processes opening the same file share
+    the same pages of the OS page cache.
+
+    Layout, all little endian:
+        header      64 bytes, see HEADER
+        keys_hi     n_states uint64, high word of the 128 bit state keys
+        keys_lo     n_states uint64, low word of the 128 bit state keys
+        values      (n_states, n_actions) float32, 64 byte aligned
+
+    Rows are sorted by (keys_hi, keys_lo) so lookups are binary searches that
+    only touch a few pages. Integer states that fit in 128 bits are used as
+    keys directly, anything else (like the stringuified states) is hashed to
+    128 bits with BLAKE2b.
+'''
+import hashlib
+import os
+import struct
+import numpy
+from qlearn import select_action
+
+MAGIC = b"CATBOTQT"
+VERSION = 1
+# magic, version, n_actions, n_states, values offset
+HEADER = struct.Struct("<8sIIQQ")
+HEADER_SIZE = 64
+ALIGNMENT = 64
+WORD_MASK = (1 << 64) - 1
+
+
+def state_key(state):
+    """
+    128 bit integer key of a state, as (high word, low word)
+    :param state:
+    :return: (hi, lo)
+    """
+    if isinstance(state, (int, numpy.integer)) and 0 <= state < (1 << 128):
+        key = int(state)
+    else:
+        if not isinstance(state, bytes):
+            state = state.encode() if isinstance(state, str) else repr(state).encode()
+        key = int.from_bytes(hashlib.blake2b(state, digest_size=16).digest(), "little")
+    return key >> 64, key & WORD_MASK
+
+
+def _table_rows(qlearn):
+    """
+    All the states of a QLearn or ArrayQLearn with their Q-values row
+    :return: (states, values) list and (n_states, n_actions) float32 array
+    """
+    n_actions = len(qlearn.actions)
+    if hasattr(qlearn, "state_index"):
+        states = list(qlearn.state_index.keys())
+        rows = numpy.fromiter(qlearn.state_index.values(), dtype=numpy.int64, count=len(states))
+        return states, qlearn.q_values[rows].astype(numpy.float32)
+
+    action_index = dict((a, i) for i, a in enumerate(qlearn.actions))
+    state_rows = {}
+    for (state, action), value in qlearn.q.items():
+        if state not in state_rows:
+            state_rows[state] = numpy.zeros(n_actions, dtype=numpy.float32)
+        state_rows[state][action_index[action]] = value
+    values = numpy.array(list(state_rows.values()), dtype=numpy.float32).reshape(len(state_rows), n_actions)
+    return list(state_rows.keys()), values
+
+
+def save_qtable(path, qlearn):
+    """
+    Writes the Q-table of qlearn to path, replacing it atomically
+    :param path:
+    :param qlearn: QLearn or ArrayQLearn, actions must be range(n_actions)
+    :return: number of states written
+    """
+    states, values = _table_rows(qlearn)
+    n_states, n_actions = len(states), len(qlearn.actions)
+
+    keys_hi = numpy.empty(n_states, dtype="<u8")
+    keys_lo = numpy.empty(n_states, dtype="<u8")
+    for i, state in enumerate(states):
+        keys_hi[i], keys_lo[i] = state_key(state)
+    order = numpy.lexsort((keys_lo, keys_hi))
+    keys_hi, keys_lo, values = keys_hi[order], keys_lo[order], values[order]
+    if n_states > 1:
+        same = (keys_hi[1:] == keys_hi[:-1]) & (keys_lo[1:] == keys_lo[:-1])
+        if same.any():
+            raise ValueError("Two states share the same key in " + str(path))
+
+    keys_end = HEADER_SIZE + 16 * n_states
+    values_offset = (keys_end + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as table_file:
+        table_file.write(HEADER.pack(MAGIC, VERSION, n_actions, n_states, values_offset).ljust(HEADER_SIZE, b"\0"))
+        table_file.write(keys_hi.tobytes())
+        table_file.write(keys_lo.tobytes())
+        table_file.write(b"\0" * (values_offset - keys_end))
+        table_file.write(values.astype("<f4").tobytes())
+        table_file.flush()
+        os.fsync(table_file.fileno())
+    os.replace(tmp_path, path)
+    return n_states
+
+
+class MappedQTable(object):
+    '''
+    Read-only view of a Q-table file, with the lookup methods of QLearn.
+    Nothing is read from disk until a state is looked up.
+    '''
+    def __init__(self, path, epsilon=0.0, seed=None):
+        with open(path, "rb") as table_file:
+            magic, version, n_actions, n_states, values_offset = HEADER.unpack(table_file.read(HEADER.size))
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(str(path) + " is not a version " + str(VERSION) + " Q-table file")
+
+        self.path = path
+        self.n_states = n_states
+        self.n_actions = n_actions
+        self.actions = range(n_actions)
+        self.epsilon = epsilon
+        self.rng = numpy.random.default_rng(seed)
+        if n_states == 0:
+            self.keys_hi = self.keys_lo = numpy.zeros(0, dtype="<u8")
+            self.q_values = numpy.zeros((0, n_actions), dtype="<f4")
+            return
+        self.keys_hi = numpy.memmap(path, dtype="<u8", mode="r", offset=HEADER_SIZE, shape=(n_states,))
+        self.keys_lo = numpy.memmap(path, dtype="<u8", mode="r", offset=HEADER_SIZE + 8 * n_states,
+                                    shape=(n_states,))
+        self.q_values = numpy.memmap(path, dtype="<f4", mode="r", offset=values_offset,
+                                     shape=(n_states, n_actions))
+
+    def __len__(self):
+        return self.n_states
+
+    def __contains__(self, state):
+        return self.find_row(state) is not None
+
+    def find_row(self, state):
+        """
+        Binary search of the row of a state
+        :param state:
+        :return: row index or None if the state is not in the table
+        """
+        hi, lo = state_key(state)
+        hi, lo = numpy.uint64(hi), numpy.uint64(lo)
+        start = numpy.searchsorted(self.keys_hi, hi, side="left")
+        end = numpy.searchsorted(self.keys_hi, hi, side="right")
+        if start == end:
+            return None
+        row = start + numpy.searchsorted(self.keys_lo[start:end], lo)
+        if row < end and self.keys_lo[row] == lo:
+            return int(row)
+        return None
+
+    def getQ(self, state, action):
+        row = self.find_row(state)
+        if row is None:
+            return 0.0
+        return float(self.q_values[row, action])
+
+    def getQRow(self, state):
+        row = self.find_row(state)
+        if row is None:
+            return numpy.zeros(self.n_actions)
+        return self.q_values[row].astype(float)
+
+    def chooseAction(self, state, return_q=False):
+        i, q = select_action(self.getQRow(state), self.epsilon, self.rng)
+        action = self.actions[i]
+        if return_q:
+            return action, q
+        return action
+
+    def close(self):
+        """
+        Drops the mappings, the file can be replaced afterwards
+        :return:
+        """
+        self.keys_hi = self.keys_lo = self.q_values = None
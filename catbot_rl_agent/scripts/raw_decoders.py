@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+'''
+    Decoders that read the fields the agent uses straight from the serialized
+    bytes of a message, for DecimatedSubscriber(decoder=...).
+
+    Deserializing a sensor_msgs/JointState builds three tuples of Python
+    floats and one str per joint, and a gazebo_msgs/ContactsState builds a
+    message for every wrench, contact position and normal, all of it on every
+    message of the highest rate topics. These only walk the length prefixes
+    of the ROS wire format and wrap the float64 arrays with numpy.frombuffer,
+    without copying them.
+'''
+import collections
+import struct
+import numpy
+
+_uint32 = struct.Struct("<I")
+# builtin time, secs and nsecs
+_time = struct.Struct("<2I")
+_vector3 = struct.Struct("<3d")
+# geometry_msgs/Wrench is a Vector3 force and a Vector3 torque
+_wrench_size = 2 * _vector3.size
+
+# Same field names as sensor_msgs/JointState plus the header.stamp in seconds, the arrays are read only
+JointStateArrays = collections.namedtuple("JointStateArrays", ["stamp", "name", "position", "velocity", "effort"])
+# header.stamp in seconds and the total force of a gazebo_msgs/ContactsState
+ContactsForce = collections.namedtuple("ContactsForce", ["stamp", "force"])
+
+
+def skip_string(buff, offset):
+    """
+    :return: offset right after the string that starts at offset
+    """
+    (length,) = _uint32.unpack_from(buff, offset)
+    return offset + 4 + length
+
+
+def skip_header(buff, offset=0):
+    """
+    std_msgs/Header is seq, stamp.secs and stamp.nsecs, then frame_id
+    :return: offset right after the header that starts at offset
+    """
+    return skip_string(buff, offset + 12)
+
+
+def read_header_stamp(buff, offset=0):
+    """
+    :return: stamp in seconds of the std_msgs/Header that starts at offset
+    """
+    secs, nsecs = _time.unpack_from(buff, offset + 4)
+    return secs + 1e-9 * nsecs
+
+
+def read_float64_array(buff, offset):
+    """
+    :return: numpy view of the float64[] that starts at offset, offset right after it
+    """
+    (count,) = _uint32.unpack_from(buff, offset)
+    offset += 4
+    return numpy.frombuffer(buff, dtype="<f8", count=count, offset=offset), offset + 8 * count
+
+
+class JointStateDecoder(object):
+    """
+    Decodes a sensor_msgs/JointState into a JointStateArrays. The names are
+    only decoded when their bytes change, otherwise the same list is returned.
+    """
+    def __init__(self):
+        self._name_bytes = None
+        self._names = []
+
+    def __call__(self, buff):
+        start = skip_header(buff)
+        if self._name_bytes is not None and buff.startswith(self._name_bytes, start):
+            offset = start + len(self._name_bytes)
+        else:
+            (count,) = _uint32.unpack_from(buff, start)
+            offset = start + 4
+            names = []
+            for _ in range(count):
+                end = skip_string(buff, offset)
+                names.append(buff[offset + 4:end].decode("utf-8"))
+                offset = end
+            self._name_bytes = bytes(buff[start:offset])
+            self._names = names
+        position, offset = read_float64_array(buff, offset)
+        velocity, offset = read_float64_array(buff, offset)
+        effort, offset = read_float64_array(buff, offset)
+        return JointStateArrays(read_header_stamp(buff), self._names, position, velocity, effort)
+
+
+def decode_contacts_force(buff):
+    """
+    Decodes a gazebo_msgs/ContactsState into the sum of the total_wrench.force
+    of all its states, the force on the link whatever the number of collisions
+    in contact.
+    :return: ContactsForce, the force is (x, y, z), zero if there is no contact
+    """
+    offset = skip_header(buff)
+    (count,) = _uint32.unpack_from(buff, offset)
+    offset += 4
+    x = y = z = 0.0
+    for _ in range(count):
+        # info, collision1_name, collision2_name
+        offset = skip_string(buff, skip_string(buff, skip_string(buff, offset)))
+        # wrenches[]
+        (wrenches,) = _uint32.unpack_from(buff, offset)
+        offset += 4 + wrenches * _wrench_size
+        # total_wrench, the force comes first
+        fx, fy, fz = _vector3.unpack_from(buff, offset)
+        x += fx
+        y += fy
+        z += fz
+        offset += _wrench_size
+        # contact_positions[], contact_normals[], depths[]
+        for item_size in (_vector3.size, _vector3.size, 8):
+            (items,) = _uint32.unpack_from(buff, offset)
+            offset += 4 + items * item_size
+    return ContactsForce(read_header_stamp(buff), (x, y, z))
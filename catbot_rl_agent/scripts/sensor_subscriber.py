@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+'''
+    Subscriber for the high rate sensor topics, like /odom and the IMU which
+    Gazebo can publish on every physics iteration.
+
+    Messages arrive as raw bytes (rospy.AnyMsg) and only one out of every
+    `every` is decoded and handed to the callback, the others cost a counter
+    increment. Decoding is a full deserialization unless a decoder from
+    raw_decoders is given. The queue only keeps the latest message and Nagle is
+    disabled, so a late callback never works through a backlog of old data.
+    Every subscriber counts the messages received and delivered and the CPU
+    time its callback thread spends, see stats.
+'''
+import time
+import rospy
+
+
+class DecimatedSubscriber(object):
+
+    def __init__(self, topic, msg_class, callback, every=1, queue_size=1, tcp_nodelay=True, decoder=None):
+        """
+        :param topic:
+        :param msg_class: type of the messages of the topic
+        :param callback: called with one decoded message out of every `every`
+        :param every: decimation factor, 1 to get them all
+        :param queue_size: messages kept when the callback falls behind, 1 keeps only the latest
+        :param tcp_nodelay: ask the publisher to disable Nagle's algorithm
+        :param decoder: function of the serialized message whose result callback gets,
+                        see raw_decoders. None deserializes a msg_class.
+        """
+        if every < 1:
+            raise ValueError("every has to be 1 or more, got " + str(every))
+        self.topic = topic
+        self.msg_class = msg_class
+        self.callback = callback
+        self.every = int(every)
+        self.decoder = decoder
+        self.reset_stats()
+        self._subscriber = rospy.Subscriber(topic, rospy.AnyMsg, self._raw_callback,
+                                            queue_size=queue_size, tcp_nodelay=tcp_nodelay)
+
+    def decode(self, buff):
+        """
+        Turns the raw bytes of a message into what callback gets
+        :param buff: serialized message
+        :return: what the decoder returns, or a msg_class instance
+        """
+        if self.decoder is not None:
+            return self.decoder(buff)
+        msg = self.msg_class()
+        msg.deserialize(buff)
+        return msg
+
+    def _raw_callback(self, raw_msg):
+        start = time.thread_time_ns()
+        self.received += 1
+        if self.received % self.every == 0:
+            self.callback(self.decode(raw_msg._buff))
+            self.delivered += 1
+        self.cpu_ns += time.thread_time_ns() - start
+
+    def reset_stats(self):
+        self.received = 0
+        self.delivered = 0
+        self.cpu_ns = 0
+        self._stats_start = time.time()
+
+    def stats(self):
+        """
+        Rates in wall clock time since the last reset_stats
+        :return: dict with the received and delivered messages per second and the
+                 callback CPU time, in ms per second and us per received message
+        """
+        elapsed = max(time.time() - self._stats_start, 1e-9)
+        return {"received_hz": self.received / elapsed,
+                "delivered_hz": self.delivered / elapsed,
+                "cpu_ms_per_s": 1e-6 * self.cpu_ns / elapsed,
+                "cpu_us_per_msg": 1e-3 * self.cpu_ns / self.received if self.received else 0.0}
+
+    def unregister(self):
+        self._subscriber.unregister()
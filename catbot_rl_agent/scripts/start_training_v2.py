@@ -5,11 +5,16 @@
     Moded by Miguel Angel Rodriguez <duckfrost@theconstructsim.com>
     Visit our website at www.theconstructsim.com
 '''
+import argparse
+import atexit
 import gym
+import os
 import time
 import numpy
 import random
 import qlearn
+from checkpoint import Checkpointer
+from qtable_file import save_qtable
 from gym import wrappers
 from std_msgs.msg import Float64
 # ROS packages required
@@ -21,12 +26,21 @@ import catbot_env
 
 
 if __name__ == '__main__':
-    
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--resume", action="store_true",
+                        help="Continue the training from the last checkpoint")
+    args = parser.parse_args(rospy.myargv()[1:])
+
     rospy.init_node('bipedal_gym', anonymous=True, log_level=rospy.INFO)
 
     # Create the Gym environment
     env = gym.make('bipedal-catbot-v0')
     rospy.loginfo ( "Gym environment done")
+    if env.unwrapped.observation_mode != "key":
+        # The Q-tables index their rows by the packed state keys
+        raise NameError('start_training_v2 needs the key observation_mode, not==' +
+                        str(env.unwrapped.observation_mode))
     reward_pub = rospy.Publisher('/monoped/reward', Float64, queue_size=1)
     episode_reward_pub = rospy.Publisher('/monoped/episode_reward', Float64, queue_size=1)
 
@@ -34,7 +48,7 @@ if __name__ == '__main__':
     rospack = rospkg.RosPack()
     pkg_path = rospack.get_path('catbot_rl_agent')
     outdir = pkg_path + '/training_results'
-    env = wrappers.Monitor(env, outdir, force=True)
+    env = wrappers.Monitor(env, outdir, force=not args.resume, resume=args.resume)
     rospy.loginfo("Monitor Wrapper started")
     
     last_time_steps = numpy.ndarray(0)
@@ -48,17 +62,62 @@ if __name__ == '__main__':
     epsilon_discount = rospy.get_param("/epsilon_discount")
     nepisodes = rospy.get_param("/nepisodes")
     nsteps = rospy.get_param("/nsteps")
+    qtable_backend = rospy.get_param("/qtable_backend", "dict")
+    seed = rospy.get_param("/seed", None)
+    qtable_max_states = rospy.get_param("/qtable_max_states", 0)
+    qtable_max_bytes = rospy.get_param("/qtable_max_bytes", 0)
+    qtable_eviction = rospy.get_param("/qtable_eviction", "lru")
+    checkpoint_every = rospy.get_param("/checkpoint_every", 0)
+    checkpoint_compact_every = rospy.get_param("/checkpoint_compact_every", 20)
+    checkpoint_dir = rospy.get_param("/checkpoint_dir", os.path.join(pkg_path, "checkpoints"))
+    qtable_export = rospy.get_param("/qtable_export", False)
+    timing_report_every = rospy.get_param("/timing_report_every", 100)
 
     # Initialises the algorithm that we are going to use for learning
-    qlearn = qlearn.QLearn(actions=range(env.action_space.n),
-                    alpha=Alpha, gamma=Gamma, epsilon=Epsilon)
+    if qtable_backend == "array":
+        qlearn = qlearn.ArrayQLearn(actions=range(env.action_space.n),
+                        alpha=Alpha, gamma=Gamma, epsilon=Epsilon, seed=seed,
+                        max_states=qtable_max_states, max_bytes=qtable_max_bytes,
+                        eviction=qtable_eviction)
+    else:
+        qlearn = qlearn.QLearn(actions=range(env.action_space.n),
+                        alpha=Alpha, gamma=Gamma, epsilon=Epsilon, seed=seed)
     initial_epsilon = qlearn.epsilon
 
+    # Phases of the training loop, next to the ones of the env, see step_timing
+    timer = env.unwrapped.timer
+    choose_phase = timer.phase("loop.choose_action")
+    env_step_phase = timer.phase("loop.env_step")
+    learn_phase = timer.phase("loop.learn")
+    publish_phase = timer.phase("loop.publish")
+    iteration_phase = timer.phase("loop.iteration")
+    reset_phase = timer.phase("loop.env_reset")
+    atexit.register(timer.dump, os.path.join(outdir, "step_timing.json"))
+
     start_time = time.time()
     highest_reward = 0
-    
+    first_episode = 0
+
+    checkpointer = None
+    if checkpoint_every > 0 or args.resume:
+        if not args.resume and os.path.exists(checkpoint_dir):
+            # A new training, old checkpoints would be mixed with this one. They are kept
+            # aside in case --resume was forgotten
+            moved_to = checkpoint_dir + "-" + time.strftime("%Y%m%d-%H%M%S")
+            os.rename(checkpoint_dir, moved_to)
+            rospy.logwarn("Starting without --resume, the previous checkpoints were moved to " + moved_to)
+        checkpointer = Checkpointer(checkpoint_dir, compact_every=checkpoint_compact_every)
+        if args.resume:
+            checkpoint = checkpointer.load(qlearn)
+            if checkpoint is None:
+                rospy.logwarn("No checkpoint found in " + checkpoint_dir + ", starting from scratch")
+            else:
+                first_episode = checkpoint["episode"]
+                highest_reward = checkpoint["extra"]["highest_reward"]
+                last_time_steps = numpy.array(checkpoint["extra"]["last_time_steps"])
+
     # Starts the main training loop: the one about the episodes to do
-    for x in range(nepisodes):
+    for x in range(first_episode, nepisodes):
         print("STARTING Episode # "+str(x), flush=True, end='\r')
         
         cumulated_reward = 0
@@ -70,8 +129,10 @@ if __name__ == '__main__':
         
         # Initialize the environment and get first state of the robot
         rospy.loginfo("env.reset...")
-        # Now We return directly the stringuified observations called state
+        # Now We return directly the discrete state key of the observations
+        t = timer.start()
         state = env.reset()
+        reset_phase.lap(t)
         # print(state)
         # rospy.loginfo("env.get_state...==>"+str(state))
         print()
@@ -80,13 +141,16 @@ if __name__ == '__main__':
 
             # print(i, flush= True, end='\r')
             # Pick an action based on the current state
+            iteration_start = timer.start()
             action = qlearn.chooseAction(state)
+            t = choose_phase.lap(iteration_start)
             
             # Execute the action in the environment and get feedback
             # rospy.loginfo("###################### Start Step...["+str(i)+"]")
             # rospy.loginfo("haa+,haa-,hfe+,hfe-,kfe+,kfe- >> [0,1,2,3,4,5]")
             # print("Action to Perform >> "+str(action), flush=True, end='\r')
             nextState, reward, done, info = env.step(action)
+            t = env_step_phase.lap(t)
             # print()
             # rospy.loginfo("END Step...")
             # rospy.loginfo("Reward ==> " + str(reward))
@@ -98,11 +162,14 @@ if __name__ == '__main__':
 
             # Make the algorithm learn based on the results
             qlearn.learn(state, action, reward, nextState)
+            t = learn_phase.lap(t)
             print(state, flush= True, end='\r')
 
             # We publish the cumulated reward
             cumulated_reward_msg.data = cumulated_reward
             reward_pub.publish(cumulated_reward_msg)
+            publish_phase.lap(t)
+            iteration_phase.lap(iteration_start)
 
             if not(done):
                 state = nextState
@@ -119,6 +186,27 @@ if __name__ == '__main__':
         episode_reward_msg.data = cumulated_reward
         episode_reward_pub.publish(episode_reward_msg)
         print( ("EP: "+str(x+1)+" - [alpha: "+str(round(qlearn.alpha,2))+" - gamma: "+str(round(qlearn.gamma,2))+" - epsilon: "+str(round(qlearn.epsilon,2))+"] - Reward: "+str(cumulated_reward)+"     Time: %d:%02d:%02d" % (h, m, s)))
+        if qtable_backend == "array" and (x + 1) % 100 == 0:
+            rospy.loginfo("Q-table stats: " + str(qlearn.eviction_stats()))
+        if (x + 1) % 100 == 0:
+            # Fixed cost of the Gazebo service calls over the last 100 episodes
+            rospy.loginfo("Gazebo service stats: " + str(env.unwrapped.gazebo.service_stats()))
+            env.unwrapped.gazebo.reset_service_stats()
+            # Rates and callback CPU time of the sensor topics
+            rospy.loginfo("Sensor topic stats: " + str(env.unwrapped.monoped_state_object.subscriber_stats()))
+            env.unwrapped.monoped_state_object.reset_subscriber_stats()
+        if timing_report_every > 0 and (x + 1) % timing_report_every == 0:
+            rospy.loginfo("Step timing:\n" + timer.format_report(reference="loop.iteration"))
+        if checkpoint_every > 0 and (x + 1) % checkpoint_every == 0:
+            checkpointer.save(qlearn, x + 1, {"highest_reward": highest_reward,
+                                              "last_time_steps": last_time_steps.tolist()})
+
+    if checkpointer is not None:
+        checkpointer.close()
+    if qtable_export:
+        # Memory mappable copy of the table for evaluation, see qtable_file.MappedQTable
+        n_states = save_qtable(os.path.join(outdir, "qtable.qt"), qlearn)
+        rospy.loginfo("Q-table with " + str(n_states) + " states exported to " + outdir)
 
     print( ("\n|"+str(nepisodes)+"|"+str(qlearn.alpha)+"|"+str(qlearn.gamma)+"|"+str(initial_epsilon)+"*"+str(epsilon_discount)+"|"+str(highest_reward)+"| PICTURE |"))
 
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+'''
+    Always on timing of the phases of a step, to see where the time goes when
+    the steps per second drop.
+
+    Every phase keeps a histogram of its durations with one bucket per power
+    of two nanoseconds, bucket b counting the durations of b bits, so
+    recording one costs a perf_counter_ns call and a few integer operations.
+    The code being timed chains the phases with lap:
+
+        t = timer.start()
+        do_something()
+        t = phase_a.lap(t)
+        do_something_else()
+        t = phase_b.lap(t)
+
+    report gives the statistics since the last report, dump writes the ones
+    since the start to a JSON file, see start_training_v2.py.
+'''
+import json
+import time
+
+N_BUCKETS = 64
+
+
+class Phase(object):
+    __slots__ = ("name", "counts", "count", "total_ns", "max_ns")
+
+    def __init__(self, name):
+        self.name = name
+        self.clear()
+
+    def clear(self):
+        self.counts = [0] * N_BUCKETS
+        self.count = 0
+        self.total_ns = 0
+        self.max_ns = 0
+
+    def lap(self, start):
+        """
+        Records the time since start
+        :param start: perf_counter_ns at the start of the phase
+        :return: perf_counter_ns now, the start of the next phase
+        """
+        now = time.perf_counter_ns()
+        duration = now - start
+        self.counts[duration.bit_length()] += 1
+        self.count += 1
+        self.total_ns += duration
+        if duration > self.max_ns:
+            self.max_ns = duration
+        return now
+
+    def add(self, other):
+        for bucket, count in enumerate(other.counts):
+            self.counts[bucket] += count
+        self.count += other.count
+        self.total_ns += other.total_ns
+        self.max_ns = max(self.max_ns, other.max_ns)
+
+    def percentile_ns(self, fraction):
+        """
+        Upper bound of the bucket of the given fraction of the durations
+        :return: nanoseconds, 0 without durations
+        """
+        if self.count == 0:
+            return 0
+        seen = 0
+        for bucket, count in enumerate(self.counts):
+            seen += count
+            if seen >= fraction * self.count:
+                return min(1 << bucket, self.max_ns)
+        return self.max_ns
+
+    def stats(self):
+        """
+        :return: dict with the count and the mean, p50, p99 and max in microseconds
+        """
+        return {"count": self.count,
+                "mean_us": 1e-3 * self.total_ns / self.count if self.count else 0.0,
+                "p50_us": 1e-3 * self.percentile_ns(0.5),
+                "p99_us": 1e-3 * self.percentile_ns(0.99),
+                "max_us": 1e-3 * self.max_ns,
+                "total_s": 1e-9 * self.total_ns}
+
+
+class PhaseTimer(object):
+
+    def __init__(self):
+        # Phases being recorded, and everything until the last report
+        self._phases = {}
+        self._totals = {}
+        self.lap_cost_ns = self.calibrate()
+
+    def phase(self, name):
+        """
+        The same Phase for the same name, keep it to lap without a lookup
+        :return: Phase
+        """
+        if name not in self._phases:
+            self._phases[name] = Phase(name)
+            self._totals[name] = Phase(name)
+        return self._phases[name]
+
+    def start(self):
+        return time.perf_counter_ns()
+
+    def calibrate(self, laps=10000):
+        """
+        :return: nanoseconds a lap costs, to tell the overhead of the timing itself
+        """
+        phase = Phase("calibration")
+        t = time.perf_counter_ns()
+        start = t
+        for _ in range(laps):
+            t = phase.lap(t)
+        return (time.perf_counter_ns() - start) / float(laps)
+
+    def _flush(self):
+        for name, phase in self._phases.items():
+            self._totals[name].add(phase)
+            phase.clear()
+
+    def report(self, reference=None):
+        """
+        Statistics of every phase since the last report, which are then cleared
+        :param reference: phase whose total time the share of every phase and the
+                          overhead of the timing are relative to, like the whole step
+        :return: {phase: Phase.stats()}, plus "timing_overhead_pct" with a reference
+        """
+        stats = dict((name, phase.stats()) for name, phase in self._phases.items() if phase.count)
+        if reference is not None and reference in self._phases and self._phases[reference].total_ns:
+            reference_ns = float(self._phases[reference].total_ns)
+            for name, phase in self._phases.items():
+                if phase.count:
+                    stats[name]["share_pct"] = 100.0 * phase.total_ns / reference_ns
+            laps = sum(phase.count for phase in self._phases.values())
+            stats["timing_overhead_pct"] = 100.0 * laps * self.lap_cost_ns / reference_ns
+        self._flush()
+        return stats
+
+    def format_report(self, reference=None):
+        """
+        report as a table, one line per phase, the slowest first
+        :return: str
+        """
+        stats = self.report(reference)
+        overhead = stats.pop("timing_overhead_pct", None)
+        lines = ["%-28s %10s %10s %10s %10s %10s %8s" % ("phase", "count", "mean [us]", "p50 [us]", "p99 [us]",
+                                                          "max [us]", "share")]
+        for name, phase in sorted(stats.items(), key=lambda item: -item[1]["total_s"]):
+            share = "%7.1f%%" % phase["share_pct"] if "share_pct" in phase else ""
+            lines.append("%-28s %10d %10.1f %10.1f %10.1f %10.1f %8s" % (name, phase["count"], phase["mean_us"],
+                                                                         phase["p50_us"], phase["p99_us"],
+                                                                         phase["max_us"], share))
+        if overhead is not None:
+            lines.append("timing overhead %.3f%% of %s" % (overhead, reference))
+        return "\n".join(lines)
+
+    def dump(self, path):
+        """
+        Writes the statistics and histograms of every phase since the start to a JSON file
+        :return:
+        """
+        self._flush()
+        phases = {}
+        for name, phase in self._totals.items():
+            if not phase.count:
+                continue
+            phases[name] = phase.stats()
+            # {bucket: count} of the non empty buckets, bucket b holds durations of b bits
+            phases[name]["buckets"] = dict((bucket, count) for bucket, count in enumerate(phase.counts) if count)
+        with open(path, "w") as f:
+            json.dump({"lap_cost_ns": self.lap_cost_ns, "phases": phases}, f, indent=2, sort_keys=True)
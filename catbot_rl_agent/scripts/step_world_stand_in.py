@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+'''
+    Stand-in for the Gazebo world control services, to exercise the stepping
+    code of CatbotEnv (see lockstep_iterations) without Gazebo.
+
+    Offers /gazebo/step_world, pause_physics, unpause_physics,
+    reset_simulation, reset_world and set_physics_properties, and publishes
+    the simulation time on /clock like gzserver does. There is no physics:
+    an iteration only moves the clock forward by time_step. While unpaused
+    the clock runs at max_update_rate iterations per second, or as fast as
+    possible if it is 0.
+
+    Usage: rosrun catbot_rl_agent step_world_stand_in.py
+'''
+import threading
+import time
+import rospy
+from rosgraph_msgs.msg import Clock
+from std_srvs.srv import Empty, EmptyResponse
+from gazebo_msgs.srv import SetPhysicsProperties, SetPhysicsPropertiesResponse
+from catbot_gazebo.srv import StepWorld, StepWorldResponse
+
+
+class StepWorldStandIn(object):
+
+    def __init__(self, time_step=0.001, max_update_rate=1000.0, paused=True):
+        self.time_step = time_step
+        self.max_update_rate = max_update_rate
+        self.paused = paused
+        self.iterations = 0
+        self._lock = threading.Lock()
+        self._clock = Clock()
+        self._clock_pub = rospy.Publisher("/clock", Clock, queue_size=10)
+
+        rospy.Service("/gazebo/step_world", StepWorld, self.step_world)
+        rospy.Service("/gazebo/pause_physics", Empty, self.pause_physics)
+        rospy.Service("/gazebo/unpause_physics", Empty, self.unpause_physics)
+        rospy.Service("/gazebo/reset_simulation", Empty, self.reset_simulation)
+        rospy.Service("/gazebo/reset_world", Empty, self.reset_simulation)
+        rospy.Service("/gazebo/set_physics_properties", SetPhysicsProperties, self.set_physics_properties)
+        self.publish_clock()
+
+    def sim_time(self):
+        return self.iterations * self.time_step
+
+    def publish_clock(self):
+        self._clock.clock = rospy.Time.from_sec(self.sim_time())
+        self._clock_pub.publish(self._clock)
+
+    def advance(self, iterations):
+        with self._lock:
+            self.iterations += iterations
+            self.publish_clock()
+
+    def step_world(self, req):
+        self.paused = True
+        self.advance(req.iterations)
+        return StepWorldResponse(success=True, status_message="", sim_time=self.sim_time())
+
+    def pause_physics(self, req):
+        self.paused = True
+        return EmptyResponse()
+
+    def unpause_physics(self, req):
+        self.paused = False
+        return EmptyResponse()
+
+    def reset_simulation(self, req):
+        with self._lock:
+            self.iterations = 0
+            self.publish_clock()
+        return EmptyResponse()
+
+    def set_physics_properties(self, req):
+        if req.time_step <= 0:
+            return SetPhysicsPropertiesResponse(success=False, status_message="time_step must be positive")
+        with self._lock:
+            # Keep the same simulation time with the new time step
+            sim_time = self.sim_time()
+            self.time_step = req.time_step
+            self.iterations = int(round(sim_time / req.time_step))
+        self.max_update_rate = req.max_update_rate
+        return SetPhysicsPropertiesResponse(success=True, status_message="")
+
+    def spin(self):
+        """
+        Runs the clock while unpaused, until shutdown
+        :return:
+        """
+        while not rospy.is_shutdown():
+            if self.paused:
+                time.sleep(0.001)
+                continue
+            self.advance(1)
+            if self.max_update_rate > 0:
+                time.sleep(1.0 / self.max_update_rate)
+
+
+if __name__ == '__main__':
+    rospy.init_node('step_world_stand_in')
+    StepWorldStandIn().spin()
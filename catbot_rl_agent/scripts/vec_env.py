@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+'''
+    Runs several CatbotEnv at once, one per worker process, to use more than
+    the one core a single gzserver keeps busy.
+
+    Every worker has its own ROS master and Gazebo master, on the port pair
+    given by worker_ports, and starts its own simulation with
+    launch/vec_worker.launch, which includes catbot_gazebo/launch/catbot.launch.
+    The workers step in parallel: step sends the action of every worker before
+    waiting for any of them, and the results come back stacked.
+
+    A worker whose process or simulation dies, or which does not answer within
+    step_timeout, is restarted with a new simulation. Its result for that step
+    is the first state after the restart, with done set and "restarted" in its
+    info.
+
+    Usage:
+        vec_env = CatbotVecEnv(8)
+        states = vec_env.reset()
+        states, rewards, dones, infos = vec_env.step(actions)
+        vec_env.close()
+'''
+import multiprocessing
+import os
+import signal
+import subprocess
+import time
+import traceback
+import numpy
+
+
+def worker_ports(index, base_port=11411):
+    """
+    :return: (ROS master port, Gazebo master port) of the worker
+    """
+    return base_port + 2 * index, base_port + 2 * index + 1
+
+
+def stop_launch(pid, timeout=15.0):
+    """
+    Stops a roslaunch started by a worker and everything it started, like Ctrl-C would
+    :param pid: of the roslaunch, which leads its own process group
+    :return:
+    """
+    try:
+        os.killpg(pid, signal.SIGINT)
+    except OSError:
+        return
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            os.killpg(pid, 0)
+        except OSError:
+            return
+        time.sleep(0.1)
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except OSError:
+        pass
+
+
+def worker_main(index, conn, base_port, launch_args, log_dir, start_timeout):
+    """
+    Body of a worker process: starts the simulation, makes the env and runs
+    the commands of the pipe until close
+    """
+    ros_port, gazebo_port = worker_ports(index, base_port)
+    # Before importing rospy, everything ROS and Gazebo in this process uses them
+    os.environ["ROS_MASTER_URI"] = "http://localhost:" + str(ros_port)
+    os.environ["GAZEBO_MASTER_URI"] = "http://localhost:" + str(gazebo_port)
+    # One core per worker, NumPy threads would only compete with the other workers
+    os.environ.setdefault("OMP_NUM_THREADS", "1")
+
+    launch = None
+    try:
+        with open(os.path.join(log_dir, "catbot_vec_worker_" + str(index) + ".log"), "a") as log:
+            launch = subprocess.Popen(["roslaunch", "-p", str(ros_port), "catbot_rl_agent", "vec_worker.launch"] +
+                                      list(launch_args), stdout=log, stderr=subprocess.STDOUT,
+                                      start_new_session=True)
+        conn.send(("launched", launch.pid))
+
+        import rosgraph
+        import rospy
+        import gym
+        # Registers bipedal-catbot-v0
+        import catbot_env
+
+        # The parameters are the last thing roslaunch sets up before the nodes
+        master = rosgraph.Master("/catbot_vec_worker")
+        deadline = time.time() + start_timeout
+        while True:
+            try:
+                if master.hasParam("/sim_backend"):
+                    break
+            except Exception:
+                pass
+            if launch.poll() is not None:
+                raise RuntimeError("roslaunch of worker " + str(index) + " exited with " + str(launch.returncode))
+            if time.time() > deadline:
+                raise RuntimeError("The master of worker " + str(index) + " did not come up in " +
+                                   str(start_timeout) + "s")
+            time.sleep(0.1)
+
+        rospy.init_node("catbot_vec_worker_" + str(index), disable_signals=True, log_level=rospy.WARN)
+        env = gym.make("bipedal-catbot-v0")
+        state_object = env.unwrapped.monoped_state_object
+        conn.send(("ready", env.action_space.n))
+
+        while True:
+            command, data = conn.recv()
+            if command == "step":
+                state, reward, done, info = env.step(data)
+                if done:
+                    # Starts the next episode right away, like the other vectorized envs
+                    info["terminal_state"] = state
+                    info["terminal_observation"] = state_object.get_observations().copy()
+                    state = env.reset()
+                conn.send(("ok", (state, state_object.get_observations().copy(), reward, done, info)))
+            elif command == "reset":
+                state = env.reset()
+                conn.send(("ok", (state, state_object.get_observations().copy())))
+            elif command == "close":
+                env.close()
+                conn.send(("ok", None))
+                break
+            else:
+                raise NameError('Unknown command==' + str(command))
+    except (EOFError, KeyboardInterrupt):
+        pass
+    except Exception:
+        try:
+            conn.send(("error", traceback.format_exc()))
+        except (OSError, EOFError):
+            pass
+    finally:
+        if launch is not None:
+            stop_launch(launch.pid)
+
+
+class WorkerFailed(Exception):
+    pass
+
+
+class CatbotVecEnv(object):
+
+    def __init__(self, n_workers, base_port=11411, launch_args=(), log_dir=None, start_timeout=180.0,
+                 step_timeout=60.0, max_restarts=100):
+        """
+        Starts every worker, their simulations come up in parallel
+        :param n_workers: number of CatbotEnv, one process and one simulation each
+        :param base_port: ROS master port of the first worker, see worker_ports
+        :param launch_args: extra args of vec_worker.launch, like ["sim_backend:=numpy"]
+        :param log_dir: where the output of every roslaunch goes, ~/.ros/log by default
+        :param start_timeout: seconds for a worker to have its env ready
+        :param step_timeout: seconds for a worker to answer a step or a reset before it is restarted
+        :param max_restarts: restarts of all the workers together before giving up
+        """
+        self.n_workers = n_workers
+        self.base_port = base_port
+        self.launch_args = list(launch_args)
+        self.log_dir = log_dir or os.path.join(os.path.expanduser("~"), ".ros", "log")
+        self.start_timeout = start_timeout
+        self.step_timeout = step_timeout
+        self.max_restarts = max_restarts
+        self.restarts = 0
+        self.n_actions = None
+        if not os.path.isdir(self.log_dir):
+            os.makedirs(self.log_dir)
+
+        # Fresh interpreters, so that nothing ROS is inherited from this process
+        self._context = multiprocessing.get_context("spawn")
+        self._processes = [None] * n_workers
+        self._pipes = [None] * n_workers
+        self._launch_pids = [None] * n_workers
+        # Float observations of the last states, one row per worker
+        self.observations = None
+
+        try:
+            for index in range(n_workers):
+                self.start_worker(index)
+            for index in range(n_workers):
+                self.wait_ready(index)
+        except Exception:
+            self.close()
+            raise
+
+    def start_worker(self, index):
+        parent_conn, child_conn = self._context.Pipe()
+        process = self._context.Process(target=worker_main, name="catbot_vec_worker_" + str(index),
+                                        args=(index, child_conn, self.base_port, self.launch_args,
+                                              self.log_dir, self.start_timeout))
+        process.daemon = True
+        process.start()
+        child_conn.close()
+        self._processes[index] = process
+        self._pipes[index] = parent_conn
+        self._launch_pids[index] = None
+
+    def wait_ready(self, index):
+        """
+        Waits for a started worker to have its env made
+        :raises WorkerFailed:
+        """
+        deadline = time.time() + self.start_timeout
+        while True:
+            status, data = self._receive(index, max(0.0, deadline - time.time()))
+            if status == "launched":
+                self._launch_pids[index] = data
+            elif status == "ready":
+                self.n_actions = data
+                return
+            else:
+                raise WorkerFailed("Worker " + str(index) + " failed to start==" + str(data))
+
+    def stop_worker(self, index):
+        process = self._processes[index]
+        if process is None:
+            return
+        if process.is_alive():
+            process.terminate()
+            process.join(5.0)
+            if process.is_alive():
+                process.kill()
+                process.join()
+        # The worker stops its roslaunch itself, unless it was killed first
+        if self._launch_pids[index] is not None:
+            stop_launch(self._launch_pids[index])
+        self._pipes[index].close()
+        self._processes[index] = None
+        self._pipes[index] = None
+        self._launch_pids[index] = None
+
+    def restart_worker(self, index, reason):
+        """
+        Replaces a worker by a new one with a new simulation and resets its env
+        :return: (state, observation) after the reset
+        """
+        self.restarts += 1
+        if self.restarts > self.max_restarts:
+            raise WorkerFailed("Too many worker restarts, the last one==" + str(reason))
+        # Not at the top, the workers import this module before setting their ROS_MASTER_URI
+        import rospy
+        rospy.logwarn("Restarting catbot vec worker " + str(index) + "==>" + str(reason))
+        self.stop_worker(index)
+        self.start_worker(index)
+        self.wait_ready(index)
+        self._send(index, ("reset", None))
+        status, data = self._receive(index, self.step_timeout)
+        if status != "ok":
+            raise WorkerFailed("Worker " + str(index) + " failed again after a restart==" + str(data))
+        return data
+
+    def _send(self, index, message):
+        try:
+            self._pipes[index].send(message)
+            return True
+        except (OSError, EOFError):
+            return False
+
+    def _receive(self, index, timeout):
+        """
+        :return: (status, data), status "failed" if the worker died or did not answer in time
+        """
+        pipe = self._pipes[index]
+        try:
+            if not pipe.poll(timeout):
+                return "failed", "no answer in " + str(timeout) + "s"
+            return pipe.recv()
+        except (OSError, EOFError) as e:
+            return "failed", "worker process died==" + str(e)
+
+    def reset(self):
+        """
+        Resets the env of every worker
+        :return: numpy array of the state keys, one per worker. Object dtype, the keys
+                 can be longer than 64 bits. The float observations are in self.observations
+        """
+        sent = [self._send(index, ("reset", None)) for index in range(self.n_workers)]
+        results = []
+        for index in range(self.n_workers):
+            status, data = self._receive(index, self.step_timeout) if sent[index] else ("failed", "pipe closed")
+            if status != "ok":
+                data = self.restart_worker(index, data)
+            results.append(data)
+        states = numpy.empty(self.n_workers, dtype=object)
+        states[:] = [state for state, observation in results]
+        self.observations = numpy.stack([observation for state, observation in results])
+        return states
+
+    def step(self, actions):
+        """
+        Steps the env of every worker with its action, all at once. The env of a
+        worker that is done is reset right away, its terminal state is in the
+        terminal_state of its info.
+        :param actions: one per worker
+        :return: states (object dtype), rewards, dones, infos
+        """
+        if len(actions) != self.n_workers:
+            raise ValueError("Expected " + str(self.n_workers) + " actions, got " + str(len(actions)))
+        sent = [self._send(index, ("step", int(action))) for index, action in enumerate(actions)]
+
+        states = numpy.empty(self.n_workers, dtype=object)
+        rewards = numpy.zeros(self.n_workers)
+        dones = numpy.zeros(self.n_workers, dtype=bool)
+        infos = []
+        observations = []
+        for index in range(self.n_workers):
+            status, data = self._receive(index, self.step_timeout) if sent[index] else ("failed", "pipe closed")
+            if status == "ok":
+                state, observation, reward, done, info = data
+            else:
+                state, observation = self.restart_worker(index, data)
+                reward, done, info = 0.0, True, {"restarted": True}
+            states[index] = state
+            rewards[index] = reward
+            dones[index] = done
+            infos.append(info)
+            observations.append(observation)
+        self.observations = numpy.stack(observations)
+        return states, rewards, dones, infos
+
+    def close(self):
+        for index in range(self.n_workers):
+            if self._processes[index] is None:
+                continue
+            if self._send(index, ("close", None)):
+                self._receive(index, 30.0)
+            self.stop_worker(index)